@@ -1,13 +1,210 @@
 import streamlit as st
-from core.parser import parse_file, clean_text, clean_test_cases_df, add_test_case_ids
-from core.chunker import chunk_text
-from core.prompt import get_prompt
-from core.generator import run_llm, parse_llm_csv_output
-import pandas as pd
-import io
+from core.jobs import JobQueue, WorkerPool, save_upload, export_job, start_warm_up, FINISHED
+from core.prefilter import calls_avoided
+from core.export import EXPORT_FORMATS, export_extension, export_mime
+import json
 import os
+import time
+import uuid
 from config.settings import *
 
+STATUS_ICONS = {"queued": "⏳", "running": "🔄", "cancelling": "🛑", "done": "✅", "failed": "❌", "cancelled": "🛑"}
+
+
+@st.cache_resource
+def start_jobs():
+    """Job queue shared by every session, with its worker processes started once per server"""
+    if WARM_UP_MODEL:
+        start_warm_up(DEFAULT_MODEL)
+    return JobQueue(), WorkerPool().start()
+
+
+def show_diagnostics(report):
+    """Collapsible panel with stage timings, per-chunk measurements and the JSON run report"""
+    import pandas as pd  # Loaded on first use so the upload page renders without it
+    totals = report["totals"]
+    with st.expander("🩺 Diagnostics"):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Wall Time", f"{report['wall_seconds']:.1f} s")
+        with col2:
+            st.metric("LLM Calls", totals["chunks"] - totals["cache_hits"])
+        with col3:
+            st.metric("Tokens/sec", totals["tokens_per_second"] or "n/a")
+        with col4:
+            st.metric("Parse Failures", totals["parse_failures"])
+        if totals.get("prompt_cached_tokens"):
+            st.caption(f"⚡ Prompt cache: ~{totals['prompt_cached_tokens']} prompt tokens reused, about "
+                       f"{totals['prompt_eval_saved_seconds']:.2f} s of prompt evaluation saved "
+                       f"({totals['prompt_eval_saved_per_chunk']:.3f} s per chunk)")
+        
+        stages = pd.DataFrame(
+            [{"Stage": name, "Seconds": v["seconds"], "Calls": v["calls"]} for name, v in report["stages"].items()])
+        st.dataframe(stages, use_container_width=True)
+        if report["chunks"]:
+            st.dataframe(pd.DataFrame(report["chunks"]), use_container_width=True)
+        
+        st.download_button("📥 Download Run Report (JSON)", data=json.dumps(report, indent=2),
+                           file_name="spec2test_run_report.json", mime="application/json")
+
+
+def show_traceability(trace):
+    """Collapsible panel with requirement coverage, uncovered requirements and a REQ-ID lookup"""
+    import pandas as pd
+    from core.trace import TraceIndex, normalize_req_id
+    index = TraceIndex.from_dict(trace)
+    coverage = trace["coverage"]
+    with st.expander("📍 Traceability"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Requirements Found", coverage["requirements"])
+        with col2:
+            st.metric("Covered", f"{coverage['coverage']:.0%}" if coverage["coverage"] is not None else "n/a")
+        with col3:
+            st.metric("Test Cases Without REQ-ID", coverage["untraced_test_cases"])
+        if coverage["gaps"]:
+            st.warning(f"⚠️ {len(coverage['gaps'])} requirements have no test case: {', '.join(coverage['gaps'][:20])}")
+
+        rows = index.requirement_rows()
+        if rows:
+            st.dataframe(pd.DataFrame([(req_id, page, start, ", ".join(tests)) for req_id, page, start, tests in rows],
+                                      columns=["Requirement", "Page", "Offset", "Test Cases"]),
+                         use_container_width=True)
+        req_id = st.text_input("Find test cases for a requirement", placeholder="REQ-001")
+        if req_id:
+            tests = index.tests_for(req_id)
+            if tests:
+                st.dataframe(pd.DataFrame([dict(index.source(t), ID=t) for t in tests]), use_container_width=True)
+            else:
+                st.info(f"No test case traces to {normalize_req_id(req_id)}")
+
+
+def show_progress(job_queue, job):
+    """Queue position or progress and live test cases of a job that has not finished yet"""
+    import pandas as pd
+    st.subheader("🔄 Processing Document")
+    if job["status"] == "queued":
+        st.info(f"⏳ {job['name']} is waiting for a worker ({job_queue.position(job['id'])} documents ahead)")
+    else:
+        st.progress(job["completed"] / job["total"] if job["total"] else 0)
+        message = job["message"] if job["status"] == "running" else "Stopping..."
+        st.text(f"🤖 {job['name']}: {message}")
+        live_rows = job_queue.rows(job["id"])
+        if live_rows:
+            st.dataframe(pd.DataFrame(live_rows, columns=["Title", "Description"]), use_container_width=True)
+    
+    if job["status"] != "cancelling" and st.button("🛑 Cancel"):
+        job_queue.cancel(job["id"])
+    st.caption("You can leave or refresh this page; processing continues in the background.")
+
+
+def show_results(job_queue, job):
+    import pandas as pd
+    summary = job["summary"]
+    delta = summary["delta"]
+    prefilter_stats = summary["prefilter"]
+    result_df = pd.DataFrame(job_queue.rows(job["id"], final=True), columns=["ID", "Title", "Description"])
+    
+    if not summary["sections"]:
+        st.error("❌ No content could be extracted from the document.")
+        st.info("💡 Make sure your document contains readable text and is not corrupted.")
+        return
+    if prefilter_stats["chunks"] and prefilter_stats["skipped"] == prefilter_stats["chunks"] and not summary["any_rows"]:
+        st.warning(f"🔎 The pre-filter found no testable requirements in the {summary['sections']} sections "
+                   f"of {job['name']}, so nothing was sent to the LLM.")
+        st.info("💡 Set PREFILTER_ENABLED = False to send every section to the model anyway.")
+        return
+    
+    st.text(f"🎉 Processing of {job['name']} complete!")
+    if delta is None:
+        st.info(f"📊 Document split into {summary['sections']} sections for analysis")
+    elif delta["diff"] is None:
+        st.info(f"📊 Version 1: {summary['sections']} requirement sections analyzed in {delta['llm_chunks']} chunks")
+    else:
+        diff = delta["diff"]
+        st.info(f"📊 Version {delta['version']}: {len(diff['unchanged'])} sections unchanged "
+                f"({delta['reused_test_cases']} test cases reused), {len(diff['changed'])} changed, "
+                f"{len(diff['added'])} added, {len(diff['removed'])} removed; "
+                f"{delta['llm_chunks']} chunks sent to the LLM")
+
+    cache_stats = summary["cache"]
+    if cache_stats is not None:
+        st.caption(f"♻️ Cache: {cache_stats['hits']} chunks reused, {cache_stats['misses']} sent to the LLM")
+    if calls_avoided(prefilter_stats):
+        st.caption(f"🔎 Pre-filter: {prefilter_stats['skipped']} chunks without testable content skipped, "
+                   f"{prefilter_stats['batched']} low-value chunks batched "
+                   f"({calls_avoided(prefilter_stats)} LLM calls avoided)")
+    pages = summary.get("pages") or {}
+    if pages.get("table") or pages.get("ocr"):
+        st.caption(f"📑 PDF: {pages.get('table', 0)} pages with tables read row by row, "
+                   f"{pages.get('ocr', 0)} scanned pages read with OCR")
+    if pages.get("image"):
+        st.warning(f"⚠️ {pages['image']} pages only hold images and could not be read; "
+                   f"turn on PDF_OCR_ENABLED and install Tesseract to read them with OCR")
+    if summary["merged"]:
+        st.caption(f"🧹 Merged {summary['merged']} duplicate test cases")
+    if summary["failed_chunks"]:
+        st.warning(f"⚠️ {len(summary['failed_chunks'])} chunks could not be processed and have no test cases; "
+                   f"upload the document again to retry them")
+        with st.expander("🧯 Failed chunks"):
+            st.dataframe(pd.DataFrame(summary["failed_chunks"], columns=["Chunk", "Error"]), use_container_width=True)
+    if delta and delta["removed_test_cases"]:
+        st.warning(f"⚠️ {len(delta['removed_test_cases'])} test cases from the previous version came from "
+                   f"removed sections ({', '.join(delta['diff']['removed'][:10])})")
+        with st.expander("🗑️ Test cases of removed sections"):
+            st.dataframe(pd.DataFrame(delta["removed_test_cases"], columns=["Title", "Description"]),
+                         use_container_width=True)
+
+    if not result_df.empty:
+        st.subheader("📋 Generated Test Cases")
+        st.success(f"✅ Successfully generated {len(result_df)} test cases!")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Test Cases", len(result_df))
+        with col2:
+            st.metric("Average Title Length", f"{result_df['Title'].str.len().mean():.0f} chars")
+        with col3:
+            st.metric("Average Description Length", f"{result_df['Description'].str.len().mean():.0f} chars")
+        
+        st.dataframe(result_df, use_container_width=True)
+        if summary.get("trace"):
+            show_traceability(summary["trace"])
+
+        st.subheader("💾 Download Results")
+        export_format = st.selectbox("Format", EXPORT_FORMATS, index=EXPORT_FORMATS.index(EXPORT_FORMAT),
+                                     format_func=str.upper)
+        compression = EXPORT_COMPRESSION if export_format == EXPORT_FORMAT else None
+        try:
+            # The default format was written by the worker; others once per job, straight from the job database
+            export_path = export_job(job_queue, job["id"], export_format, compression)
+        except ImportError as e:
+            st.warning(f"⚠️ {e}")
+        else:
+            with open(export_path, "rb") as export_file:
+                st.download_button(
+                    f"📥 Download Test Cases as {export_format.upper()}",
+                    data=export_file,
+                    file_name=os.path.splitext(CSV_FILENAME)[0] + export_extension(export_format, compression),
+                    mime=export_mime(export_format, compression),
+                    help="Download the generated test cases for import into test management tools"
+                )
+    elif summary["any_rows"]:
+        st.warning("⚠️ No valid test cases could be extracted from the model output.")
+    else:
+        st.warning("⚠️ No test cases were generated. Try a different document or adjust the prompt.")
+
+    if SHOW_DIAGNOSTICS and job["report"]:
+        show_diagnostics(job["report"])
+
+
+job_queue, _ = start_jobs()
+
+# The owner and the job being shown live in the URL, so a refresh picks the job up again
+if "owner" not in st.query_params:
+    st.query_params["owner"] = uuid.uuid4().hex
+owner = st.query_params["owner"]
+
 st.title(APP_TITLE)
 
 st.markdown("""
@@ -19,86 +216,31 @@ st.subheader("📄 Upload Requirements Document")
 uploaded_file = st.file_uploader(UPLOAD_LABEL, type=["docx", "pdf"], help="Supported formats: PDF, DOCX")
 
 if uploaded_file:
-    file_path = f"{TEMP_FILE_PREFIX}{uploaded_file.name}"
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.read())
-
-    try:
-        text = parse_file(file_path)
-        cleaned_text = clean_text(text)
-        chunks = chunk_text(cleaned_text, max_chars=CHUNK_SIZE)
-        
-        if not chunks:
-            st.error("❌ No content could be extracted from the document.")
-            st.info("💡 Make sure your document contains readable text and is not corrupted.")
-        else:
-            st.subheader("🔄 Processing Document")
-            st.info(f"📊 Document split into {len(chunks)} sections for analysis")
-            all_dfs = []
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            for i, chunk in enumerate(chunks):
-                status_text.text(f"🤖 Analyzing requirements chunk {i+1}/{len(chunks)}...")
-                
-                prompt = get_prompt(chunk)
-                output = run_llm(prompt)
-                df = parse_llm_csv_output(output)
-                
-                if df is not None and not df.empty:
-                    all_dfs.append(df)
-                    status_text.text(f"✅ Found {len(df)} test cases in chunk {i+1}")
-                else:
-                    status_text.text(f"📝 No test cases found in chunk {i+1}")
-                
-                progress_bar.progress((i + 1) / len(chunks))
-            
-            status_text.text("🎉 Processing complete!")
-            progress_bar.empty()
-
-            non_empty_dfs = [df for df in all_dfs if df is not None and not df.empty]
-
-            if non_empty_dfs:
-                result_df = pd.concat(non_empty_dfs, ignore_index=True)
-                result_df = clean_test_cases_df(result_df)
-
-                if not result_df.empty:
-                    result_df = add_test_case_ids(result_df)
-
-                    st.subheader("📋 Generated Test Cases")
-                    st.success(f"✅ Successfully generated {len(result_df)} test cases!")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Test Cases", len(result_df))
-                    with col2:
-                        st.metric("Average Title Length", f"{result_df['Title'].str.len().mean():.0f} chars")
-                    with col3:
-                        st.metric("Average Description Length", f"{result_df['Description'].str.len().mean():.0f} chars")
-                    
-                    st.dataframe(result_df, use_container_width=True)
-
-                    csv_buffer = io.StringIO()
-                    result_df.to_csv(csv_buffer, index=False, sep=CSV_SEPARATOR)
-                    csv_data = csv_buffer.getvalue()
-
-                    st.subheader("💾 Download Results")
-                    st.download_button(
-                        "📥 Download Test Cases as CSV", 
-                        data=csv_data, 
-                        file_name=CSV_FILENAME, 
-                        mime="text/csv",
-                        help="Download the generated test cases in CSV format for import into test management tools"
-                    )
-                else:
-                    st.warning("⚠️ No valid test cases could be extracted from the model output.")
-            else:
-                st.warning("⚠️ No test cases were generated. Try a different document or adjust the prompt.")
-    
-    except Exception as e:
-        st.error(f"❌ Error processing document: {str(e)}")
+    # Reruns keep the same upload around; only a new file becomes a new job
+    upload_key = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    if st.session_state.get("upload_key") != upload_key:
+        file_path = save_upload(uploaded_file, uploaded_file.name)
+        st.query_params["job"] = job_queue.submit(file_path, uploaded_file.name, owner)
+        st.session_state["upload_key"] = upload_key
+
+jobs = job_queue.jobs(owner)
+if jobs:
+    with st.sidebar:
+        st.subheader("🗂️ Your Documents")
+        for listed in jobs:
+            if st.button(f"{STATUS_ICONS[listed['status']]} {listed['name']}", key=f"job-{listed['id']}"):
+                st.query_params["job"] = listed["id"]
+
+job = job_queue.get(st.query_params["job"]) if "job" in st.query_params else None
+if job is not None:
+    if job["status"] not in FINISHED:
+        show_progress(job_queue, job)
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+    elif job["status"] == "failed":
+        st.error(f"❌ Error processing document: {job['error']}")
         st.info("💡 Make sure Ollama is running and you have the llama3 model installed.")
-    
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    elif job["status"] == "cancelled":
+        st.warning(f"🛑 Processing of {job['name']} was cancelled.")
+    else:
+        show_results(job_queue, job)
@@ -1,16 +1,117 @@
 # Model Configuration
 DEFAULT_MODEL = "llama3"
-CHUNK_SIZE = 1000  # Maximum characters per chunk
+CHUNK_SIZE = 1000  # Maximum characters per chunk ("chars" chunking mode)
 TIMEOUT_SECONDS = 60  # LLM request timeout
+MODEL_CONTEXT_TOKENS = 8192  # Context window requested from the model (Ollama num_ctx)
+
+# Chunking
+CHUNKING_MODE = "tokens"  # "tokens" (packs requirement sections up to a token budget) or "chars" (fixed CHUNK_SIZE)
+CHUNK_CONTEXT_FRACTION = 0.4  # Share of the context window used by the prompt; the rest is left for output
+CHUNK_OVERLAP_TOKENS = 0  # Trailing context repeated at the start of the next chunk
+CHARS_PER_TOKEN = 4  # Used to estimate token counts without a tokenizer
+
+# LLM Backend
+LLM_BACKEND = "http"  # "http" (Ollama REST API), "pool" (several Ollama servers) or "subprocess" (`ollama run`)
+LLM_FALLBACK_BACKEND = "subprocess"  # Used when the primary backend is unreachable; None to disable
+OLLAMA_HOST = "http://localhost:11434"
+OLLAMA_API = "generate"  # "generate" (/api/generate) or "chat" (/api/chat)
+OLLAMA_KEEP_ALIVE = "30m"  # How long the server keeps the model loaded after a request
+WARM_UP_MODEL = True  # Load the model in the background when the app or batch CLI starts, not on the first chunk
+OLLAMA_OPTIONS = {"num_ctx": MODEL_CONTEXT_TOKENS}  # Generation options passed to Ollama, e.g. {"temperature": 0}
+HTTP_POOL_CONNECTIONS = 1  # Number of host connection pools to cache
+HTTP_POOL_MAXSIZE = 8  # Maximum keep-alive connections per host
+OLLAMA_POOL = []  # Servers for LLM_BACKEND = "pool", e.g. [{"host": "http://gpu1:11434", "max_parallel": 4},
+#                   {"host": "http://gpu2:11434", "model": "llama3:8b-instruct-q4_0"}]; empty = OLLAMA_HOST only
+POOL_HEALTH_CHECK_SECONDS = 30  # How often each server's /api/tags is checked while it is healthy
+POOL_DOWN_RETRY_SECONDS = 15  # How long an unreachable server is skipped before it is checked again
+POOL_HEALTH_TIMEOUT_SECONDS = 3  # Timeout of a health check request
+PROMPT_LAYOUT = "system"  # "system": fixed instructions as the system prompt, so the server can cache them;
+#                           "inline": instructions and chunk in one prompt
+
+# Chunk Processing
+MAX_CONCURRENT_CHUNKS = 4  # Chunks sent to the LLM in parallel; match the server's OLLAMA_NUM_PARALLEL
+CHUNK_TIMEOUT_SECONDS = TIMEOUT_SECONDS  # Base time a single chunk may take before it is given up on
+CHUNK_TIMEOUT_PER_1K_TOKENS = 15  # Extra seconds per 1000 prompt tokens, so large chunks get longer deadlines
+CHUNK_TIMEOUT_MAX_SECONDS = 600  # Upper bound for a chunk deadline
+LLM_RETRIES = 2  # Retries of a chunk after a timeout, dropped stream or overloaded server (429/5xx)
+RETRY_BASE_SECONDS = 1.0  # Backoff before the first retry; doubles per retry, with full jitter
+RETRY_MAX_SECONDS = 30.0  # Longest backoff between retries
+ADAPTIVE_CONCURRENCY = True  # Raise/lower the chunks in flight (AIMD) from observed latency and errors
+ADAPTIVE_MAX_CONCURRENCY = 8  # Upper bound when adapting; MAX_CONCURRENT_CHUNKS is the starting point
+ADAPTIVE_LATENCY_TOLERANCE = 2.0  # Back off when a request is this much slower (per token) than the best seen
+STREAMING_ENABLED = True  # Stream LLM output and show test cases as soon as each row is complete
+STREAM_REFRESH_SECONDS = 0.5  # Minimum time between live table refreshes
+CHUNK_BATCHING = False  # Send several small consecutive chunks in one request with JSON (structured) output
+CHUNK_BATCH_MAX_CHUNKS = 8  # Most chunks in one batched request
+CHUNK_BATCH_MAX_TOKENS = None  # Requirements tokens per batched request (None = the chunk token budget)
+
+# Pre-filter
+PREFILTER_ENABLED = True  # Skip or batch chunks with little requirement language before they reach the LLM
+PREFILTER_SKIP_BELOW = 0.02  # Chunks scoring below this are skipped
+PREFILTER_BATCH_BELOW = 0.2  # Chunks scoring below this are merged into shared LLM calls
+PREFILTER_MODEL = None  # Optional small Ollama model that double-checks chunks before they are skipped
+
+# Result Cache
+CACHE_ENABLED = True  # Reuse parsed results for chunks already seen with the same prompt/model/options
+CACHE_DIR = ".spec2test_cache"
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # Least recently used entries are evicted past this size
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600  # Entries older than this are discarded
+
+# De-duplication
+DEDUP_ENABLED = True  # Merge duplicate and near-duplicate test cases across chunks
+DEDUP_METHOD = "minhash"  # "minhash" (character shingles), "embeddings" (Ollama) or "exact"
+DEDUP_THRESHOLD = 0.8  # Shingle Jaccard similarity at which two test cases count as the same
+DEDUP_EMBEDDING_MODEL = "nomic-embed-text"
+DEDUP_EMBEDDING_THRESHOLD = 0.92  # Cosine similarity used with DEDUP_METHOD = "embeddings"
+
+# Document Versions
+VERSION_STORE_ENABLED = True  # Re-run the LLM only on sections that changed since the last upload of a document
+VERSION_STORE_DIR = ".spec2test_versions"
+VERSION_STORE_KEEP = 5  # Versions kept per document
+
+# Traceability
+TRACE_ENABLED = True  # Link each test case to its source pages, character offsets and requirement IDs
 
 # File Processing
 SUPPORTED_FORMATS = [".pdf", ".docx"]
 TEMP_FILE_PREFIX = "temp_"
+PDF_EXTRACT_WORKERS = None  # Processes used to extract PDF text; None uses every CPU core
+PDF_PARALLEL_MIN_PAGES = 50  # Smaller PDFs are extracted serially
+PDF_PAGES_PER_TASK = 16  # Pages handed to a worker process at a time
+PDF_TABLES_ENABLED = True  # Read ruled tables on PDF pages row by row ("REQ-001 | Login | High")
+PDF_OCR_ENABLED = True  # Run Tesseract on PDF pages that only hold images (skipped if it is not installed)
+PDF_OCR_LANGUAGE = "eng"  # Tesseract language(s), e.g. "eng+deu"
+PDF_OCR_DPI = 300
+PDF_PAGE_CACHE_DIR = ".spec2test_page_cache"  # Pages read through the table finder or OCR; None turns it off
 
 # CSV Configuration
 CSV_SEPARATOR = "|"
 CSV_FILENAME = "spec2test_output.csv"
 
+# Export
+EXPORT_FORMAT = "csv"  # "csv" (with CSV_SEPARATOR), "parquet" (needs pyarrow) or "xlsx" (needs openpyxl)
+EXPORT_COMPRESSION = None  # CSV: "gzip", "bz2" or "xz"; Parquet: "snappy", "gzip", "zstd", "brotli" or "lz4"
+EXPORT_BATCH_ROWS = 10000  # Rows per Parquet row group and per batch read back from the job database
+
+# Batch CLI (spec2test.py)
+BATCH_FILE_WORKERS = 2  # Documents parsed and processed at the same time
+BATCH_MANIFEST = ".spec2test_manifest.json"  # Written to the output directory to resume interrupted runs
+
+# Background Jobs
+JOB_DB_PATH = ".spec2test_jobs/jobs.db"  # SQLite queue shared by the app and its worker processes
+JOB_UPLOAD_DIR = ".spec2test_jobs/uploads"  # Uploaded documents waiting for (or being processed by) a worker
+JOB_EXPORT_DIR = ".spec2test_jobs/exports"  # Download files of finished jobs
+JOB_WORKERS = 2  # Worker processes; they split MAX_CONCURRENT_CHUNKS between them
+JOB_POLL_SECONDS = 1.0  # How often workers check for new jobs and the app refreshes a running job
+JOB_MAX_ATTEMPTS = 2  # Times a job is restarted after its worker died before it is marked failed
+
+# Diagnostics
+SHOW_DIAGNOSTICS = True  # Show stage timings and per-chunk measurements under the results
+PROFILE_OUTPUT = None  # Path for a cProfile dump of each run in the app, e.g. "spec2test.prof"
+
+# Startup
+LAUNCH_CHECK_CACHE = ".spec2test_launch.json"  # launch.py skips the dependency check while the environment is unchanged
+
 # UI Configuration
 APP_TITLE = "Spec2Test Lite - AI Test Case Generator"
-UPLOAD_LABEL = "Upload DOCX or PDF" 
\ No newline at end of file
+UPLOAD_LABEL = "Upload DOCX or PDF"
\ No newline at end of file
@@ -0,0 +1,76 @@
+import json
+
+from config.settings import CHUNK_BATCH_MAX_CHUNKS, CHUNK_BATCH_MAX_TOKENS
+from core.chunker import estimate_tokens, chunk_token_budget
+from core.generator import PLACEHOLDER_VALUES
+
+
+class BatchFormatError(ValueError):
+    """The answer to a batched request could not be split back into its sections."""
+
+
+def pack_batches(items, max_chunks=CHUNK_BATCH_MAX_CHUNKS, max_tokens=None):
+    """
+    Group consecutive (index, chunk) pairs into batches for one request each.
+
+    A batch is closed when it has `max_chunks` chunks or the next chunk would
+    take it past `max_tokens` of requirements text, so a chunk that fills a
+    prompt by itself stays alone. `items` may be a lazy iterator; it is only
+    advanced as far as the batch being built.
+
+    Yields:
+        list: (index, chunk) pairs
+    """
+    max_tokens = max_tokens or CHUNK_BATCH_MAX_TOKENS or chunk_token_budget()
+    batch = []
+    batch_tokens = 0
+    for index, chunk in items:
+        tokens = estimate_tokens(chunk) + 1
+        if batch and (len(batch) >= max_chunks or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((index, chunk))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def parse_batch_output(text, count):
+    """
+    Split the JSON answer to a batched request into the rows of each section.
+
+    Args:
+        text (str): Model output, expected to match prompt.BATCH_SCHEMA
+        count (int): Number of sections in the request
+
+    Returns:
+        list: One list of (title, description) rows per section, in order
+
+    Raises:
+        BatchFormatError: The output is not valid JSON of the expected shape,
+            or names a section that was not in the request
+    """
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise BatchFormatError(f"batched answer is not JSON: {e}")
+    cases = data.get("test_cases") if isinstance(data, dict) else None
+    if not isinstance(cases, list):
+        raise BatchFormatError("batched answer has no test_cases list")
+
+    sections = [[] for _ in range(count)]
+    for case in cases:
+        if not isinstance(case, dict):
+            raise BatchFormatError(f"test case is not an object: {case!r}")
+        section, title, description = case.get("section"), case.get("title"), case.get("description")
+        if isinstance(section, str) and section.strip().isdigit():
+            section = int(section)
+        if not isinstance(section, int) or not 1 <= section <= count:
+            raise BatchFormatError(f"test case names unknown section {section!r}")
+        if not isinstance(title, str) or not isinstance(description, str):
+            raise BatchFormatError(f"test case without title or description: {case!r}")
+        title, description = title.strip(), description.strip()
+        if title in PLACEHOLDER_VALUES or description in PLACEHOLDER_VALUES:
+            continue
+        sections[section - 1].append((title, description))
+    return sections
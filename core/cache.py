@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config.settings import CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_AGE_SECONDS, OLLAMA_OPTIONS
+from core.prompt import prompt_version as current_prompt_version
+
+
+def make_cache_key(chunk, model, options=None, prompt_version=None):
+    """
+    Hash everything that can change the parsed output of a chunk.
+
+    Args:
+        chunk (str): Requirements text sent to the LLM
+        model (str): Model name
+        options (dict): Generation options on top of OLLAMA_OPTIONS
+        prompt_version (str): Version of the prompt as sent (default: prompt.prompt_version())
+
+    Returns:
+        str: Hex digest used as the cache key
+    """
+    merged_options = dict(OLLAMA_OPTIONS)
+    merged_options.update(options or {})
+    material = json.dumps({
+        "chunk": chunk,
+        "model": model,
+        "options": merged_options,
+        "prompt_version": prompt_version or current_prompt_version(),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of parsed test-case rows, one JSON file per key.
+
+    Entries created more than `max_age` seconds ago are treated as misses and
+    removed, however often they are read. When the directory grows past
+    `max_bytes`, the least recently used entries are evicted first (reads
+    refresh an entry's modification time, which only orders eviction).
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Fan out into sub-directories so no single directory gets huge
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _is_expired(self, mtime, now):
+        return self.max_age is not None and now - mtime > self.max_age
+
+    def get(self, key):
+        """Return cached rows for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if self._is_expired(entry.get("created", stat.st_mtime), time.time()):
+                self._remove(path, stat.st_size)
+                rows = None
+            else:
+                rows = entry["rows"]
+                os.utime(path)
+        except (OSError, ValueError, KeyError):
+            rows = None
+
+        with self._lock:
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return rows
+
+    def put(self, key, rows):
+        """Store rows (a list of [title, description] pairs) under `key`."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            old_size = os.path.getsize(path)  # Overwriting an entry replaces its size
+        except OSError:
+            old_size = 0
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": [list(row) for row in rows], "created": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._size is not None:
+                self._size += size - old_size
+            over_limit = self._size is None or self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes."""
+        now = time.time()
+        live = []
+        total = 0
+        for path, size, mtime in self._entries():
+            # An entry last used before max_age was also created before it; entries
+            # that are read but old are caught by get()
+            if self._is_expired(mtime, now):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            live.append((mtime, path, size))
+            total += size
+
+        live.sort()
+        for mtime, path, size in live:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+        with self._lock:
+            self._size = total
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -1,4 +1,62 @@
-from config.settings import CHUNK_SIZE
+import re
+
+from config.settings import (
+    CHUNK_SIZE, CHUNKING_MODE, CHARS_PER_TOKEN, MODEL_CONTEXT_TOKENS,
+    CHUNK_CONTEXT_FRACTION, CHUNK_OVERLAP_TOKENS,
+)
+from core.prompt import get_prompt
+
+# Requirement IDs: REQ-001, FR 12, NFR_3. The prefix is matched case-sensitively
+# (also inside IGNORECASE patterns), so prose such as "contact us 24 hours" is not one.
+REQ_ID_PATTERN = r"(?-i:(?:REQ|FR|NFR|SR|UR|SRS|US)[-_ ]?\d+)"
+REQ_ID_RE = re.compile(rf"\b{REQ_ID_PATTERN}\b")
+
+# Lines that start a new requirement section: REQ-IDs, numbered or markdown
+# headings and numbered list items. Bullets stay with the requirement above them.
+SECTION_START_RE = re.compile(
+    r"^\s*(?:"
+    rf"{REQ_ID_PATTERN}"  # REQ-001, FR 12, NFR_3
+    r"|(?:Requirement|Functional Requirement)\s+[\w.-]+"  # Requirement 4.2
+    r"|\d+(?:\.\d+)*[.)]?\s+\S"  # 3.1 Login, 2. Overview, 4) item
+    r"|#{1,6}\s+\S"  # ## Heading
+    r")",
+    re.IGNORECASE,
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+
+
+class SourceText(str):
+    """
+    Text that remembers where it came from in the document.
+
+    `span` is a dict with "page_start"/"page_end" (None for documents without
+    pages) and "start"/"end" character offsets into the extracted text (what
+    parser.parse_file returns). It behaves as a plain string everywhere else;
+    the chunking functions below keep spans when they split and join text.
+    """
+
+    def __new__(cls, text, span):
+        obj = super().__new__(cls, text)
+        obj.span = span
+        return obj
+
+
+def merge_spans(spans):
+    """Smallest span covering all of `spans` (None entries are ignored)."""
+    spans = [s for s in spans if s]
+    if not spans:
+        return None
+    pages = [p for s in spans for p in (s["page_start"], s["page_end"]) if p is not None]
+    return {"page_start": min(pages) if pages else None, "page_end": max(pages) if pages else None,
+            "start": min(s["start"] for s in spans), "end": max(s["end"] for s in spans)}
+
+
+def join_texts(pieces, separator="\n"):
+    """Join text pieces; the result is a SourceText spanning them if any piece has a span."""
+    text = separator.join(pieces)
+    span = merge_spans([getattr(p, "span", None) for p in pieces])
+    return SourceText(text, span) if span else text
+
 
 def chunk_text(text, max_chars=CHUNK_SIZE):
     """
@@ -40,3 +98,195 @@ def chunk_text(text, max_chars=CHUNK_SIZE):
     
     # Filter out empty chunks
     return [chunk for chunk in chunks if chunk.strip()]
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer needed): roughly CHARS_PER_TOKEN characters per token."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def chunk_token_budget(context_tokens=MODEL_CONTEXT_TOKENS, fraction=CHUNK_CONTEXT_FRACTION):
+    """
+    Tokens of requirements text that fit in one prompt.
+
+    `fraction` of the context window is given to the prompt (instructions plus
+    requirements); the rest is left for the generated test cases.
+    """
+    return max(1, int(context_tokens * fraction) - estimate_tokens(get_prompt("")))
+
+
+def split_sections(lines):
+    """
+    Group lines into requirement sections.
+
+    A section starts at a REQ-ID, heading or list item and runs until the next
+    one, so packing whole sections never cuts a requirement in half.
+
+    Args:
+        lines (iterable): Lines of text (may be a lazy iterator)
+
+    Yields:
+        str: One section of text
+    """
+    current = []
+    for line in lines:
+        if not isinstance(line, SourceText):  # iter_lines already strips located lines
+            line = line.strip()
+        if not line:
+            continue
+        if current and SECTION_START_RE.match(line):
+            yield join_texts(current)
+            current = []
+        current.append(line)
+    if current:
+        yield join_texts(current)
+
+
+def _split_oversized(section, max_tokens):
+    # Fall back to lines, then sentences, then a hard character split
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    for pieces in (section.split("\n"), SENTENCE_END_RE.split(section)):
+        if len(pieces) > 1 and all(len(p) <= max_chars for p in pieces):
+            return chunk_text("\n".join(pieces), max_chars=max_chars)
+    return [section[i:i + max_chars] for i in range(0, len(section), max_chars)]
+
+
+def pack_sections(sections, max_tokens, overlap_tokens=0):
+    """
+    Greedily pack whole sections into chunks of at most `max_tokens`.
+
+    Sections larger than the budget are split on their own. With
+    `overlap_tokens`, trailing sections of the previous chunk are repeated at
+    the start of the next one (up to that many tokens) for context.
+
+    Yields:
+        str: Chunk text
+    """
+    current = []
+    current_tokens = 0
+
+    for section in sections:
+        section_tokens = estimate_tokens(section) + 1
+        if section_tokens > max_tokens:
+            pieces = _split_oversized(section, max_tokens)
+            span = getattr(section, "span", None)
+            if span:
+                # Pieces of a split section point at the whole section
+                pieces = [SourceText(piece, span) for piece in pieces]
+        else:
+            pieces = [section]
+
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                yield join_texts(current)
+                current, current_tokens = _overlap_tail(current, overlap_tokens, max_tokens - piece_tokens)
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        yield join_texts(current)
+
+
+def _overlap_tail(sections, overlap_tokens, room):
+    tail = []
+    tokens = 0
+    limit = min(overlap_tokens, room)
+    for section in reversed(sections):
+        section_tokens = estimate_tokens(section) + 1
+        if tokens + section_tokens > limit:
+            break
+        tail.insert(0, section)
+        tokens += section_tokens
+    return tail, tokens
+
+
+def chunk_requirements(text, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split text into token-budgeted chunks that respect requirement boundaries.
+
+    Args:
+        text (str): Input text to chunk
+        max_tokens (int): Token budget per chunk (default: chunk_token_budget())
+        overlap_tokens (int): Tokens of trailing context repeated in the next chunk
+
+    Returns:
+        list: List of text chunks
+    """
+    if not text or not text.strip():
+        return []
+    if max_tokens is None:
+        max_tokens = chunk_token_budget()
+    return list(pack_sections(split_sections(text.split("\n")), max_tokens, overlap_tokens))
+
+
+def iter_lines(blocks):
+    """
+    Split a stream of text blocks (pages, paragraphs) into lines without joining them.
+
+    Lines of a located block (SourceText, see core.trace) come out stripped,
+    each with its own span.
+    """
+    for block in blocks:
+        span = getattr(block, "span", None)
+        if span is None:
+            yield from block.split("\n")
+            continue
+        position = span["start"]
+        for line in block.split("\n"):
+            stripped = line.strip()
+            start = position + len(line) - len(line.lstrip())
+            yield SourceText(stripped, dict(span, start=start, end=start + len(stripped)))
+            position += len(line) + 1
+
+
+def iter_chunks(blocks, mode=CHUNKING_MODE, stats=None):
+    """
+    Lazily chunk a stream of text blocks, yielding each chunk as soon as it is full.
+
+    Produces the same chunks as chunk_document on the joined text, but only
+    holds one chunk worth of text in memory at a time. With a `stats` dict,
+    "sections" counts the requirement sections read ("chars" mode has no
+    sections and counts its chunks).
+    """
+    if stats is not None:
+        stats.setdefault("sections", 0)
+    if mode == "tokens":
+        sections = split_sections(iter_lines(blocks))
+        if stats is not None:
+            sections = _counted(sections, stats, "sections")
+        yield from pack_sections(sections, chunk_token_budget(), CHUNK_OVERLAP_TOKENS)
+    elif mode == "chars":
+        if stats is not None:
+            yield from _counted(iter_chunks(blocks, mode), stats, "sections")
+            return
+        current = []
+        length = -1
+        for line in iter_lines(blocks):
+            line = line if isinstance(line, SourceText) else line.strip()
+            if not line:
+                continue
+            if current and length + len(line) + 1 > CHUNK_SIZE:
+                yield join_texts(current)
+                current, length = [], -1
+            current.append(line)
+            length += len(line) + 1
+        if current:
+            yield join_texts(current)
+    else:
+        raise ValueError(f"Unknown chunking mode: {mode}")
+
+
+def _counted(items, stats, key):
+    for item in items:
+        stats[key] += 1
+        yield item
+
+
+def chunk_document(text, mode=CHUNKING_MODE):
+    """Chunk text with the configured strategy ("tokens" or the legacy "chars")."""
+    if mode == "chars":
+        return chunk_text(text, max_chars=CHUNK_SIZE)
+    if mode == "tokens":
+        return chunk_requirements(text)
+    raise ValueError(f"Unknown chunking mode: {mode}")
@@ -0,0 +1,244 @@
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from config.settings import (
+    DEDUP_METHOD, DEDUP_THRESHOLD, DEDUP_EMBEDDING_MODEL, DEDUP_EMBEDDING_THRESHOLD, TIMEOUT_SECONDS, LLM_BACKEND,
+)
+from core.llm_backend import get_backend
+
+NORMALIZE_RE = re.compile(r"[^\w\s]+")
+NUMBER_RE = re.compile(r"\d+")
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 61) - 1
+HASH_MAX = (1 << 32) - 1
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants compare equal."""
+    return " ".join(NORMALIZE_RE.sub(" ", str(text).lower()).split())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of overlapping character n-grams of already normalized text."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashIndex:
+    """
+    Near-duplicate lookup on character shingles with MinHash and LSH banding.
+
+    Each text gets a `bands * rows` MinHash signature; texts that share any
+    band land in the same bucket and become candidates, so a lookup only
+    compares against a handful of texts instead of all of them. Candidates
+    are confirmed with the exact Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, bands=16, rows=4, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, HASH_MAX, size=bands * rows, dtype=np.uint64)
+        self._b = rng.integers(0, HASH_MAX, size=bands * rows, dtype=np.uint64)
+        self._buckets = defaultdict(list)
+        self._shingles = {}
+        self._signatures = {}
+
+    def _signature(self, shingle_set):
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # (a * h + b) mod p, with a, b, h < 2^32 so the product never overflows 64 bits
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, item_id, text, accept=None):
+        """
+        Return the id of an indexed near-duplicate of `text`, or index it under
+        `item_id` and return None. `accept(candidate_id)` can veto a match.
+        """
+        shingle_set = shingles(text)
+        signature = self._signature(shingle_set)
+        keys = self._band_keys(signature)
+
+        candidates = list(dict.fromkeys(c for key in keys for c in self._buckets.get(key, ())))
+        if candidates:
+            # Rank by estimated similarity (share of equal signature slots), then confirm exactly
+            estimates = (np.stack([self._signatures[c] for c in candidates]) == signature).mean(axis=1)
+            for position in np.argsort(-estimates, kind="stable"):
+                if estimates[position] < self.threshold - 0.15:
+                    break
+                candidate = candidates[position]
+                if accept is not None and not accept(candidate):
+                    continue
+                if jaccard(shingle_set, self._shingles[candidate]) >= self.threshold:
+                    return candidate
+
+        self._insert(item_id, shingle_set, signature, keys)
+        return None
+
+    def insert(self, item_id, text):
+        """Index `text` under `item_id` without looking for duplicates."""
+        shingle_set = shingles(text)
+        signature = self._signature(shingle_set)
+        self._insert(item_id, shingle_set, signature, self._band_keys(signature))
+
+    def _insert(self, item_id, shingle_set, signature, keys):
+        self._shingles[item_id] = shingle_set
+        self._signatures[item_id] = signature
+        for key in keys:
+            self._buckets[key].append(item_id)
+
+
+class EmbeddingIndex:
+    """
+    Near-duplicate lookup on embedding vectors with random-hyperplane LSH.
+
+    Vectors are hashed by which side of `bands * rows` random hyperplanes they
+    fall on; texts sharing a band are candidates and are confirmed with their
+    cosine similarity.
+    """
+
+    def __init__(self, threshold=DEDUP_EMBEDDING_THRESHOLD, bands=20, rows=10, seed=1):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self._rng = np.random.default_rng(seed)
+        self._planes = None
+        self._buckets = defaultdict(list)
+        self._vectors = {}
+
+    def add(self, item_id, vector, accept=None):
+        """
+        Return the id of an indexed near-duplicate of `vector`, or index it under
+        `item_id` and return None. `accept(candidate_id)` can veto a match.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        if self._planes is None:
+            self._planes = self._rng.standard_normal((self.bands * self.rows, len(vector))).astype(np.float32)
+        bits = (self._planes @ vector) > 0
+        keys = [(band, bits[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+        candidates = list(dict.fromkeys(c for key in keys for c in self._buckets.get(key, ())))
+        if candidates:
+            scores = np.stack([self._vectors[c] for c in candidates]) @ vector
+            for position in np.argsort(-scores, kind="stable"):
+                if scores[position] < self.threshold:
+                    break
+                if accept is None or accept(candidates[position]):
+                    return candidates[position]
+
+        self._vectors[item_id] = vector
+        for key in keys:
+            self._buckets[key].append(item_id)
+        return None
+
+
+class Deduplicator:
+    """
+    Finds test cases that repeat an earlier one, in two passes per text.
+
+    First an exact match on the normalized title and description, then a
+    near-duplicate lookup: MinHash over character shingles, or Ollama
+    embeddings with `method="embeddings"`. If the embeddings endpoint cannot
+    be used, it falls back to MinHash for the rest of the run.
+
+    Near-duplicates must mention the same numbers, so boundary cases such as
+    "8 characters" and "64 characters" stay separate. Kept texts are numbered
+    0, 1, 2... in the order they were added, which is what `add_batch` refers
+    to when it reports a duplicate.
+    """
+
+    def __init__(self, method=DEDUP_METHOD, threshold=None, embedding_model=DEDUP_EMBEDDING_MODEL, backend=None):
+        if method not in ("minhash", "embeddings", "exact"):
+            raise ValueError(f"Unknown de-duplication method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.embedding_model = embedding_model
+        self.backend = backend
+        self.exact_merged = 0
+        self.near_merged = 0
+        self._exact = {}
+        self._kept = []
+        self._numbers = []
+        self._index = self._make_index()
+
+    def _make_index(self):
+        if self.method == "minhash":
+            return MinHashIndex(self.threshold if self.threshold is not None else DEDUP_THRESHOLD)
+        if self.method == "embeddings":
+            return EmbeddingIndex(self.threshold if self.threshold is not None else DEDUP_EMBEDDING_THRESHOLD)
+        return None
+
+    @property
+    def merged(self):
+        return self.exact_merged + self.near_merged
+
+    def add_batch(self, texts):
+        """
+        Check a batch of texts against everything added so far (and each other).
+
+        Returns:
+            list: For each text, None if it was kept, else the number of the
+                kept text it duplicates
+        """
+        normalized = [normalize_text(t) for t in texts]
+        vectors = self._embed(normalized) if self.method == "embeddings" else None
+
+        results = []
+        for i, text in enumerate(normalized):
+            key = hashlib.sha1(text.encode("utf-8")).digest()
+            if key in self._exact:
+                self.exact_merged += 1
+                results.append(self._exact[key])
+                continue
+
+            item_id = len(self._kept)
+            numbers = NUMBER_RE.findall(text)
+            same_numbers = lambda candidate: self._numbers[candidate] == numbers
+            duplicate = None
+            if self.method == "minhash":
+                duplicate = self._index.add(item_id, text, same_numbers)
+            elif self.method == "embeddings":
+                duplicate = self._index.add(item_id, vectors[i], same_numbers)
+            if duplicate is not None:
+                self.near_merged += 1
+                results.append(duplicate)
+                continue
+
+            self._exact[key] = item_id
+            self._kept.append(text)
+            self._numbers.append(numbers)
+            results.append(None)
+        return results
+
+    def _embed(self, texts):
+        if not texts:
+            return []
+        try:
+            backend = self.backend or get_backend("pool" if LLM_BACKEND == "pool" else "http")
+            vectors = backend.embed(texts, self.embedding_model, timeout=TIMEOUT_SECONDS)
+            if len(vectors) != len(texts):
+                raise ValueError("embeddings endpoint returned the wrong number of vectors")
+            return vectors
+        except Exception:
+            # No embeddings model (or no HTTP server): rebuild the index with MinHash and carry on
+            self.method = "minhash"
+            self._index = self._make_index()  # Keeps a threshold passed by the caller
+            for item_id, text in enumerate(self._kept):
+                self._index.insert(item_id, text)
+            return None
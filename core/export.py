@@ -0,0 +1,304 @@
+import bz2
+import csv
+import gzip
+import lzma
+import os
+import tempfile
+
+from config.settings import CSV_SEPARATOR, EXPORT_FORMAT, EXPORT_COMPRESSION, EXPORT_BATCH_ROWS
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+CSV_COMPRESSION = {"gzip": (gzip.open, ".gz"), "bz2": (bz2.open, ".bz2"), "xz": (lzma.open, ".xz")}
+PARQUET_COMPRESSION = ("snappy", "gzip", "zstd", "brotli", "lz4")
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+XLSX_MAX_ROWS = 1048576  # Excel's limit per sheet, header included
+COLUMNS = ["ID", "Title", "Description"]
+
+
+def export_extension(fmt=EXPORT_FORMAT, compression=EXPORT_COMPRESSION):
+    """File extension for a format, e.g. ".csv.gz" for gzip-compressed CSV."""
+    _check(fmt, compression)
+    if fmt == "csv" and compression:
+        return ".csv" + CSV_COMPRESSION[compression][1]
+    return f".{fmt}"
+
+
+def export_mime(fmt=EXPORT_FORMAT, compression=EXPORT_COMPRESSION):
+    """MIME type of an export file."""
+    if fmt == "csv" and compression:
+        return {"gzip": "application/gzip", "bz2": "application/x-bzip2", "xz": "application/x-xz"}[compression]
+    return MIME_TYPES[fmt]
+
+
+def detect_format(path):
+    """(format, compression) of an export file from its extension."""
+    name = path.lower()
+    for compression, (_, suffix) in CSV_COMPRESSION.items():
+        if name.endswith(".csv" + suffix):
+            return "csv", compression
+    fmt = os.path.splitext(name)[1].lstrip(".")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format for {path}; use one of {', '.join(EXPORT_FORMATS)}")
+    return fmt, None
+
+
+def _check(fmt, compression):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if not compression:
+        return
+    if fmt == "csv" and compression not in CSV_COMPRESSION:
+        raise ValueError(f"CSV compression must be one of {', '.join(CSV_COMPRESSION)}, not {compression}")
+    if fmt == "parquet" and compression not in PARQUET_COMPRESSION:
+        raise ValueError(f"Parquet compression must be one of {', '.join(PARQUET_COMPRESSION)}, not {compression}")
+    if fmt == "xlsx":
+        raise ValueError("XLSX files are already compressed; use compression=None")
+
+
+class ExportWriter:
+    """
+    Writes rows to an export file as they arrive, so memory does not grow with the result.
+
+    Rows go to a unique temporary file next to `path` that replaces it on
+    close(), so an interrupted export never leaves a truncated file behind and
+    two exports of the same path never write to the same file; abort() drops
+    it. Used as a context manager, the file is kept only if the block
+    succeeds.
+    """
+
+    def __init__(self, path, columns=COLUMNS):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        fd, self.tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                             dir=os.path.dirname(path) or None)
+        os.close(fd)
+
+    def write_rows(self, rows):
+        count = self._write(rows)
+        self.rows += count
+        return count
+
+    def close(self):
+        self._close()
+        os.chmod(self.tmp_path, 0o644)  # mkstemp makes the file private to its owner
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            self._close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CSVExportWriter(ExportWriter):
+    """CSV with CSV_SEPARATOR, optionally gzip/bz2/xz compressed."""
+
+    def __init__(self, path, columns=COLUMNS, compression=None, separator=CSV_SEPARATOR):
+        super().__init__(path, columns)
+        opener = CSV_COMPRESSION[compression][0] if compression else open
+        self._file = opener(self.tmp_path, "wt", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file, delimiter=separator, lineterminator="\n")
+        self._writer.writerow(self.columns)
+
+    def _write(self, rows):
+        count = 0
+        for row in rows:
+            self._writer.writerow(row)
+            count += 1
+        return count
+
+    def _close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class ParquetExportWriter(ExportWriter):
+    """Parquet (text columns) written one row group per `batch_rows` rows; needs pyarrow."""
+
+    def __init__(self, path, columns=COLUMNS, compression=None, batch_rows=EXPORT_BATCH_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet export: pip install pyarrow")
+        super().__init__(path, columns)
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.string()) for name in self.columns])
+        self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression=compression or "snappy")
+        self._batch_rows = batch_rows
+        self._buffer = []
+
+    def _write(self, rows):
+        count = 0
+        for row in rows:
+            self._buffer.append(row)
+            count += 1
+            if len(self._buffer) >= self._batch_rows:
+                self._flush()
+        return count
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        columns = [[None if value is None else str(value) for value in column] for column in zip(*self._buffer)]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self._schema))
+        self._buffer = []
+
+    def _close(self):
+        if self._writer is None:
+            return
+        try:
+            self._flush()
+        finally:
+            self._writer.close()
+            self._writer = None
+
+
+class XLSXExportWriter(ExportWriter):
+    """Excel workbook in openpyxl's write-only (streaming) mode; continues on a new sheet past Excel's row limit."""
+
+    def __init__(self, path, columns=COLUMNS, compression=None, sheet_name="Test Cases"):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ImportError("openpyxl is required for XLSX export: pip install openpyxl")
+        super().__init__(path, columns)
+        self._workbook = Workbook(write_only=True)
+        self._sheet_name = sheet_name
+        self._sheets = 0
+        self._sheet_rows = XLSX_MAX_ROWS
+        self._saved = False
+
+    def _write(self, rows):
+        count = 0
+        for row in rows:
+            if self._sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.append(list(row))
+            self._sheet_rows += 1
+            count += 1
+        return count
+
+    def _new_sheet(self):
+        self._sheets += 1
+        title = self._sheet_name if self._sheets == 1 else f"{self._sheet_name} {self._sheets}"
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append(self.columns)
+        self._sheet_rows = 1
+
+    def _close(self):
+        if self._saved:
+            return
+        if not self._sheets:
+            self._new_sheet()
+        self._saved = True
+        self._workbook.save(self.tmp_path)
+
+
+WRITERS = {"csv": CSVExportWriter, "parquet": ParquetExportWriter, "xlsx": XLSXExportWriter}
+
+
+def open_export(path, fmt=None, compression=None, columns=COLUMNS):
+    """
+    Open a streaming writer for `path`.
+
+    Args:
+        path (str): Output file
+        fmt (str): "csv", "parquet" or "xlsx" (default: from the extension of `path`)
+        compression (str): CSV: "gzip", "bz2" or "xz"; Parquet: "snappy" (default), "gzip",
+            "zstd", "brotli" or "lz4"; XLSX: none (default: from the extension for CSV)
+        columns (list): Header row
+
+    Returns:
+        ExportWriter: call write_rows() as rows arrive and close() at the end
+    """
+    if fmt is None:
+        fmt, detected = detect_format(path)
+        compression = compression or detected
+    _check(fmt, compression)
+    return WRITERS[fmt](path, columns=columns, compression=compression)
+
+
+def export_rows(rows, path, columns=None):
+    """
+    Stream rows (tuples, or dicts keyed by column name) to an export file
+    without building a DataFrame first. The format and compression come from
+    the extension of `path` (e.g. ".csv.gz", ".parquet").
+
+    Returns:
+        int: Number of rows written
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if isinstance(first, dict):
+        columns = columns or list(first)
+        to_row = lambda item: tuple(item.get(column) for column in columns)
+    else:
+        columns = columns or COLUMNS
+        to_row = tuple
+    with open_export(path, columns=columns) as writer:
+        if first is not None:
+            writer.write_rows([to_row(first)])
+            writer.write_rows(to_row(item) for item in rows)
+    return writer.rows
+
+
+def read_export(path):
+    """
+    Read an export file back without loading it whole.
+
+    Returns:
+        tuple: (columns, iterator of row tuples)
+    """
+    fmt, compression = detect_format(path)
+    if fmt == "csv":
+        return _read_csv(path, compression)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+
+        def parquet_rows():
+            for batch in parquet_file.iter_batches(batch_size=EXPORT_BATCH_ROWS):
+                yield from zip(*(column.to_pylist() for column in batch.columns))
+        return parquet_file.schema_arrow.names, parquet_rows()
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+
+    def xlsx_rows():
+        try:
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                next(rows, None)  # Every sheet repeats the header
+                yield from rows
+        finally:
+            workbook.close()
+    header = next(workbook.worksheets[0].iter_rows(values_only=True), ()) if workbook.worksheets else ()
+    return list(header), xlsx_rows()
+
+
+def _read_csv(path, compression):
+    opener = CSV_COMPRESSION[compression][0] if compression else open
+    f = opener(path, "rt", encoding="utf-8", newline="")
+    reader = csv.reader(f, delimiter=CSV_SEPARATOR)
+    header = next(reader, [])
+
+    def csv_rows():
+        with f:
+            for row in reader:
+                yield tuple(row)
+    return header, csv_rows()
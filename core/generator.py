@@ -1,77 +1,165 @@
 import pandas as pd
-import subprocess
-import io
+import csv
 import re
 
 
-from config.settings import DEFAULT_MODEL, TIMEOUT_SECONDS
+from config.settings import DEFAULT_MODEL, TIMEOUT_SECONDS, LLM_BACKEND, LLM_FALLBACK_BACKEND
+from core.llm_backend import get_backend
 
-def run_llm(prompt, model=DEFAULT_MODEL):
-    cmd = [
-        "ollama", "run", model, prompt
-    ]
 
+def generate(prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, system=None, format=None):
+    """
+    Run the prompt (with an optional system prompt) on the configured backend and return an LLMResult.
+    `format` asks for JSON output ("json" or a JSON schema).
+
+    Falls back to LLM_FALLBACK_BACKEND when the primary backend cannot be reached.
+    """
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=TIMEOUT_SECONDS)
-        if result.returncode != 0:
-            raise Exception(f"Ollama command failed: {result.stderr}")
-        return result.stdout.strip()
-    except subprocess.TimeoutExpired:
-        raise Exception("LLM request timed out. Try with a smaller document or different model.")
-    except FileNotFoundError:
-        raise Exception("Ollama not found. Please install Ollama and ensure it's in your PATH.")
+        try:
+            return get_backend(LLM_BACKEND).generate(prompt, model=model, options=options, timeout=timeout,
+                                                     system=system, format=format)
+        except ConnectionError:
+            if not LLM_FALLBACK_BACKEND or LLM_FALLBACK_BACKEND == LLM_BACKEND:
+                raise
+            return get_backend(LLM_FALLBACK_BACKEND).generate(prompt, model=model, options=options, timeout=timeout,
+                                                              system=system, format=format)
     except Exception as e:
         raise Exception(f"Error running LLM: {str(e)}")
 
 
-from config.settings import CSV_SEPARATOR
-
-def parse_llm_csv_output(output_text):
-    output_text = output_text.strip()
-
-    # Extract the CSV block starting with "Title|Description" header, up to the last line
-    csv_match = re.search(r"(Title\s*\|\s*Description\s*\n(?:.*\|.*\n?)*)", output_text, re.IGNORECASE)
-    if not csv_match:
-        return pd.DataFrame(columns=["Title", "Description"])
-
-    csv_text = csv_match.group(1).strip()
-
-    # Remove any trailing notes or lines that do not look like CSV rows
-    # Keep only lines that have exactly one separator
-    lines = csv_text.splitlines()
-    filtered_lines = [lines[0]]  # header
-    
-    for line in lines[1:]:
-        if re.search(r'ID:\s*Title:\s*Title\s*Description:\s*Description', line, re.IGNORECASE):
-            continue
-            
-        # Count separators; accept line only if exactly one separator (meaning 2 columns)
-        if line.count(CSV_SEPARATOR) == 1:
-            filtered_lines.append(line)
-        else:
-            # Stop parsing once non-CSV row encountered (e.g., notes)
-            break
-
-    csv_text_clean = "\n".join(filtered_lines)
-
-    try:
-        df = pd.read_csv(io.StringIO(csv_text_clean), sep=CSV_SEPARATOR)
-        if {"Title", "Description"}.issubset(df.columns):
-            df = df[["Title", "Description"]]
+def run_llm(prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS):
+    return generate(prompt, model=model, options=options, timeout=timeout).text
+
+
+def stream_llm(prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, stats=None, system=None):
+    """
+    Yield output tokens as the backend produces them.
+
+    Falls back to LLM_FALLBACK_BACKEND only if the primary backend cannot be
+    reached before the first token. Closing the generator stops generation.
+    """
+    backend_names = [LLM_BACKEND]
+    if LLM_FALLBACK_BACKEND and LLM_FALLBACK_BACKEND != LLM_BACKEND:
+        backend_names.append(LLM_FALLBACK_BACKEND)
+
+    for attempt, name in enumerate(backend_names):
+        tokens = get_backend(name).stream(prompt, model=model, options=options, timeout=timeout, stats=stats,
+                                          system=system)
+        try:
+            first = next(tokens, None)
+        except ConnectionError:
+            if attempt + 1 < len(backend_names):
+                continue
+            raise Exception(f"Error running LLM: could not reach backend {name}")
+        except Exception as e:
+            raise Exception(f"Error running LLM: {str(e)}")
+
+        try:
+            if first is not None:
+                yield first
+            for token in tokens:
+                yield token
+        except Exception as e:
+            raise Exception(f"Error running LLM: {str(e)}")
+        finally:
+            tokens.close()
+        return
 
-            # Drop placeholders and empty rows
-            df = df[~((df["Title"].str.strip().isin(["-", "N/A", ""])) |
-                      (df["Description"].str.strip().isin(["-", "N/A", ""])))]
-            df = df.reset_index(drop=True)
 
-            if df.empty:
-                return pd.DataFrame(columns=["Title", "Description"])
+from config.settings import CSV_SEPARATOR
 
-            return df
-        else:
-            return pd.DataFrame(columns=["Title", "Description"])
-    except Exception:
-        return pd.DataFrame(columns=["Title", "Description"])
+COLUMNS = ["Title", "Description"]
+PLACEHOLDER_VALUES = {"-", "N/A", ""}
+HEADER_RE = re.compile(r"Title\s*" + re.escape(CSV_SEPARATOR) + r"\s*Description\s*$", re.IGNORECASE)
+PLACEHOLDER_ROW_RE = re.compile(r"ID:\s*Title:\s*Title\s*Description:\s*Description", re.IGNORECASE)
+
+
+def has_csv_header(output_text):
+    """True if the output contains the Title|Description header line at all."""
+    return any(HEADER_RE.search(line) for line in output_text.splitlines())
+
+
+class RowStreamParser:
+    """
+    Incremental parser for the `Title|Description` table the prompt asks for.
+
+    Feed it text as it arrives; every complete line is checked as soon as its
+    newline lands. Lines before the header are ignored, placeholder rows are
+    dropped, and the first line after the header that is not a two-column row
+    ends the table and sets `done`, so callers can stop generation early.
+    A separator inside a double-quoted field does not count as a column break.
+    """
+
+    def __init__(self, separator=CSV_SEPARATOR):
+        self.separator = separator
+        self.header_seen = False
+        self.done = False
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add text and return the list of (title, description) rows it completed."""
+        if self.done:
+            return []
+        buffer = self._buffer + text
+        rows = []
+        start = 0
+        while not self.done:
+            end = buffer.find("\n", start)
+            if end < 0:
+                break
+            row = self._parse_line(buffer[start:end])
+            if row:
+                rows.append(row)
+            start = end + 1
+        self._buffer = buffer[start:] if not self.done else ""
+        return rows
+
+    def finish(self):
+        """Parse whatever is left after the last newline and return its rows."""
+        rows = []
+        if not self.done and self._buffer.strip():
+            row = self._parse_line(self._buffer)
+            if row:
+                rows.append(row)
+        self._buffer = ""
+        self.done = True
+        return rows
+
+    def _parse_line(self, line):
+        if not self.header_seen:
+            if self.separator in line and HEADER_RE.search(line):
+                self.header_seen = True
+            return None
+
+        if ":" in line and PLACEHOLDER_ROW_RE.search(line):
+            return None
+        fields = self._split(line)
+        if fields is None:
+            self.done = True
+            return None
+
+        title, description = (field.strip() for field in fields)
+        if title in PLACEHOLDER_VALUES or description in PLACEHOLDER_VALUES:
+            return None
+        return title, description
+
+    def _split(self, line):
+        """Split a row into exactly two fields, or return None if it is not a two-column row."""
+        if '"' in line:
+            fields = next(csv.reader([line], delimiter=self.separator, skipinitialspace=True))
+            if len(fields) == 2:
+                return fields
+        # Accept only rows with exactly one separator (meaning 2 columns)
+        if line.count(self.separator) == 1:
+            return line.split(self.separator)
+        return None
+
+
+def parse_rows(output_text, separator=CSV_SEPARATOR):
+    """Parse a complete LLM output in one pass and return its (title, description) rows."""
+    parser = RowStreamParser(separator)
+    return parser.feed(output_text) + parser.finish()
 
 
-        
\ No newline at end of file
+def parse_llm_csv_output(output_text):
+    return pd.DataFrame(parse_rows(output_text), columns=COLUMNS)
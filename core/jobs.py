@@ -0,0 +1,559 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from config.settings import (
+    DEFAULT_MODEL, MAX_CONCURRENT_CHUNKS, CACHE_ENABLED, DEDUP_ENABLED, VERSION_STORE_ENABLED, PREFILTER_ENABLED,
+    STREAM_REFRESH_SECONDS, PROFILE_OUTPUT, JOB_DB_PATH, JOB_UPLOAD_DIR, JOB_WORKERS, JOB_POLL_SECONDS,
+    JOB_MAX_ATTEMPTS, JOB_EXPORT_DIR, LLM_BACKEND, EXPORT_FORMAT, EXPORT_COMPRESSION, EXPORT_BATCH_ROWS, TRACE_ENABLED,
+)
+from core.export import export_extension, open_export
+
+FINISHED = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    updated REAL,
+    finished REAL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    message TEXT,
+    error TEXT,
+    summary TEXT,
+    report TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id TEXT NOT NULL,
+    final INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    test_id TEXT,
+    title TEXT,
+    description TEXT,
+    PRIMARY KEY (job_id, final, seq)
+);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Documents waiting for, or going through, the pipeline, in a SQLite file.
+
+    The queue is shared by the Streamlit app (which submits jobs and polls
+    them) and the worker processes (which claim and run them), so every call
+    opens its own short-lived connection. Live test cases are written while a
+    job runs and replaced by the final, numbered ones when it is done.
+
+    Jobs are claimed oldest first, but owners with fewer running jobs go
+    first, so one user's batch of uploads does not hold everyone else up.
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Autocommit: each statement is its own transaction unless one is opened explicitly
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _update(self, job_id, **fields):
+        fields.setdefault("updated", time.time())
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+    def submit(self, file_path, name, owner, model=DEFAULT_MODEL):
+        """Queue a document for processing and return the job id. The job takes over `file_path`."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, owner, name, file_path, model, status, created, message) "
+                         "VALUES (?, ?, ?, ?, ?, 'queued', ?, 'Waiting for a worker')",
+                         (job_id, owner, name, file_path, model, time.time()))
+        return job_id
+
+    def get(self, job_id):
+        """Job as a dict (summary and report decoded), or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        job["report"] = json.loads(job["report"]) if job["report"] else None
+        return job
+
+    def jobs(self, owner=None, limit=20):
+        """Most recent jobs (of `owner`, if given) without their summary and report."""
+        query = "SELECT id, owner, name, status, created, finished, completed, total, message FROM jobs"
+        params = []
+        if owner is not None:
+            query += " WHERE owner = ?"
+            params.append(owner)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created DESC LIMIT ?", [*params, limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def position(self, job_id):
+        """Number of queued jobs submitted before this one."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < "
+                               "(SELECT created FROM jobs WHERE id = ?)", (job_id,)).fetchone()
+        return row[0]
+
+    def claim(self, worker_pid=None):
+        """Mark the next queued job as running and return it, or None when the queue is empty."""
+        worker_pid = worker_pid or os.getpid()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs AS j WHERE status = 'queued' ORDER BY "
+                    "(SELECT COUNT(*) FROM jobs AS r WHERE r.owner = j.owner AND r.status = 'running'), created "
+                    "LIMIT 1").fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute("UPDATE jobs SET status = 'running', worker_pid = ?, attempts = attempts + 1, "
+                                 "started = ?, updated = ?, message = 'Reading document' WHERE id = ?",
+                                 (worker_pid, now, now, row["id"]))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def progress(self, job_id, completed, total, message):
+        self._update(job_id, completed=completed, total=total, message=message)
+
+    def add_rows(self, job_id, rows, final=False):
+        """Append (title, description) rows, or (id, title, description) rows when `final`."""
+        with self._connect() as conn:
+            start = conn.execute("SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND final = ?",
+                                 (job_id, int(final))).fetchone()[0]
+            values = [(job_id, int(final), start + i, *(row if final else (None, *row)))
+                      for i, row in enumerate(rows)]
+            conn.executemany("INSERT INTO job_rows (job_id, final, seq, test_id, title, description) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", values)
+
+    def rows(self, job_id, final=False):
+        """Live (title, description) rows, or the final (id, title, description) rows."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT test_id, title, description FROM job_rows WHERE job_id = ? AND final = ? "
+                                "ORDER BY seq", (job_id, int(final))).fetchall()
+        return [tuple(row) if final else (row[1], row[2]) for row in rows]
+
+    def iter_rows(self, job_id, final=True, batch_size=EXPORT_BATCH_ROWS):
+        """Like rows(), but fetched `batch_size` at a time so a large result is never loaded whole."""
+        with self._connect() as conn:
+            cursor = conn.execute("SELECT test_id, title, description FROM job_rows WHERE job_id = ? AND final = ? "
+                                  "ORDER BY seq", (job_id, int(final)))
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                for row in batch:
+                    yield tuple(row) if final else (row[1], row[2])
+
+    def clear_rows(self, job_id, final=None):
+        """Delete a job's live rows, its final rows, or both (final=None)."""
+        with self._connect() as conn:
+            if final is None:
+                conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            else:
+                conn.execute("DELETE FROM job_rows WHERE job_id = ? AND final = ?", (job_id, int(final)))
+
+    def finish(self, job_id, summary, report=None):
+        """Mark a job done; its final rows were added while it ran (see JobRowSink)."""
+        self.clear_rows(job_id, final=False)
+        self._update(job_id, status="done", finished=time.time(), message="Processing complete",
+                     summary=json.dumps(summary), report=json.dumps(report) if report else None)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status="failed", finished=time.time(), error=str(error), message="Failed")
+
+    def cancel(self, job_id):
+        """Cancel a queued job right away; a running one stops at its next progress update."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = CASE status WHEN 'queued' THEN 'cancelled' ELSE 'cancelling' END, "
+                         "finished = CASE status WHEN 'queued' THEN ? ELSE finished END "
+                         "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id))
+        job = self.get(job_id)
+        if job is not None and job["status"] == "cancelled" and os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])
+
+    def is_cancelling(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row["status"] == "cancelling"
+
+    def mark_cancelled(self, job_id):
+        self._update(job_id, status="cancelled", finished=time.time(), message="Cancelled")
+
+    def requeue_orphans(self, max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Put running jobs whose worker process is gone back in the queue (or fail
+        them after `max_attempts`, in case the document itself kills workers).
+
+        Returns:
+            int: Number of jobs requeued or failed
+        """
+        with self._connect() as conn:
+            orphans = [dict(row) for row in conn.execute(
+                "SELECT id, status, attempts, worker_pid FROM jobs WHERE status IN ('running', 'cancelling')")
+                if not _pid_alive(row["worker_pid"])]
+        for job in orphans:
+            self.clear_rows(job["id"])
+            if job["status"] == "cancelling":
+                self.mark_cancelled(job["id"])
+            elif job["attempts"] >= max_attempts:
+                self.fail(job["id"], f"Worker stopped unexpectedly {job['attempts']} times")
+            else:
+                self._update(job["id"], status="queued", worker_pid=None, completed=0, total=None,
+                             message="Waiting for a worker (restarted)")
+        return len(orphans)
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def job_export_path(job_id, export_format=EXPORT_FORMAT, compression=EXPORT_COMPRESSION, directory=JOB_EXPORT_DIR):
+    return os.path.join(directory, job_id + export_extension(export_format, compression))
+
+
+def export_job(job_queue, job_id, export_format=EXPORT_FORMAT, compression=EXPORT_COMPRESSION,
+               directory=JOB_EXPORT_DIR):
+    """
+    Path of a download file with a finished job's test cases. The default
+    format is written by run_job while chunks complete; other formats are
+    written on first request by streaming the rows from the queue database
+    (see core.export).
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = job_export_path(job_id, export_format, compression, directory)
+    if not os.path.exists(path):
+        with open_export(path, export_format, compression) as writer:
+            writer.write_rows(job_queue.iter_rows(job_id, final=True))
+    return path
+
+
+def start_warm_up(model=DEFAULT_MODEL, backend=LLM_BACKEND):
+    """
+    Load `model` on the LLM server from a background thread, so the first
+    chunk does not wait for it. Returns the thread; failures are ignored,
+    the first real request reports them.
+    """
+    def warm_up():
+        from core.llm_backend import get_backend  # Imported here to keep it off the app's first render
+        try:
+            get_backend(backend).warm_up(model)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=warm_up, name="spec2test-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def save_upload(data, name, directory=JOB_UPLOAD_DIR):
+    """
+    Write an upload to a unique file in `directory` that a job can own.
+
+    `data` may be bytes, a memoryview, or a file object; BytesIO-like uploads
+    (Streamlit's UploadedFile) are written from their buffer without a copy,
+    other file objects are copied over in blocks.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}_{os.path.basename(name)}")
+    with open(path, "wb") as f:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            f.write(data)
+        elif hasattr(data, "getbuffer"):
+            with data.getbuffer() as buffer:
+                f.write(buffer)
+        else:
+            data.seek(0)
+            shutil.copyfileobj(data, f)
+    return path
+
+
+class JobReporter:
+    """Pipeline callbacks that write a job's progress and live rows to the queue, throttled."""
+
+    def __init__(self, job_queue, job_id, refresh=STREAM_REFRESH_SECONDS):
+        self.queue = job_queue
+        self.job_id = job_id
+        self.refresh = refresh
+        self._rows = []
+        self._last_flush = 0.0
+
+    def flush(self):
+        if self._rows:
+            self.queue.add_rows(self.job_id, self._rows)
+            self._rows = []
+        self._last_flush = time.monotonic()
+        if self.queue.is_cancelling(self.job_id):
+            raise JobCancelled()
+
+    def on_row(self, index, row):
+        self._rows.append(row)
+        if time.monotonic() - self._last_flush >= self.refresh:
+            self.flush()
+
+    def on_result(self, index, df, completed, total):
+        done_text = f"{completed}/{total} done" if total else f"{completed} done, still reading document"
+        if df is not None and not df.empty:
+            message = f"Found {len(df)} test cases in chunk {index + 1} ({done_text})"
+        else:
+            message = f"No test cases found in chunk {index + 1} ({done_text})"
+        self.queue.progress(self.job_id, completed, total, message)
+        self.flush()
+
+
+class JobRowSink:
+    """
+    ResultStore sink (see core.results) for a job: numbered rows go to its
+    download file and, as final rows, to the queue database, so the worker
+    never holds the whole result.
+    """
+
+    def __init__(self, job_queue, job_id, writer):
+        self.queue = job_queue
+        self.job_id = job_id
+        self.writer = writer
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        self.writer.write_rows(rows)
+        self.queue.add_rows(self.job_id, rows, final=True)
+        return len(rows)
+
+
+def run_job(job_queue, job, cache=None, doc_store=None, max_workers=MAX_CONCURRENT_CHUNKS, streaming=True,
+            export_dir=JOB_EXPORT_DIR):
+    """
+    Run the pipeline for a claimed job and store its results (or error) in the queue.
+
+    Test cases are written to the queue database and to the job's download
+    file in the default export format (see export_job) as they are numbered,
+    instead of being collected first, so the download is ready when the job
+    finishes; a failed or cancelled job leaves neither behind.
+
+    The summary saved with the job holds what the app shows under the results:
+    section count, merged duplicates, pre-filter, PDF page and cache stats,
+    chunks that failed, the trace index (see core.trace) and, for delta runs,
+    the version diff and test cases of removed sections.
+    """
+    # Imported here so `import core.jobs` stays cheap for the app process
+    from core.pipeline import process_chunks, document_chunks, process_document_delta, record_prefilter, record_pages
+    from core.prefilter import new_prefilter_stats
+    from core.results import ResultStore
+    from core.dedup import Deduplicator
+    from core.metrics import RunMetrics, profile_to
+    from core.trace import TraceIndex
+
+    job_id = job["id"]
+    reporter = JobReporter(job_queue, job_id)
+    metrics = RunMetrics(job["name"], model=job["model"])
+    dedup = Deduplicator() if DEDUP_ENABLED else None
+    on_row = reporter.on_row if streaming else None
+    trace = TraceIndex() if TRACE_ENABLED else None
+    failures = {}
+    writer = None
+    try:
+        os.makedirs(export_dir, exist_ok=True)
+        writer = open_export(job_export_path(job_id, directory=export_dir), EXPORT_FORMAT, EXPORT_COMPRESSION)
+        # Test cases are appended (and numbered) in document order as chunks complete
+        store = ResultStore(dedup=dedup, sink=JobRowSink(job_queue, job_id, writer), keep_rows=False, trace=trace)
+        with profile_to(PROFILE_OUTPUT):
+            if doc_store is not None:
+                # Only sections changed since this owner's last upload of this file go to the LLM;
+                # other owners' documents of the same name have their own history
+                _, delta = process_document_delta(
+                    job["file_path"], doc_store, f"{job['owner']}/{job['name']}", model=job["model"], cache=cache,
+                    max_workers=max_workers, on_result=reporter.on_result, on_row=on_row, metrics=metrics,
+                    failures=failures, store=store)
+                summary = {
+                    "sections": delta["sections"],
+                    "merged": delta["duplicates_merged"],
+                    "prefilter": delta["prefilter"],
+                    "pages": delta["pages"],
+                    "any_rows": delta["reused_test_cases"] + delta["generated_test_cases"] > 0,
+                    "delta": {key: delta[key] for key in
+                              ("version", "diff", "llm_chunks", "reused_test_cases", "removed_test_cases")},
+                }
+            else:
+                # Pages/paragraphs are read lazily, so the first chunks reach the LLM
+                # while the rest of the document is still being extracted
+                prefilter_stats = new_prefilter_stats()
+                page_stats = {}
+                chunk_stats = {}
+                chunks = document_chunks(job["file_path"], metrics, PREFILTER_ENABLED, prefilter_stats, trace,
+                                         page_stats, chunk_stats)
+                all_dfs = process_chunks(chunks, max_workers=max_workers, model=job["model"],
+                                         on_result=reporter.on_result, cache=cache, on_row=on_row,
+                                         metrics=metrics, store=store, failures=failures)
+                metrics.increment("duplicates_merged", store.merged)
+                record_prefilter(metrics, prefilter_stats)
+                record_pages(metrics, page_stats)
+                metrics.finish()
+                summary = {
+                    "sections": chunk_stats.get("sections", 0),
+                    "merged": store.merged,
+                    "prefilter": prefilter_stats,
+                    "pages": page_stats,
+                    "any_rows": any(df is not None and not df.empty for df in all_dfs),
+                    "delta": None,
+                }
+        summary["cache"] = cache.stats() if cache is not None else None
+        summary["failed_chunks"] = [[index + 1, failures[index]] for index in sorted(failures)]
+        summary["trace"] = trace.to_dict() if trace is not None else None
+        writer.close()
+        job_queue.finish(job_id, summary, metrics.to_dict())
+    except JobCancelled:
+        writer.abort()
+        job_queue.clear_rows(job_id, final=True)
+        job_queue.mark_cancelled(job_id)
+    except Exception as e:
+        if writer is not None:
+            writer.abort()
+        job_queue.clear_rows(job_id, final=True)
+        job_queue.fail(job_id, e)
+    finally:
+        if os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])
+
+
+def run_next(job_queue, **kwargs):
+    """Claim and run one job. Returns its id, or None if nothing was queued."""
+    job = job_queue.claim()
+    if job is None:
+        return None
+    run_job(job_queue, job, **kwargs)
+    return job["id"]
+
+
+def worker_main(db_path=JOB_DB_PATH, workers=JOB_WORKERS, poll=JOB_POLL_SECONDS, parent=None):
+    """
+    Run queued jobs until SIGTERM (after the current job) or, with `parent`,
+    until that process exits. `workers` is the number of workers sharing the
+    LLM server, which splits MAX_CONCURRENT_CHUNKS between them.
+    """
+    from core.cache import ResultCache
+    from core.versions import DocumentStore
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    job_queue = JobQueue(db_path)
+    cache = ResultCache() if CACHE_ENABLED else None
+    doc_store = DocumentStore() if VERSION_STORE_ENABLED else None
+    max_workers = max(1, MAX_CONCURRENT_CHUNKS // max(1, workers))
+    while not stop.is_set() and (parent is None or _pid_alive(parent)):
+        if run_next(job_queue, cache=cache, doc_store=doc_store, max_workers=max_workers) is None:
+            stop.wait(poll)
+
+
+class WorkerPool:
+    """
+    Local worker processes that drain a JobQueue.
+
+    Each worker is a separate `python -m core.jobs` process rather than a
+    multiprocessing child, which would re-run the Streamlit script on start.
+    Workers exit when the process that started them does. A monitor thread
+    restarts workers that died and puts their jobs back in the queue.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH, workers=JOB_WORKERS, poll=JOB_POLL_SECONDS):
+        self.db_path = os.path.abspath(db_path)
+        self.workers = max(1, workers)
+        self.poll = poll
+        self._stop = threading.Event()
+        self._processes = []
+        self._monitor = None
+
+    def _spawn(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+        return subprocess.Popen([sys.executable, "-m", "core.jobs", "--db", self.db_path, "--workers",
+                                 str(self.workers), "--poll", str(self.poll), "--parent", str(os.getpid())], env=env)
+
+    def start(self):
+        JobQueue(self.db_path).requeue_orphans()
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        self._monitor = threading.Thread(target=self._watch, name="spec2test-worker-monitor", daemon=True)
+        self._monitor.start()
+        return self
+
+    def _watch(self):
+        job_queue = JobQueue(self.db_path)
+        while not self._stop.wait(max(self.poll, 1.0)):
+            dead = [i for i, p in enumerate(self._processes) if p.poll() is not None]
+            if dead:
+                job_queue.requeue_orphans()
+                for i in dead:
+                    self._processes[i] = self._spawn()
+
+    def stop(self, timeout=10):
+        """Ask workers to stop after their current job and wait up to `timeout` seconds for them."""
+        self._stop.set()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Spec2Test job worker")
+    parser.add_argument("--db", default=JOB_DB_PATH, help="Job queue database")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Workers sharing the LLM server")
+    parser.add_argument("--poll", type=float, default=JOB_POLL_SECONDS, help="Seconds between queue checks")
+    parser.add_argument("--parent", type=int, help="Exit when this process exits")
+    args = parser.parse_args(argv)
+    worker_main(args.db, args.workers, args.poll, args.parent)
+
+
+if __name__ == "__main__":
+    main()
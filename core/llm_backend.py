@@ -0,0 +1,489 @@
+import codecs
+import json
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import (
+    DEFAULT_MODEL, TIMEOUT_SECONDS, LLM_BACKEND, OLLAMA_HOST, OLLAMA_API,
+    OLLAMA_KEEP_ALIVE, OLLAMA_OPTIONS, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE,
+    OLLAMA_POOL, POOL_HEALTH_CHECK_SECONDS, POOL_DOWN_RETRY_SECONDS, POOL_HEALTH_TIMEOUT_SECONDS,
+)
+
+# Timing/count fields Ollama reports alongside a completion (durations are in nanoseconds)
+STAT_FIELDS = [
+    "total_duration", "load_duration",
+    "prompt_eval_count", "prompt_eval_duration",
+    "eval_count", "eval_duration",
+]
+
+
+# Status codes worth retrying: rate limited, overloaded or briefly unavailable
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMRequestError(Exception):
+    """An LLM request failed. `retryable` is set when the same request may succeed later."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMResult:
+    """Text returned by a backend plus whatever statistics it reported."""
+
+    def __init__(self, text, stats=None, backend=None):
+        self.text = text
+        self.stats = stats or {}
+        self.backend = backend
+
+    def __repr__(self):
+        return f"LLMResult(backend={self.backend!r}, chars={len(self.text)})"
+
+
+def join_system(system, prompt):
+    """One prompt text for backends without a separate system prompt."""
+    return f"{system}\n\n{prompt}" if system else prompt
+
+
+class SubprocessBackend:
+    """Runs one `ollama run` process per prompt. Slow, but needs nothing but the CLI."""
+
+    name = "subprocess"
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, system=None, format=None):
+        cmd = [
+            "ollama", "run", model, *(["--format", "json"] if format else []), join_system(system, prompt)
+        ]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore', timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise LLMRequestError("LLM request timed out. Try with a smaller document or different model.",
+                                  retryable=True)
+        except FileNotFoundError:
+            raise Exception("Ollama not found. Please install Ollama and ensure it's in your PATH.")
+
+        if result.returncode != 0:
+            raise Exception(f"Ollama command failed: {result.stderr}")
+        return LLMResult(result.stdout.strip(), backend=self.name)
+
+    def warm_up(self, model=DEFAULT_MODEL, timeout=TIMEOUT_SECONDS):
+        """Nothing to do: the CLI has no way to load a model without generating."""
+        return False
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, stats=None, system=None):
+        """Yield output text as the CLI prints it. Closing the generator kills the process."""
+        # stderr goes to a file so a chatty CLI can never fill the pipe and stall stdout
+        stderr_file = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(["ollama", "run", model, join_system(system, prompt)],
+                                       stdout=subprocess.PIPE, stderr=stderr_file)
+        except FileNotFoundError:
+            stderr_file.close()
+            raise Exception("Ollama not found. Please install Ollama and ensure it's in your PATH.")
+
+        # Kill a process that outlives the timeout, e.g. when nobody closes the generator
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        try:
+            while True:
+                data = process.stdout.read1(1024)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            if process.wait() != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode("utf-8", errors="ignore")
+                raise Exception(f"Ollama command failed: {stderr}")
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            stderr_file.close()
+
+
+class OllamaHTTPBackend:
+    """
+    Talks to the Ollama REST API over a pooled, keep-alive HTTP session.
+
+    One session is shared by every caller so TCP connections are reused across
+    chunks, and `keep_alive` asks the server to keep the model resident between
+    requests instead of reloading it.
+    """
+
+    name = "http"
+
+    def __init__(self, host=OLLAMA_HOST, api=OLLAMA_API, keep_alive=OLLAMA_KEEP_ALIVE,
+                 pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE):
+        if api not in ("generate", "chat"):
+            raise ValueError(f"Unsupported Ollama API: {api}")
+        self.host = host.rstrip("/")
+        self.api = api
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, model, options, system=None, format=None):
+        payload = {"model": model, "stream": False, "keep_alive": self.keep_alive}
+        if format:
+            payload["format"] = format  # "json" or a JSON schema (structured output)
+        merged_options = dict(OLLAMA_OPTIONS)
+        merged_options.update(options or {})
+        if merged_options:
+            payload["options"] = merged_options
+        if self.api == "chat":
+            payload["messages"] = [{"role": "user", "content": prompt}]
+            if system:
+                payload["messages"].insert(0, {"role": "system", "content": system})
+        else:
+            payload["prompt"] = prompt
+            if system:
+                payload["system"] = system
+        return payload
+
+    def _post(self, path, payload, timeout, stream=False):
+        url = f"{self.host}{path}"
+        try:
+            response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+        except requests.Timeout:
+            raise LLMRequestError("LLM request timed out. Try with a smaller document or different model.",
+                                  retryable=True)
+        except requests.ConnectionError:
+            raise ConnectionError(f"Could not connect to Ollama at {self.host}. Is `ollama serve` running?")
+
+        if response.status_code != 200:
+            detail = response.text.strip()
+            response.close()
+            raise LLMRequestError(f"Ollama request failed ({response.status_code}): {detail}",
+                                  retryable=response.status_code in RETRYABLE_STATUS)
+        return response
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, system=None, format=None):
+        payload = self._payload(prompt, model, options, system, format)
+        data = self._post(f"/api/{self.api}", payload, timeout).json()
+
+        if self.api == "chat":
+            text = data.get("message", {}).get("content", "")
+        else:
+            text = data.get("response", "")
+        stats = {k: data[k] for k in STAT_FIELDS if k in data}
+        return LLMResult(text.strip(), stats=stats, backend=self.name)
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, stats=None, system=None):
+        """
+        Yield tokens as the server produces them.
+
+        Closing the generator early closes the response, which makes Ollama
+        stop generating for this request. If a `stats` dict is given it is
+        filled with the statistics from the final message (only sent when
+        generation runs to completion).
+        """
+        payload = self._payload(prompt, model, options, system)
+        payload["stream"] = True
+        response = self._post(f"/api/{self.api}", payload, timeout, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise Exception(f"Ollama request failed: {data['error']}")
+                if self.api == "chat":
+                    token = data.get("message", {}).get("content", "")
+                else:
+                    token = data.get("response", "")
+                if token:
+                    yield token
+                if data.get("done"):
+                    if stats is not None:
+                        stats.update({k: data[k] for k in STAT_FIELDS if k in data})
+                    break
+        except requests.RequestException as e:
+            raise LLMRequestError(f"LLM stream interrupted: {str(e)}", retryable=True)
+        finally:
+            response.close()
+
+    def embed(self, texts, model, timeout=TIMEOUT_SECONDS):
+        """Return one embedding vector per text from the /api/embed endpoint."""
+        payload = {"model": model, "input": list(texts), "keep_alive": self.keep_alive}
+        data = self._post("/api/embed", payload, timeout).json()
+        return data.get("embeddings", [])
+
+    def warm_up(self, model=DEFAULT_MODEL, timeout=TIMEOUT_SECONDS):
+        """
+        Load `model` into memory without generating anything (a request with no
+        prompt), so the first real request does not pay for the load.
+        """
+        self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive}, timeout).close()
+        return True
+
+    def models(self, timeout=POOL_HEALTH_TIMEOUT_SECONDS):
+        """Names of the models the server has pulled (GET /api/tags)."""
+        try:
+            response = self.session.get(f"{self.host}/api/tags", timeout=timeout)
+        except requests.RequestException:
+            raise ConnectionError(f"Could not connect to Ollama at {self.host}. Is `ollama serve` running?")
+        if response.status_code != 200:
+            raise LLMRequestError(f"Ollama request failed ({response.status_code}): {response.text.strip()}")
+        return [m["name"] for m in response.json().get("models", [])]
+
+    def close(self):
+        self.session.close()
+
+
+def model_tag(model):
+    """Ollama's full model name: "llama3" is "llama3:latest"."""
+    return model if ":" in model else f"{model}:latest"
+
+
+class PoolEndpoint:
+    """One server of a BackendPool, with the state used to route requests to it."""
+
+    def __init__(self, host, model=None, max_parallel=1, backend=None):
+        self.backend = backend or OllamaHTTPBackend(host=host)
+        self.host = self.backend.host
+        self.model = model  # Serve every generation request with this model instead of the requested one
+        self.max_parallel = max(1, max_parallel)
+        self.outstanding = 0
+        self.healthy = True
+        self.models = None  # From the last health check
+        self.checked = None
+        self.requests = 0
+        self.failures = 0
+
+    def serves(self, model, override=True):
+        if override and self.model:
+            return True
+        return self.models is None or model_tag(model) in self.models
+
+    def status(self):
+        return {"host": self.host, "healthy": self.healthy, "outstanding": self.outstanding,
+                "requests": self.requests, "failures": self.failures, "models": self.models}
+
+
+class BackendPool:
+    """
+    Spreads requests over several Ollama servers.
+
+    Each request goes to the healthy server with the fewest outstanding
+    requests relative to its `max_parallel`, among those that have the
+    model. Servers are health-checked through /api/tags when first used and
+    every `health_interval` seconds after that. A server that cannot be
+    reached is skipped for `down_retry` seconds, and the request fails over
+    to the next server. Timeouts and overload answers also fail over, but
+    leave the server in rotation. Streams only fail over before their first
+    token.
+    """
+
+    name = "pool"
+
+    def __init__(self, endpoints=None, health_interval=POOL_HEALTH_CHECK_SECONDS,
+                 down_retry=POOL_DOWN_RETRY_SECONDS, check_timeout=POOL_HEALTH_TIMEOUT_SECONDS):
+        endpoints = endpoints or OLLAMA_POOL or [{"host": OLLAMA_HOST}]
+        self.endpoints = [e if isinstance(e, PoolEndpoint) else PoolEndpoint(**e) for e in endpoints]
+        self.health_interval = health_interval
+        self.down_retry = down_retry
+        self.check_timeout = check_timeout
+        self._lock = threading.Lock()
+        self._first_check = threading.Lock()
+        self._checked_all = False
+
+    @property
+    def capacity(self):
+        """Requests the pool can serve at once (sum of max_parallel)."""
+        return sum(e.max_parallel for e in self.endpoints)
+
+    def status(self):
+        with self._lock:
+            return [e.status() for e in self.endpoints]
+
+    def check_health(self, endpoint):
+        """Probe a server and record whether it is up and which models it has."""
+        try:
+            models = [model_tag(m) for m in endpoint.backend.models(timeout=self.check_timeout)]
+        except Exception:
+            with self._lock:
+                endpoint.healthy = False
+            return False
+        with self._lock:
+            endpoint.healthy = True
+            endpoint.models = models
+        return True
+
+    def _check_all(self):
+        """Probe every server once before the first request, so none is used unchecked."""
+        with self._first_check:
+            if self._checked_all:
+                return
+            for endpoint in self.endpoints:
+                endpoint.checked = time.monotonic()
+                self.check_health(endpoint)
+            self._checked_all = True
+
+    def _checks_due(self, exclude):
+        """Claim the servers whose health check is due, so only one thread probes each."""
+        if not self._checked_all:
+            self._check_all()
+            return []
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for e in self.endpoints:
+                if e in exclude:
+                    continue
+                interval = self.health_interval if e.healthy else self.down_retry
+                if e.checked is None or now - e.checked >= interval:
+                    e.checked = now
+                    due.append(e)
+        return due
+
+    def _acquire(self, model, exclude, override=True):
+        for endpoint in self._checks_due(exclude):
+            self.check_health(endpoint)
+        with self._lock:
+            candidates = [e for e in self.endpoints
+                          if e not in exclude and e.healthy and e.serves(model, override)]
+            if not candidates:
+                return None
+            # Least outstanding requests for its size; the least used server breaks ties
+            endpoint = min(candidates, key=lambda e: (e.outstanding / e.max_parallel, e.requests))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint, failed=False, down=False):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.failures += 1
+            if down:
+                endpoint.healthy = False
+                endpoint.checked = time.monotonic()
+
+    @staticmethod
+    def _fails_over(error):
+        return isinstance(error, ConnectionError) or getattr(error, "retryable", False)
+
+    def _no_server(self, model, last_error):
+        if last_error is not None:
+            return last_error
+        return ConnectionError(f"No reachable Ollama server in the pool has {model}")
+
+    def _call(self, func, model, override=True):
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._acquire(model, tried, override)
+            if endpoint is None:
+                raise self._no_server(model, last_error)
+            tried.append(endpoint)
+            try:
+                result = func(endpoint)
+            except Exception as e:
+                self._release(endpoint, failed=True, down=isinstance(e, ConnectionError))
+                if not self._fails_over(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint)
+            return endpoint, result
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, system=None, format=None):
+        endpoint, result = self._call(
+            lambda e: e.backend.generate(prompt, model=e.model or model, options=options, timeout=timeout,
+                                         system=system, format=format), model)
+        result.stats["host"] = endpoint.host
+        return result
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, timeout=TIMEOUT_SECONDS, stats=None, system=None):
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._acquire(model, tried)
+            if endpoint is None:
+                raise self._no_server(model, last_error)
+            tried.append(endpoint)
+            tokens = endpoint.backend.stream(prompt, model=endpoint.model or model, options=options,
+                                             timeout=timeout, stats=stats, system=system)
+            failed = down = False
+            try:
+                try:
+                    first = next(tokens, None)
+                except Exception as e:
+                    failed, down = True, isinstance(e, ConnectionError)
+                    if not self._fails_over(e):
+                        raise
+                    last_error = e
+                    continue
+                if stats is not None:
+                    stats["host"] = endpoint.host
+                if first is not None:
+                    yield first
+                for token in tokens:
+                    yield token
+                return
+            except Exception:
+                failed = True
+                raise
+            finally:
+                tokens.close()
+                self._release(endpoint, failed, down)
+
+    def warm_up(self, model=DEFAULT_MODEL, timeout=TIMEOUT_SECONDS):
+        """Load the model on every healthy server that serves it; True if any of them did."""
+        self._check_all()
+        with self._lock:
+            endpoints = [e for e in self.endpoints if e.healthy and e.serves(model)]
+        warmed = False
+        for endpoint in endpoints:
+            try:
+                warmed = endpoint.backend.warm_up(endpoint.model or model, timeout=timeout) or warmed
+            except Exception:
+                pass  # A server that cannot load the model now will be health checked as usual
+        return warmed
+
+    def embed(self, texts, model, timeout=TIMEOUT_SECONDS):
+        return self._call(lambda e: e.backend.embed(texts, model, timeout=timeout), model, override=False)[1]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.backend.close()
+
+
+BACKENDS = {
+    "subprocess": SubprocessBackend,
+    "http": OllamaHTTPBackend,
+    "pool": BackendPool,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=LLM_BACKEND):
+    """Return the shared backend instance for `name`, creating it on first use."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def set_backend(name, backend):
+    """Replace the shared instance for `name`, e.g. to point the HTTP backend at another host."""
+    with _instances_lock:
+        _instances[name] = backend
@@ -0,0 +1,179 @@
+import contextlib
+import cProfile
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from config.settings import DEFAULT_MODEL, CHUNKING_MODE, MAX_CONCURRENT_CHUNKS, LLM_BACKEND, CHUNK_BATCHING
+from core.prompt import prompt_version
+
+
+class RunMetrics:
+    """
+    Timing and size measurements for one pipeline run.
+
+    Stages are timed exclusively: when a stage runs inside another one (e.g.
+    chunking pulls pages from the parser), the inner time is subtracted from
+    the outer stage. Stages may be entered from several threads at once, so
+    with concurrent chunks the LLM stage total can exceed the run's wall time.
+    """
+
+    def __init__(self, name=None, model=DEFAULT_MODEL):
+        self.name = name
+        self.model = model
+        self.started = time.time()
+        self.stages = {}
+        self.chunks = []
+        self.counters = {}
+        self.finished = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0.0]  # Time spent in nested stages
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            with self._lock:
+                totals = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+                totals["seconds"] += elapsed - frame[0]
+                totals["calls"] += 1
+
+    def timed_iter(self, name, iterable):
+        """Wrap an iterator so the time spent producing each item is charged to `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record_chunk(self, record):
+        with self._lock:
+            self.chunks.append(record)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def finish(self):
+        self.finished = time.time()
+
+    def totals(self, wall_seconds=None):
+        """Sums over the chunk records; with `wall_seconds`, also LLM calls and test cases per second."""
+        with self._lock:
+            chunks = list(self.chunks)
+        eval_count = sum(c.get("eval_count", 0) for c in chunks)
+        eval_seconds = sum(c.get("eval_duration", 0) for c in chunks) / 1e9
+        llm_chunks = sum(1 for c in chunks if "prompt_eval_count" in c)
+        saved_seconds = sum(c.get("prompt_eval_saved_seconds", 0) for c in chunks)
+        # Batched requests whose answer could not be split leave no chunk record, only a counter
+        llm_calls = sum(1 for c in chunks if "prompt_chars" in c) + self.counters.get("batch_fallbacks", 0)
+        test_cases = sum(c.get("rows", 0) for c in chunks)
+        totals = {
+            "chunks": len(chunks),
+            "cache_hits": sum(1 for c in chunks if c.get("cache_hit")),
+            "parse_failures": sum(1 for c in chunks if c.get("parse_failed")),
+            "test_cases": test_cases,
+            "llm_calls": llm_calls,
+            "batched_chunks": sum(c.get("batch_size", 0) for c in chunks),
+            "prompt_chars": sum(c.get("prompt_chars", 0) for c in chunks),
+            "response_chars": sum(c.get("response_chars", 0) for c in chunks),
+            "prompt_tokens": sum(c.get("prompt_eval_count", 0) for c in chunks),
+            "prompt_cached_tokens": sum(c.get("prompt_cached_tokens", 0) for c in chunks),
+            "prompt_eval_seconds": round(sum(c.get("prompt_eval_duration", 0) for c in chunks) / 1e9, 4),
+            "prompt_eval_saved_seconds": round(saved_seconds, 4),
+            "prompt_eval_saved_per_chunk": round(saved_seconds / llm_chunks, 4) if llm_chunks else None,
+            "eval_tokens": eval_count,
+            "tokens_per_second": round(eval_count / eval_seconds, 2) if eval_seconds else None,
+            "chunk_seconds": round(sum(c.get("seconds", 0) for c in chunks), 4),
+        }
+        if wall_seconds:
+            totals["llm_calls_per_second"] = round(llm_calls / wall_seconds, 2)
+            totals["test_cases_per_second"] = round(test_cases / wall_seconds, 2)
+        return totals
+
+    def to_dict(self):
+        end = self.finished or time.time()
+        with self._lock:
+            stages = {name: {"seconds": round(v["seconds"], 4), "calls": v["calls"]} for name, v in self.stages.items()}
+            chunks = sorted(self.chunks, key=lambda c: c.get("index", 0))
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "wall_seconds": round(end - self.started, 4),
+            "settings": {
+                "model": self.model,
+                "backend": LLM_BACKEND,
+                "chunking_mode": CHUNKING_MODE,
+                "max_concurrent_chunks": MAX_CONCURRENT_CHUNKS,
+                "chunk_batching": CHUNK_BATCHING,
+                "prompt_version": prompt_version(),
+            },
+            "stages": stages,
+            "totals": self.totals(end - self.started),
+            "counters": counters,
+            "chunks": chunks,
+        }
+
+    def to_json(self, path=None):
+        """Return the run report as JSON, also writing it to `path` if given."""
+        report = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(report)
+        return report
+
+
+def prompt_cache_savings(record):
+    """
+    Estimate the prompt evaluation a chunk was spared by the server's prompt cache.
+
+    Ollama's `prompt_eval_count` only counts the prompt tokens it actually
+    evaluated; the rest of the prompt (`prompt_tokens`, estimated, at most the
+    fixed `prefix_tokens`) was served from the cache. The time saved is those
+    tokens at the chunk's own prompt evaluation rate.
+    """
+    evaluated = record.get("prompt_eval_count")
+    if not evaluated or not record.get("prompt_tokens") or not record.get("prompt_eval_duration"):
+        return {}
+    cached = min(max(0, record["prompt_tokens"] - evaluated), record.get("prefix_tokens") or record["prompt_tokens"])
+    seconds_per_token = record["prompt_eval_duration"] / 1e9 / evaluated
+    return {"prompt_cached_tokens": cached, "prompt_eval_saved_seconds": round(cached * seconds_per_token, 4)}
+
+
+def stage(metrics, name):
+    """`metrics.stage(name)`, or a no-op when metrics are not being collected."""
+    return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def profile_to(path):
+    """
+    Run the block under cProfile and dump the stats to `path` (view with
+    `python -m pstats` or snakeviz). Only the calling thread is profiled;
+    LLM worker threads show up as time spent waiting on them. Does nothing
+    when `path` is empty.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -1,30 +1,411 @@
-import fitz
-import docx
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+from config.settings import (
+    PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK, TEMP_FILE_PREFIX, PDF_TABLES_ENABLED,
+    PDF_OCR_ENABLED, PDF_OCR_LANGUAGE, PDF_OCR_DPI, PDF_PAGE_CACHE_DIR,
+)
 
-def parse_file(file_path):
-    if file_path.endswith(".pdf"):
-        return parse_pdf(file_path)
-    elif file_path.endswith(".docx"):
-        return parse_docx(file_path)
+CLEAN_TEXT_KEYWORDS = ["Requirement", "REQ", "Functional Requirement"]
+PAGE_EXTRACTION_VERSION = 1  # Bump when extract_page changes, so cached pages are read again
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def source_name(source):
+    """File name of a document source: the path itself, or the `name` of an upload or open file."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return getattr(source, "name", None)
+
+
+def document_type(source, name=None):
+    """
+    "pdf" or "docx" for a document source, from its file name or, for
+    nameless bytes and streams, from the leading magic bytes.
+    """
+    name = (name or source_name(source) or "").lower()
+    if name.endswith(".pdf"):
+        return "pdf"
+    if name.endswith(".docx"):
+        return "docx"
+    if not name and not isinstance(source, (str, os.PathLike)):
+        head = _head(source)
+        if head == b"%PDF":
+            return "pdf"
+        if head == b"PK\x03\x04":  # DOCX files are zip archives
+            return "docx"
+    raise ValueError("Unsupported file type")
+
+
+def _head(source, size=4):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    position = source.tell()
+    head = source.read(size)
+    source.seek(position)
+    return head
+
+
+def _buffer(source):
+    """
+    The bytes of an in-memory source without copying them: bytes and
+    memoryviews as they are, BytesIO-like uploads through getbuffer(), and
+    other file objects read once.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    source.seek(0)
+    return source.read()
+
+
+def _open_pdf(source):
+    import fitz  # PyMuPDF and python-docx are only loaded for the file types that need them
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open(stream=_buffer(source), filetype="pdf")
+
+
+@contextlib.contextmanager
+def _source_path(source, suffix):
+    """
+    A file path for `source`, for code that cannot take a stream (worker
+    processes). Paths are used as they are; in-memory sources are written
+    once to a unique temporary file that is removed afterwards.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    fd, path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_buffer(source))
+        yield path
+    finally:
+        os.remove(path)
+
+
+def parse_file(source, name=None):
+    """
+    Full text of a document.
+
+    Args:
+        source: File path, bytes/memoryview, or binary file object (e.g. a
+            Streamlit upload) of a PDF or DOCX document
+        name (str): File name used to tell the type (default: from `source`)
+    """
+    if document_type(source, name) == "pdf":
+        return parse_pdf(source)
+    return parse_docx(source)
+
+
+def iter_blocks(source, name=None, stats=None):
+    """
+    Lazily yield text blocks from a document: one per page for PDFs, one per
+    non-empty paragraph for DOCX files. `source` is anything parse_file takes;
+    for PDFs, `stats` counts how pages were read (see iter_pdf_pages).
+    """
+    if document_type(source, name) == "pdf":
+        return iter_pdf_pages(source, cache=page_cache(), stats=stats)
+    return iter_docx_paragraphs(source)
+
+
+def iter_pdf_pages(source, workers=PDF_EXTRACT_WORKERS, min_pages=PDF_PARALLEL_MIN_PAGES, cache=None, stats=None,
+                   tables=PDF_TABLES_ENABLED, ocr=PDF_OCR_ENABLED):
+    """
+    Yield the text of each PDF page in order, as read by extract_page.
+
+    Documents with at least `min_pages` pages are extracted on a process pool
+    (PyMuPDF text extraction is CPU-bound); smaller ones are read serially,
+    where starting worker processes would cost more than it saves, except for
+    OCR: image-only pages still go to worker processes while the next pages
+    are read. In-memory documents are read from their buffer, and written to
+    a temporary file only when the process pool needs a path.
+
+    Args:
+        cache (ResultCache): Optional cache of pages read through the table finder
+            or OCR (see page_cache()), keyed by the document's content, the page
+            number and the options
+        stats (dict): Optional, counts pages per kind (see extract_page) and
+            pages taken from the cache ("cached")
+        tables (bool): Read ruled tables row by row
+        ocr (bool): OCR image-only pages when Tesseract is installed
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats if stats is not None else {}
+    keys = []
+
+    def cached(index):
+        rows = cache.get(keys[index]) if cache is not None else None
+        if rows is None:
+            return None
+        stats["cached"] = stats.get("cached", 0) + 1
+        return rows[0][1]
+
+    def done(index, text, kind):
+        stats[kind] = stats.get(kind, 0) + 1
+        # Only pages read the slow way: a text layer is faster to read again than to cache, and
+        # unread image pages are tried again, e.g. once Tesseract is installed
+        if cache is not None and kind in ("table", "ocr"):
+            cache.put(keys[index], [[kind, text]])
+        return text
+
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        if cache is not None:
+            keys = _page_keys(source, page_count, tables, ocr)
+        if workers <= 1 or page_count < min_pages:
+            yield from _iter_pdf_pages_serial(source, doc, workers, tables, ocr, cached, done)
+            return
+        texts = {}
+        missing = []
+        for index in range(page_count):
+            text = cached(index)
+            if text is None:
+                missing.append(index)
+            else:
+                texts[index] = text
+
+    tasks = [missing[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(missing), PDF_PAGES_PER_TASK)]
+    yielded = 0
+    try:
+        with _source_path(source, ".pdf") as file_path, \
+                contextlib.closing(_iter_pdf_pages_parallel(file_path, tasks, workers, tables, ocr)) as results:
+            for index in range(page_count):
+                if index in texts:
+                    yield texts.pop(index)
+                else:
+                    _, (text, kind) = next(results)
+                    yield done(index, text, kind)
+                yielded += 1
+    except BrokenProcessPool:
+        # Worker processes could not start or died; finish the remaining pages here
+        with _open_pdf(source) as doc:
+            for index in range(yielded, page_count):
+                text = texts.pop(index, None)
+                yield text if text is not None else done(index, *extract_page(doc[index], tables, ocr))
+
+
+def _iter_pdf_pages_serial(source, doc, workers, tables, ocr, cached, done):
+    pending = deque()  # (page index, text or the Future of an OCR worker)
+    with contextlib.ExitStack() as stack:
+        executor = None
+        file_path = None
+        pool_broken = False
+
+        def resolve(index, result):
+            if isinstance(result, str):
+                return result
+            try:
+                return done(index, *result.result()[0])
+            except BrokenProcessPool:
+                return done(index, *extract_page(doc[index], tables, ocr))
+
+        for index, page in enumerate(doc):
+            text = cached(index)
+            if text is not None:
+                pending.append((index, text))
+                continue
+            text_layer = page.get_text()
+            future = None
+            if workers > 1 and not pool_broken and needs_ocr(page, ocr, text_layer):
+                try:
+                    if executor is None:
+                        file_path = stack.enter_context(_source_path(source, ".pdf"))
+                        executor = stack.enter_context(_process_pool(workers))
+                    future = executor.submit(_extract_pages, file_path, [index], tables, ocr)
+                except BrokenProcessPool:
+                    pool_broken = True  # Worker processes could not start or died; OCR the rest here
+            if future is not None:
+                pending.append((index, future))
+            else:
+                pending.append((index, done(index, *extract_page(page, tables, ocr, text_layer))))
+            # Pages come out in order; keep reading ahead while OCR runs, up to a bounded window
+            while pending and (isinstance(pending[0][1], str) or pending[0][1].done() or len(pending) > workers * 2):
+                yield resolve(*pending.popleft())
+        while pending:
+            yield resolve(*pending.popleft())
+
+
+def extract_page(page, tables=PDF_TABLES_ENABLED, ocr=PDF_OCR_ENABLED, text=None):
+    """
+    Text of one PDF page and how it was read. `text` is the page's text
+    layer, when the caller has already read it.
+
+    Returns:
+        tuple: (text, kind). `kind` is "text" (text layer), "table" (text layer
+            with ruled tables, each table row on one line with " | " between
+            cells), "ocr" (image-only page read by Tesseract) or "image"
+            (image-only page left unread: OCR is off or Tesseract is missing)
+    """
+    if text is None:
+        text = page.get_text()
+    if text.strip():
+        # The table finder is slow, and ruled tables need vector lines: pages without drawings skip it
+        if tables and page.get_cdrawings():
+            table_text = _text_with_tables(page)
+            if table_text is not None:
+                return table_text, "table"
+        return text, "text"
+    if not page.get_images():
+        return text, "text"
+    if ocr and ocr_available():
+        try:
+            textpage = page.get_textpage_ocr(language=PDF_OCR_LANGUAGE, dpi=PDF_OCR_DPI, full=True)
+            return page.get_text(textpage=textpage), "ocr"
+        except Exception:
+            pass  # Tesseract could not run or read this page (the error type depends on the PyMuPDF version)
+    return text, "image"
+
+
+def needs_ocr(page, ocr=PDF_OCR_ENABLED, text=None):
+    """
+    True if extract_page would run OCR on `page`: it has images and no text
+    layer. `text` is the text layer, when the caller has already read it.
+    """
+    if not ocr:
+        return False
+    if text is None:
+        text = page.get_text()
+    return bool(not text.strip() and page.get_images() and ocr_available())
+
+
+@functools.lru_cache(maxsize=None)
+def ocr_available():
+    """True if Tesseract, which PyMuPDF runs for OCR, is installed."""
+    return bool(os.environ.get("TESSDATA_PREFIX")) or shutil.which("tesseract") is not None
+
+
+def _text_with_tables(page):
+    """
+    Page text with every table found replaced by its rows, or None without tables.
+
+    Text blocks keep the order get_text() reads them in; each table takes the
+    place of the first block inside it.
+    """
+    import fitz
+    found = page.find_tables().tables
+    if not found:
+        return None
+    boxes = [fitz.Rect(table.bbox) for table in found]
+    parts = []
+    emitted = set()
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        if block_type != 0:
+            continue
+        center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+        inside = next((i for i, box in enumerate(boxes) if center in box), None)
+        if inside is None:
+            parts.append(text.rstrip("\n"))
+        elif inside not in emitted:
+            emitted.add(inside)
+            parts.append(_table_text(found[inside]))
+    parts.extend(_table_text(table) for i, table in enumerate(found) if i not in emitted)
+    return "\n".join(parts) + "\n"
+
+
+def _table_text(table):
+    rows = [" | ".join(" ".join((cell or "").split()) for cell in row) for row in table.extract()]
+    return "\n".join(row for row in rows if row.strip(" |"))
+
+
+def _extract_pages(file_path, indexes, tables, ocr):
+    # Runs in a worker process: each worker opens its own handle on the document
+    with _open_pdf(file_path) as doc:
+        return [extract_page(doc[i], tables, ocr) for i in indexes]
+
+
+def _process_pool(workers):
+    # "spawn" avoids forking a multi-threaded process (Streamlit, LLM worker threads)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _iter_pdf_pages_parallel(file_path, tasks, workers, tables, ocr):
+    with _process_pool(workers) as executor:
+        # Keep a bounded window of page ranges in flight so extracted text
+        # never piles up far ahead of the consumer
+        in_flight = deque()
+        for indexes in tasks:
+            in_flight.append((indexes, executor.submit(_extract_pages, file_path, indexes, tables, ocr)))
+            if len(in_flight) >= workers * 2:
+                indexes, future = in_flight.popleft()
+                yield from zip(indexes, future.result())
+        while in_flight:
+            indexes, future = in_flight.popleft()
+            yield from zip(indexes, future.result())
+
+
+def _page_keys(source, page_count, tables, ocr):
+    """Cache key of every page: the document's content hash, the page number and the extraction options."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(_buffer(source))
+    options = json.dumps({"tables": tables, "ocr": ocr, "language": PDF_OCR_LANGUAGE, "dpi": PDF_OCR_DPI,
+                          "version": PAGE_EXTRACTION_VERSION}, sort_keys=True)
+    document = digest.hexdigest()
+    return [hashlib.sha256(f"{document}:{index}:{options}".encode("utf-8")).hexdigest() for index in range(page_count)]
+
+
+def page_cache():
+    """Cache of table and OCR pages shared by the process, or None if PDF_PAGE_CACHE_DIR is not set."""
+    global _page_cache
+    if not PDF_PAGE_CACHE_DIR:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            from core.cache import ResultCache
+            _page_cache = ResultCache(PDF_PAGE_CACHE_DIR)
+        return _page_cache
+
+
+def iter_docx_paragraphs(source):
+    import docx
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
+
+    if isinstance(source, (str, os.PathLike)):
+        doc = docx.Document(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        doc = docx.Document(io.BytesIO(source))
     else:
-        raise ValueError("Unsupported file type")
+        source.seek(0)
+        doc = docx.Document(source)
+    # Walk the body XML directly instead of doc.paragraphs, which builds a list of all of them
+    for element in doc.element.body.iterchildren(qn("w:p")):
+        text = Paragraph(element, doc).text
+        if text.strip():
+            yield text
 
 
-def parse_pdf(file_path):
-    doc = fitz.open(file_path)
-    text = "\n".join(page.get_text() for page in doc)
-    return text
+def parse_pdf(source):
+    return "\n".join(iter_pdf_pages(source, cache=page_cache()))
 
 
-def parse_docx(file_path):
-    doc = docx.Document(file_path)
-    return "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+def parse_docx(source):
+    return "\n".join(iter_docx_paragraphs(source))
 
 
 def clean_text(text):
     # Naive approach: find first occurrence of "Requirement" or "REQ"
-    keywords = ["Requirement", "REQ", "Functional Requirement"]
+    keywords = CLEAN_TEXT_KEYWORDS
     indices = [text.find(k) for k in keywords if text.find(k) != -1]
     if indices:
         start = min(indices)
@@ -32,6 +413,25 @@ def clean_text(text):
     return text  # fallback to full text if no keyword found
 
 
+def clean_blocks(blocks):
+    """
+    Streaming version of clean_text: drop blocks before the first requirement keyword.
+
+    Blocks are held back only until a keyword shows up; if none ever does,
+    everything is yielded at the end, like clean_text's full-text fallback.
+    """
+    held = []
+    blocks = iter(blocks)
+    for block in blocks:
+        indices = [block.find(k) for k in CLEAN_TEXT_KEYWORDS if block.find(k) != -1]
+        if indices:
+            yield block[min(indices):]
+            yield from blocks
+            return
+        held.append(block)
+    yield from held
+
+
 def clean_test_cases_df(df):
     # Keep rows with non-empty Title
     cleaned_df = df[df["Title"].str.strip().astype(bool)].copy()
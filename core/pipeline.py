@@ -0,0 +1,834 @@
+import os
+import queue
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from config.settings import (
+    DEFAULT_MODEL, MAX_CONCURRENT_CHUNKS, CHUNK_TIMEOUT_SECONDS, DEDUP_ENABLED, PREFILTER_ENABLED,
+    ADAPTIVE_CONCURRENCY, ADAPTIVE_MAX_CONCURRENCY, LLM_BACKEND, CHUNK_BATCHING,
+)
+from core.parser import iter_blocks, clean_blocks, source_name, document_type
+from core.chunker import iter_chunks, pack_sections, chunk_token_budget, estimate_tokens, join_texts
+from core.prompt import build_prompt, build_batch_prompt, prompt_version, BATCH_SCHEMA
+from core.generator import generate, stream_llm, RowStreamParser, COLUMNS
+from core.llm_backend import get_backend
+from core.cache import make_cache_key
+from core.results import ResultStore
+from core.trace import SourceMap
+from core.dedup import Deduplicator
+from core.versions import fingerprint_sections, iter_sections, group_sections, iter_groups, diff_sections
+from core.prefilter import filter_chunks, classify_chunk, new_prefilter_stats, calls_avoided
+from core.metrics import stage, prompt_cache_savings
+from core.scheduler import AdaptiveLimiter, chunk_deadline, call_with_retries, limiter_slot
+from core.batching import BatchFormatError, pack_batches, parse_batch_output
+
+POLL_INTERVAL = 0.25  # Seconds between deadline checks while waiting on workers
+PREFETCH_CHUNKS = 2  # Chunks queued per worker ahead of time when reading a chunk stream
+
+
+def stream_chunk(chunk, on_row, model=DEFAULT_MODEL, timeout=CHUNK_TIMEOUT_SECONDS, metrics=None, record=None):
+    """
+    Stream the LLM output for a chunk, calling `on_row(row)` for each test case
+    as soon as its line is complete. Generation stops as soon as the table ends.
+
+    If a `record` dict is given it is filled with sizes and backend statistics.
+    """
+    record = record if record is not None else {}
+    parser = RowStreamParser()
+    rows = []
+    response_chars = 0
+    stats = {}
+    system, prompt = build_prompt(chunk)
+    _record_prompt(record, system, prompt)
+
+    with stage(metrics, "llm_wait"):
+        tokens = stream_llm(prompt, model=model, timeout=timeout, stats=stats, system=system)
+        try:
+            for token in tokens:
+                response_chars += len(token)
+                with stage(metrics, "parse_output"):
+                    new_rows = parser.feed(token)
+                for row in new_rows:
+                    rows.append(row)
+                    on_row(row)
+                if parser.done:
+                    record["stopped_early"] = True
+                    break
+        finally:
+            tokens.close()
+
+    for row in parser.finish():
+        rows.append(row)
+        on_row(row)
+
+    record.update(stats)
+    record["response_chars"] = response_chars
+    record["parse_failed"] = not parser.header_seen
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def process_chunk(chunk, model=DEFAULT_MODEL, timeout=CHUNK_TIMEOUT_SECONDS, cache=None, on_row=None,
+                  metrics=None, index=None, limiter=None, on_start=None):
+    """
+    Run a single chunk through prompt -> LLM -> CSV parsing and return its DataFrame.
+
+    When a ResultCache is given, previously parsed rows for the same chunk,
+    prompt version, model and options are returned without calling the LLM.
+    When `on_row` is given the output is streamed and each row is reported
+    as it is parsed. With RunMetrics, a per-chunk record is added to it.
+    With a `limiter`, the LLM call waits for a slot (cache hits do not), and
+    `on_start()` is called once it has one.
+    """
+    start = time.perf_counter()
+    record = {"index": index, "chunk_chars": len(chunk), "cache_hit": False}
+
+    if cache is not None:
+        key = make_cache_key(chunk, model)
+        rows = cache.get(key)
+        if rows is not None:
+            if on_row:
+                for row in rows:
+                    on_row(tuple(row))
+            record.update(cache_hit=True, rows=len(rows))
+            _record_chunk(metrics, record, start)
+            return pd.DataFrame(rows, columns=COLUMNS)
+
+    with limiter_slot(limiter, estimate_tokens(chunk)):
+        if on_start:
+            on_start()
+        if on_row:
+            df = stream_chunk(chunk, on_row, model=model, timeout=timeout, metrics=metrics, record=record)
+        else:
+            system, prompt = build_prompt(chunk)
+            _record_prompt(record, system, prompt)
+            with stage(metrics, "llm_wait"):
+                result = generate(prompt, model=model, timeout=timeout, system=system)
+            parser = RowStreamParser()
+            with stage(metrics, "parse_output"):
+                df = pd.DataFrame(parser.feed(result.text) + parser.finish(), columns=COLUMNS)
+            record.update(result.stats)
+            record.update(response_chars=len(result.text), parse_failed=not parser.header_seen)
+
+    if cache is not None:
+        cache.put(key, df[COLUMNS].values.tolist())
+    record["rows"] = len(df)
+    _record_chunk(metrics, record, start)
+    return df
+
+
+def process_batch(items, model=DEFAULT_MODEL, timeout=CHUNK_TIMEOUT_SECONDS, cache=None, on_row=None,
+                  metrics=None, limiter=None, on_start=None):
+    """
+    Run several chunks through one LLM request with JSON output and split the test cases back per chunk.
+
+    The chunks are sent as numbered sections and the model tags each test
+    case with its section (see prompt.build_batch_prompt). Cached chunks are
+    answered from the cache first; if only one chunk is left it goes through
+    process_chunk. When the answer cannot be split back into sections, each
+    chunk is sent on its own instead.
+
+    Args:
+        items (list): (index, chunk) pairs
+        on_row (callable): If given, `on_row(index, row)` is called for every row once the request is done
+
+    Returns:
+        list: (index, DataFrame or the exception its chunk failed with), in the order of `items`
+    """
+    start = time.perf_counter()
+    results = {}
+    keys = {}
+    remaining = []
+    for index, chunk in items:
+        if cache is not None:
+            keys[index] = make_cache_key(chunk, model, prompt_version=prompt_version(batch=True))
+            rows = cache.get(keys[index])
+            if rows is not None:
+                results[index] = _rows_df(index, rows, on_row)
+                _record_chunk(metrics, {"index": index, "chunk_chars": len(chunk), "cache_hit": True,
+                                        "rows": len(rows)}, start)
+                continue
+        remaining.append((index, chunk))
+
+    sections = None
+    if len(remaining) > 1:
+        record = {"index": remaining[0][0], "chunk_chars": sum(len(c) for _, c in remaining), "cache_hit": False,
+                  "batch_size": len(remaining)}
+        with limiter_slot(limiter, sum(estimate_tokens(c) for _, c in remaining)):
+            if on_start:
+                on_start()
+            system, prompt = build_batch_prompt([c for _, c in remaining])
+            _record_prompt(record, system, prompt)
+            with stage(metrics, "llm_wait"):
+                result = generate(prompt, model=model, timeout=timeout, system=system, format=BATCH_SCHEMA)
+        try:
+            with stage(metrics, "parse_output"):
+                sections = parse_batch_output(result.text, len(remaining))
+        except BatchFormatError:
+            if metrics is not None:
+                metrics.increment("batch_fallbacks")
+                metrics.increment("batch_fallback_chunks", len(remaining))
+        if sections is not None:
+            record.update(result.stats)
+            record.update(response_chars=len(result.text), parse_failed=False, rows=len(sections[0]))
+            _record_chunk(metrics, record, start)
+            if metrics is not None:
+                metrics.increment("batches")
+
+    if sections is not None:
+        for (index, chunk), rows in zip(remaining, sections):
+            if cache is not None:
+                cache.put(keys[index], [list(row) for row in rows])
+            results[index] = _rows_df(index, rows, on_row)
+            if metrics is not None and index != remaining[0][0]:
+                # Sizes and LLM statistics of the request are on the record of the batch's first chunk
+                metrics.record_chunk({"index": index, "chunk_chars": len(chunk), "cache_hit": False,
+                                      "batched_with": remaining[0][0], "rows": len(rows)})
+    else:
+        # One chunk left, or a batched answer that could not be split: one request per chunk
+        for index, chunk in remaining:
+            report_row = (lambda row, index=index: on_row(index, row)) if on_row else None
+            try:
+                results[index] = call_with_retries(
+                    lambda attempt: process_chunk(chunk, model=model, timeout=timeout, cache=cache,
+                                                  on_row=report_row, metrics=metrics, index=index, limiter=limiter,
+                                                  on_start=on_start))
+            except Exception as e:
+                results[index] = e
+    return [(index, results[index]) for index, _ in items]
+
+
+def _rows_df(index, rows, on_row):
+    rows = [tuple(row) for row in rows]
+    if on_row:
+        for row in rows:
+            on_row(index, row)
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def _record_prompt(record, system, prompt):
+    record["prompt_chars"] = len(prompt) + len(system or "")
+    record["prompt_tokens"] = estimate_tokens(prompt) + estimate_tokens(system or "")
+    record["prefix_tokens"] = estimate_tokens(system or "")
+
+
+def _record_chunk(metrics, record, start):
+    if metrics is None:
+        return
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    if record.get("eval_duration"):
+        record["tokens_per_second"] = round(record.get("eval_count", 0) / (record["eval_duration"] / 1e9), 2)
+    record.update(prompt_cache_savings(record))
+    metrics.record_chunk(record)
+
+
+def iter_chunk_results(chunks, max_workers=MAX_CONCURRENT_CHUNKS, timeout=CHUNK_TIMEOUT_SECONDS,
+                       model=DEFAULT_MODEL, cache=None, on_row=None, limiter=None, metrics=None, failures=None,
+                       batch=CHUNK_BATCHING):
+    """
+    Process chunks on a bounded thread pool and yield results as they complete.
+
+    Results arrive in completion order, so each item carries the index of its
+    chunk; callers that need document order should place results by index.
+
+    `chunks` may be a lazy iterator (see core.chunker.iter_chunks). It is only
+    advanced while fewer than max_workers * PREFETCH_CHUNKS chunks are in flight,
+    so the LLM starts on the first chunks while later pages are still being read.
+
+    Each chunk gets a deadline that grows with its size (see
+    core.scheduler.chunk_deadline), counted from when its LLM request starts.
+    A chunk past its deadline is reported as failed and rows its worker still
+    streams afterwards are dropped.
+    Requests that time out or hit an overloaded server are retried with
+    jittered backoff; when streaming, rows of a failed attempt may be reported
+    again by the retry. A chunk that still fails does not stop the others: it
+    yields an empty DataFrame and its error goes to `failures`. Only when every
+    chunk fails is the first error raised.
+
+    With `batch`, consecutive small chunks are packed into one request (see
+    process_batch and core.batching); a batch counts as one item in flight
+    and shares one deadline, and its chunks still come out one by one.
+
+    Args:
+        chunks (iterable): Text chunks to process
+        max_workers (int): Chunks in flight at once (the starting point when adapting)
+        timeout (float): Base deadline in seconds for a single chunk
+        model (str): Model name passed to the LLM backend
+        cache (ResultCache): Optional cache of parsed results
+        on_row (callable): If given, output is streamed and `on_row(chunk_index, row)`
+            is called from the calling thread for every row as it is parsed
+        limiter: Optional semaphore or AdaptiveLimiter shared between several runs
+            to cap the total number of LLM requests in flight. Without one, an
+            AdaptiveLimiter is used when ADAPTIVE_CONCURRENCY is on
+        metrics (RunMetrics): Optional collector for stage timings and per-chunk records
+        failures (dict): Optional, filled with chunk_index -> error message
+        batch (bool): Pack small chunks into batched requests (default: CHUNK_BATCHING)
+
+    Yields:
+        tuple: (chunk_index, DataFrame)
+    """
+    if limiter is None and ADAPTIVE_CONCURRENCY:
+        maximum = max(max_workers, ADAPTIVE_MAX_CONCURRENCY)
+        if LLM_BACKEND == "pool":
+            maximum = max(maximum, get_backend("pool").capacity)  # Let several servers fill up
+        limiter = AdaptiveLimiter(initial=max_workers, maximum=maximum)
+    failures = failures if failures is not None else {}
+    started = {}
+    deadlines = {}
+    lock = threading.Lock()
+    rows = queue.Queue()
+    abandoned = set()  # Chunks failed for passing their deadline; their workers may still be producing rows
+
+    def put_row(index, row):
+        if index not in abandoned:
+            rows.put((index, row))
+
+    def work(items):
+        index = items[0][0]
+        deadline = chunk_deadline("\n".join(chunk for _, chunk in items), timeout)
+        with lock:
+            deadlines[index] = deadline
+
+        def mark_started():
+            with lock:
+                started[index] = time.monotonic()
+
+        def retrying(attempt, error, delay):
+            with lock:
+                started.pop(index, None)  # Backoff does not count against the deadline
+            if metrics is not None:
+                metrics.increment("retries")
+
+        if len(items) > 1:
+            report = put_row if on_row else None
+            return call_with_retries(
+                lambda attempt: process_batch(items, model=model, timeout=deadline, cache=cache, on_row=report,
+                                              metrics=metrics, limiter=limiter, on_start=mark_started),
+                on_retry=retrying)
+        report_row = (lambda row: put_row(index, row)) if on_row else None
+        return [(index, call_with_retries(
+            lambda attempt: process_chunk(items[0][1], model=model, timeout=deadline, cache=cache,
+                                          on_row=report_row, metrics=metrics, index=index, limiter=limiter,
+                                          on_start=mark_started),
+            on_retry=retrying))]
+
+    def drain_rows():
+        while True:
+            try:
+                index, row = rows.get_nowait()
+            except queue.Empty:
+                return
+            if index not in abandoned:
+                on_row(index, row)
+
+    def failed(index, message):
+        failures[index] = message
+        if metrics is not None:
+            metrics.increment("failed_chunks")
+            metrics.record_chunk({"index": index, "error": message})
+        return index, pd.DataFrame(columns=COLUMNS)
+
+    max_workers = max(1, max_workers)
+    pool_size = max(max_workers, getattr(limiter, "maximum", 0))
+    chunk_iter = pack_batches(enumerate(chunks)) if batch else ([item] for item in enumerate(chunks))
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="spec2test-chunk")
+    succeeded = 0
+    try:
+        futures = {}
+        pending = set()
+        exhausted = False
+        while True:
+            # An adaptive limiter may allow more requests than max_workers; keep enough chunks queued for it
+            max_in_flight = max(max_workers, getattr(limiter, "current", 0)) * PREFETCH_CHUNKS
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    items = next(chunk_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(work, items)
+                futures[future] = [index for index, _ in items]
+                pending.add(future)
+            if not pending:
+                break
+
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            if on_row:
+                drain_rows()
+            for future in sorted(done, key=lambda f: futures[f][0]):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    for index in futures[future]:
+                        yield failed(index, str(e))
+                    continue
+                for index, df in results:
+                    if isinstance(df, Exception):
+                        yield failed(index, str(df))
+                        continue
+                    succeeded += 1
+                    yield index, df
+
+            # A request stuck past its deadline is abandoned; its thread ends with the backend's own timeout
+            now = time.monotonic()
+            with lock:
+                expired = {f for f in pending
+                           if futures[f][0] in started and now - started[futures[f][0]] > deadlines[futures[f][0]]}
+                for future in expired:
+                    abandoned.update(futures[future])
+            for future in sorted(expired, key=lambda f: futures[f][0]):
+                for index in futures[future]:
+                    yield failed(index, f"timed out after {deadlines[futures[future][0]]:.0f} seconds")
+            pending -= expired
+            with lock:
+                for future in done | expired:
+                    started.pop(futures.pop(future)[0], None)
+    finally:
+        # Abandon queued work if the caller stops early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if failures and not succeeded:
+        first = min(failures)
+        raise Exception(f"Chunk {first + 1} failed: {failures[first]}")
+
+
+def process_chunks(chunks, max_workers=MAX_CONCURRENT_CHUNKS, timeout=CHUNK_TIMEOUT_SECONDS,
+                   model=DEFAULT_MODEL, on_result=None, cache=None, on_row=None, limiter=None, metrics=None,
+                   store=None, failures=None, batch=CHUNK_BATCHING):
+    """
+    Process all chunks concurrently and return their DataFrames in chunk order.
+
+    `on_result(index, df, completed, total)` and `on_row(index, row)` are called
+    from the calling thread, which makes them safe for UI updates. When
+    `chunks` is a lazy iterator, `total` is None until it has been exhausted.
+    With a ResultStore, each chunk's rows are also added to it as they complete,
+    together with the chunk text (and so its source span, see core.trace).
+    Chunks that failed come back empty, with their errors in `failures`.
+    With `batch`, small chunks share requests (see iter_chunk_results).
+    """
+    total = [len(chunks) if hasattr(chunks, "__len__") else None]
+    sources = {}  # chunk index -> chunk text, until its rows reach the store
+
+    def counted(chunk_iter):
+        produced = 0
+        for chunk in chunk_iter:
+            if store is not None:
+                sources[produced] = chunk
+            produced += 1
+            yield chunk
+        total[0] = produced
+
+    results = {}
+    chunk_results = iter_chunk_results(counted(chunks), max_workers, timeout, model, cache, on_row, limiter, metrics,
+                                       failures, batch)
+    for completed, (index, df) in enumerate(chunk_results, 1):
+        results[index] = df
+        if store is not None:
+            store.add_chunk(index, zip(df["Title"], df["Description"]), source=sources.pop(index, None))
+        if on_result:
+            on_result(index, df, completed, total[0])
+    return [results[i] for i in range(len(results))]
+
+
+def document_chunks(file_path, metrics=None, prefilter=PREFILTER_ENABLED, prefilter_stats=None, trace=None,
+                    page_stats=None, chunk_stats=None):
+    """
+    Lazy parse -> clean -> chunk -> pre-filter stream for a document, timed per
+    stage when metrics are given. With `prefilter`, chunks without testable
+    content are skipped or batched (see core.prefilter) and counted in
+    `prefilter_stats` if given. `file_path` may also be the bytes or file
+    object of an upload (see core.parser.parse_file). How PDF pages were read
+    (text layer, tables, OCR, cache) is counted in `page_stats` if given, and
+    the requirement sections read in `chunk_stats["sections"]` (see
+    chunker.iter_chunks).
+
+    With a TraceIndex as `trace`, chunks come out as SourceText carrying
+    their page range and character offsets, and the document's requirement
+    IDs are added to the index as they are read.
+    """
+    source_map = SourceMap(pages=document_type(file_path) == "pdf", index=trace) if trace is not None else None
+    blocks = iter_blocks(file_path, stats=page_stats)
+    if source_map is not None:
+        blocks = source_map.record(blocks)
+    if metrics is None:
+        cleaned = clean_blocks(blocks)
+        chunks = iter_chunks(source_map.locate(cleaned) if source_map is not None else cleaned, stats=chunk_stats)
+        return filter_chunks(chunks, prefilter_stats) if prefilter else chunks
+    blocks = metrics.timed_iter("parse", blocks)
+    cleaned = metrics.timed_iter("clean_text", clean_blocks(blocks))
+    if source_map is not None:
+        cleaned = source_map.locate(cleaned)
+    chunks = metrics.timed_iter("chunking", iter_chunks(cleaned, stats=chunk_stats))
+    return metrics.timed_iter("prefilter", filter_chunks(chunks, prefilter_stats)) if prefilter else chunks
+
+
+def record_prefilter(metrics, stats):
+    """Copy pre-filter counters into the run metrics."""
+    if metrics is None:
+        return
+    metrics.increment("prefilter_skipped", stats["skipped"])
+    metrics.increment("prefilter_batched", stats["batched"])
+    metrics.increment("llm_calls_avoided", calls_avoided(stats))
+
+
+def record_pages(metrics, stats):
+    """Copy PDF page counts (see parser.iter_pdf_pages) into the run metrics as pdf_pages_<kind>."""
+    if metrics is None:
+        return
+    for kind, count in stats.items():
+        metrics.increment(f"pdf_pages_{kind}", count)
+
+
+def assemble_results(all_dfs):
+    """Combine per-chunk DataFrames in order, drop empty titles and assign test case IDs."""
+    store = ResultStore()
+    for index, df in enumerate(all_dfs):
+        store.add_chunk(index, zip(df["Title"], df["Description"]) if df is not None else [])
+    return store.to_dataframe()
+
+
+def process_document(file_path, model=DEFAULT_MODEL, cache=None, limiter=None,
+                     max_workers=MAX_CONCURRENT_CHUNKS, on_result=None, metrics=None, dedup=DEDUP_ENABLED,
+                     prefilter=PREFILTER_ENABLED, failures=None, store=None, trace=None):
+    """
+    Parse, chunk and generate test cases for a whole document.
+
+    With `dedup`, test cases repeating an earlier one are merged (see core.dedup).
+    With `prefilter`, chunks without testable content skip the LLM.
+    Chunks that could not be processed are left out, with their errors in `failures`.
+    A ResultStore can be passed in as `store`, e.g. one that streams rows to
+    an export file (its own de-duplication is used instead of `dedup`).
+    With a TraceIndex as `trace` (or on the given store), test cases are
+    traced to their source pages, offsets and requirement IDs.
+
+    Returns:
+        tuple: (DataFrame of test cases with IDs, number of chunks processed)
+    """
+    if store is None:
+        store = ResultStore(dedup=Deduplicator() if dedup else None, trace=trace)
+    elif trace is not None:
+        store.trace = trace
+    prefilter_stats = new_prefilter_stats()
+    page_stats = {}
+    chunks = document_chunks(file_path, metrics, prefilter, prefilter_stats, store.trace, page_stats)
+    all_dfs = process_chunks(chunks, max_workers=max_workers, model=model, on_result=on_result,
+                             cache=cache, limiter=limiter, metrics=metrics, store=store, failures=failures)
+    with stage(metrics, "assemble"):
+        result_df = store.to_dataframe()
+    record_prefilter(metrics, prefilter_stats)
+    record_pages(metrics, page_stats)
+    if metrics is not None:
+        metrics.increment("duplicates_merged", store.merged)
+        metrics.finish()
+    return result_df, len(all_dfs)
+
+
+def _process_first_version(file_path, doc_store, doc_id, model, cache, limiter, max_workers, on_result, metrics,
+                           on_row, prefilter, failures, store):
+    """
+    process_document_delta for a document without a usable previous version.
+
+    Blocks are read, split into sections, grouped and chunked lazily and go
+    through the full pre-filter (skip and batch), so the first chunks reach
+    the LLM while the rest of the document is still being read. Chunks travel
+    with their section group so the rows can be saved per group; groups
+    whose chunks were batched with another group's are saved without
+    reusable rows.
+    """
+    page_stats = {}
+    prefilter_stats = new_prefilter_stats()
+    groups = []  # {"sections", "chunks": [chunk indexes], "batched"}
+
+    def timed(name, iterable):
+        return metrics.timed_iter(name, iterable) if metrics is not None else iterable
+
+    def group_chunks(sections):
+        budget = chunk_token_budget()
+        for sections_ in iter_groups(sections, budget):
+            group = {"sections": sections_, "chunks": [], "batched": False}
+            groups.append(group)
+            for text in pack_sections([s["text"] for s in sections_], budget):
+                yield group, text
+
+    def numbered(tagged_chunks):
+        # (groups, chunk) pairs from the pre-filter; a batch may hold chunks of several groups
+        for index, (owners, chunk) in enumerate(tagged_chunks):
+            if all(group is owners[0] for group in owners):
+                owners[0]["chunks"].append(index)
+            else:
+                for group in owners:
+                    group["batched"] = True
+            yield chunk
+
+    source_map = SourceMap(pages=document_type(file_path) == "pdf", index=store.trace) \
+        if store.trace is not None else None
+    blocks = iter_blocks(file_path, stats=page_stats)
+    if source_map is not None:
+        blocks = source_map.record(blocks)
+    cleaned = timed("clean_text", clean_blocks(timed("parse", blocks)))
+    if source_map is not None:
+        cleaned = source_map.locate(cleaned)
+    chunks = timed("chunking", group_chunks(iter_sections(cleaned)))
+    if prefilter:
+        chunks = timed("prefilter", filter_chunks(chunks, prefilter_stats, tagged=True))
+    else:
+        chunks = (([group], text) for group, text in chunks)
+    all_dfs = process_chunks(numbered(chunks), max_workers=max_workers, model=model, on_result=on_result,
+                             cache=cache, on_row=on_row, limiter=limiter, metrics=metrics, store=store,
+                             failures=failures)
+
+    with stage(metrics, "assemble"):
+        result_df = store.to_dataframe()
+    saved_groups = []
+    for group in groups:
+        rows = [tuple(r) for i in group["chunks"] for r in all_dfs[i][COLUMNS].values.tolist()]
+        saved_groups.append({
+            "sections": [{"anchor": s["anchor"], "fingerprint": s["fingerprint"]} for s in group["sections"]],
+            "rows": [list(r) for r in rows],
+            "failed": any(i in failures for i in group["chunks"]),
+            "batched": group["batched"],
+        })
+    version = doc_store.save(doc_id, {"model": model, "prompt_version": prompt_version(), "groups": saved_groups})
+    summary = {
+        "version": version,
+        "diff": None,
+        "sections": sum(len(group["sections"]) for group in groups),
+        "llm_chunks": len(all_dfs),
+        "reused_test_cases": 0,
+        "generated_test_cases": sum(len(df) for df in all_dfs),
+        "duplicates_merged": store.merged,
+        "prefilter": prefilter_stats,
+        "failed_chunks": len(failures),
+        "removed_test_cases": [],
+        "pages": page_stats,
+    }
+    record_prefilter(metrics, prefilter_stats)
+    record_pages(metrics, page_stats)
+    if metrics is not None:
+        metrics.increment("duplicates_merged", store.merged)
+        metrics.increment("reused_test_cases", 0)
+        metrics.finish()
+    return result_df, summary
+
+
+def _keep_for_llm(text, stats):
+    stats["chunks"] += 1
+    if classify_chunk(text) == "skip":
+        stats["skipped"] += 1
+        return False
+    stats["kept"] += 1
+    return True
+
+
+def removed_section_rows(group, new_fingerprints, new_anchors):
+    """
+    Test cases of a stored section group that came from a section no longer in the document.
+
+    Rows naming a removed section's anchor (e.g. its REQ-ID) are attributed to
+    it. When no row names any anchor of the group, every row is returned since
+    any of them may have come from the removed section.
+    """
+    removed = [s["anchor"] for s in group["sections"]
+               if s["fingerprint"] not in new_fingerprints and s["anchor"] not in new_anchors]
+    if not removed:
+        return []
+    rows = [tuple(row) for row in group["rows"]]
+    if not any(_mentions([s["anchor"] for s in group["sections"]], row) for row in rows):
+        return rows
+    return [row for row in rows if _mentions(removed, row)]
+
+
+def _mentions(anchors, row):
+    text = f"{row[0]} {row[1]}"
+    return any(re.search(rf"\b{re.escape(anchor)}\b", text) for anchor in anchors)
+
+
+def process_document_delta(file_path, doc_store, doc_id=None, model=DEFAULT_MODEL, cache=None, limiter=None,
+                           max_workers=MAX_CONCURRENT_CHUNKS, on_result=None, metrics=None, dedup=None,
+                           on_row=None, prefilter=PREFILTER_ENABLED, failures=None, store=None, trace=None):
+    """
+    Generate test cases for a new version of a document, re-running the LLM only where it changed.
+
+    Without a usable previous version the document is streamed and saved as
+    the first version (see _process_first_version). Otherwise sections are
+    fingerprinted (see core.versions) and compared with the latest stored
+    version of `doc_id`. Section groups whose sections all still
+    appear unchanged and in the same order keep their test cases. Every other
+    section is re-packed into new chunks and sent to the LLM. Test cases of
+    groups that contained a removed section are returned separately so they
+    can be flagged; the new version is saved for the next run.
+
+    Args:
+        file_path: Document to process: a path, or bytes / file object (see core.parser.parse_file)
+        doc_store (DocumentStore): Where versions are kept
+        doc_id (str): Identity of the document across uploads (default: file name)
+        dedup (Deduplicator): Optional de-duplication for the combined result
+        prefilter (bool): Skip new chunks without testable content. For a new
+            version, low-value chunks are not batched, since each chunk's test
+            cases are stored with its own sections
+        failures (dict): Optional, filled with chunk index -> error for chunks
+            that could not be processed. Their groups are regenerated next time
+        store (ResultStore): Optional store for the result, e.g. one streaming to
+            an export file (used instead of `dedup`). Reused groups are added to
+            it right away and new ones once their last chunk is back
+        trace (TraceIndex): Optional, filled with the requirement IDs and the
+            source of every test case, reused ones included
+
+    Returns:
+        tuple: (DataFrame of test cases with IDs, summary dict). The summary holds
+            the version number, the section diff, counts of reused and generated
+            test cases, pre-filter counters, PDF page counts (`pages`), `failed_chunks`
+            and `removed_test_cases`, a list of (title, description) rows whose
+            source section no longer exists
+    """
+    failures = failures if failures is not None else {}
+    doc_id = doc_id or os.path.basename(source_name(file_path) or "")
+    if not doc_id:
+        raise ValueError("doc_id is required for documents without a file name")
+    if store is None:
+        store = ResultStore(dedup=dedup, trace=trace)
+    elif trace is not None:
+        store.trace = trace
+    previous = doc_store.latest(doc_id)
+    if previous and (previous.get("model") != model or previous.get("prompt_version") != prompt_version()):
+        previous = None  # Old test cases came from another model or prompt; regenerate everything
+    if not previous:
+        # Nothing to diff against: stream the document like process_document and save it as the first version
+        return _process_first_version(file_path, doc_store, doc_id, model, cache, limiter, max_workers, on_result,
+                                      metrics, on_row, prefilter, failures, store)
+
+    # The whole section list is needed to diff it with the previous version
+    source_map = SourceMap(pages=document_type(file_path) == "pdf", index=store.trace) \
+        if store.trace is not None else None
+    page_stats = {}
+    with stage(metrics, "parse"):
+        blocks = iter_blocks(file_path, stats=page_stats)
+        blocks = list(source_map.record(blocks) if source_map is not None else blocks)
+    with stage(metrics, "chunking"):
+        cleaned = clean_blocks(blocks)
+        sections = fingerprint_sections(source_map.locate(cleaned) if source_map is not None else cleaned)
+
+    new_fingerprints = {s["fingerprint"] for s in sections}
+    reusable = {}  # first section fingerprint -> [(group fingerprints, group)]
+    removed_test_cases = []
+    old_sections = []
+    if previous:
+        new_anchors = {s["anchor"] for s in sections}
+        for group in previous["groups"]:
+            old_sections.extend(group["sections"])
+            fingerprints = [s["fingerprint"] for s in group["sections"]]
+            if all(f in new_fingerprints for f in fingerprints):
+                # A chunk of it failed or was batched with other groups' chunks last time; give it another go
+                if not group.get("failed") and not group.get("batched"):
+                    reusable.setdefault(fingerprints[0], []).append((tuple(fingerprints), group))
+            else:
+                removed_test_cases.extend(removed_section_rows(group, new_fingerprints, new_anchors))
+
+    # Walk the new document in order: reuse intact old groups, collect the rest for the LLM
+    position_groups = []  # (sections, rows or None)
+    pending = []
+    i = 0
+    while i < len(sections):
+        match = None
+        for fingerprints, group in reusable.get(sections[i]["fingerprint"], ()):
+            if tuple(s["fingerprint"] for s in sections[i:i + len(fingerprints)]) == fingerprints:
+                match = group
+                break
+        if match:
+            if pending:
+                position_groups.append((pending, None))
+                pending = []
+            position_groups.append((sections[i:i + len(match["sections"])], match["rows"]))
+            i += len(match["sections"])
+        else:
+            pending.append(sections[i])
+            i += 1
+    if pending:
+        position_groups.append((pending, None))
+
+    # Pack the sections that need the LLM into groups and those into chunks
+    budget = chunk_token_budget()
+    final_groups = []  # (sections, rows or None, [chunk indexes])
+    chunks = []
+    prefilter_stats = new_prefilter_stats()
+    for group_sections_, rows in position_groups:
+        if rows is not None:
+            final_groups.append((group_sections_, rows, []))
+            continue
+        for new_group in group_sections(group_sections_, budget):
+            texts = list(pack_sections([s["text"] for s in new_group], budget))
+            if prefilter:
+                with stage(metrics, "prefilter"):
+                    texts = [t for t in texts if _keep_for_llm(t, prefilter_stats)]
+            final_groups.append((new_group, None, list(range(len(chunks), len(chunks) + len(texts)))))
+            chunks.extend(texts)
+
+    # Groups reach the store as soon as their rows are known: reused ones now, new ones when their
+    # last chunk is back, so rows stream out in document order while the LLM works
+    chunk_dfs = {}  # chunk index -> DataFrame, until its group is added
+    waiting = {}  # group index -> chunks not back yet
+    group_of = {}  # chunk index -> group index
+
+    def add_group(index):
+        group_sections_, rows, chunk_indexes = final_groups[index]
+        if rows is None:
+            rows = [tuple(r) for i in chunk_indexes for r in chunk_dfs.pop(i)[COLUMNS].values.tolist()]
+        store.add_chunk(index, rows, source=join_texts([s["text"] for s in group_sections_]))
+
+    def chunk_done(index, df, completed, total):
+        chunk_dfs[index] = df
+        group = group_of[index]
+        waiting[group] -= 1
+        if not waiting[group]:
+            add_group(group)
+        if on_result:
+            on_result(index, df, completed, total)
+
+    for index, (_, _, chunk_indexes) in enumerate(final_groups):
+        if chunk_indexes:
+            waiting[index] = len(chunk_indexes)
+            group_of.update((i, index) for i in chunk_indexes)
+        else:
+            add_group(index)
+    all_dfs = process_chunks(chunks, max_workers=max_workers, model=model, on_result=chunk_done, cache=cache,
+                             on_row=on_row, limiter=limiter, metrics=metrics, failures=failures) if chunks else []
+
+    saved_groups = []
+    reused = 0
+    with stage(metrics, "assemble"):
+        for group_sections_, rows, chunk_indexes in final_groups:
+            if rows is None:
+                rows = [tuple(r) for i in chunk_indexes for r in all_dfs[i][COLUMNS].values.tolist()]
+            else:
+                reused += len(rows)
+            saved_groups.append({
+                "sections": [{"anchor": s["anchor"], "fingerprint": s["fingerprint"]} for s in group_sections_],
+                "rows": [list(r) for r in rows],
+                "failed": any(i in failures for i in chunk_indexes),
+            })
+        result_df = store.to_dataframe()
+
+    version = doc_store.save(doc_id, {"model": model, "prompt_version": prompt_version(), "groups": saved_groups})
+    summary = {
+        "version": version,
+        "diff": diff_sections(old_sections, sections) if previous else None,
+        "sections": len(sections),
+        "llm_chunks": len(chunks),
+        "reused_test_cases": reused,
+        "generated_test_cases": sum(len(df) for df in all_dfs),
+        "duplicates_merged": store.merged,
+        "prefilter": prefilter_stats,
+        "failed_chunks": len(failures),
+        "removed_test_cases": removed_test_cases,
+        "pages": page_stats,
+    }
+    record_prefilter(metrics, prefilter_stats)
+    record_pages(metrics, page_stats)
+    if metrics is not None:
+        metrics.increment("duplicates_merged", store.merged)
+        metrics.increment("reused_test_cases", reused)
+        metrics.finish()
+    return result_df, summary
@@ -0,0 +1,147 @@
+import re
+
+from config.settings import PREFILTER_SKIP_BELOW, PREFILTER_BATCH_BELOW, PREFILTER_MODEL
+from core.chunker import REQ_ID_RE, estimate_tokens, chunk_token_budget, join_texts
+
+STRONG_MODAL_RE = re.compile(r"\b(?:shall|must|should|is required to|are required to|mandatory)\b", re.IGNORECASE)
+WEAK_MODAL_RE = re.compile(r"\b(?:will|can|may|needs? to|has to|have to|able to|allows?|prevents?)\b", re.IGNORECASE)
+TOC_LINE_RE = re.compile(r"(?:\.{3,}|…)\s*\d+\s*$|^\s*(?:table of )?contents\s*$", re.IGNORECASE)
+REVISION_LINE_RE = re.compile(
+    r"\b(?:version|revision|rev\.?|changelog|change history)\b.*\d|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{2,4}\b",
+    re.IGNORECASE)
+GLOSSARY_LINE_RE = re.compile(r"^\s*[A-Z][\w /()-]{0,40}\s*(?::|–|—| - )\s+\S")
+
+CLASSIFY_PROMPT = """Does the following text contain software requirements that can be tested?
+Answer with only "yes" or "no".
+
+Text:
+{text}
+"""
+
+
+def score_chunk(text):
+    """
+    Score how likely a chunk is to yield test cases, from 0 (none) to 1.
+
+    Counts requirement language per line (REQ-IDs and "shall"/"must" count
+    fully, weaker verbs like "will"/"can" half) and discounts lines that look
+    like a table of contents, revision history or glossary.
+
+    Returns:
+        dict: "score" plus the counts it was computed from
+    """
+    lines = [line for line in text.split("\n") if line.strip()]
+    if not lines:
+        return {"score": 0.0, "lines": 0, "signal": 0.0, "noise": 0.0}
+
+    signal = 0.0
+    noise_lines = 0
+    for line in lines:
+        strong = len(REQ_ID_RE.findall(line)) + len(STRONG_MODAL_RE.findall(line))
+        weak = len(WEAK_MODAL_RE.findall(line))
+        signal += strong + 0.5 * weak
+        if TOC_LINE_RE.search(line) or REVISION_LINE_RE.search(line):
+            noise_lines += 1
+        elif not strong and GLOSSARY_LINE_RE.match(line):
+            noise_lines += 1
+
+    noise = noise_lines / len(lines)
+    score = min(1.0, signal / len(lines)) * (1.0 - noise)
+    return {"score": round(score, 4), "lines": len(lines), "signal": signal, "noise": round(noise, 4)}
+
+
+def classify_chunk(text, skip_below=PREFILTER_SKIP_BELOW, batch_below=PREFILTER_BATCH_BELOW, model=PREFILTER_MODEL):
+    """
+    Decide what to do with a chunk: "keep" it, "batch" it with other
+    low-value chunks into one LLM call, or "skip" it.
+
+    With a `model` (a small Ollama model), chunks that would be skipped are
+    double-checked by asking it whether the text holds testable requirements;
+    a "yes" turns the skip into a batch.
+    """
+    score = score_chunk(text)["score"]
+    if score >= batch_below:
+        return "keep"
+    if score >= skip_below:
+        return "batch"
+    if model and _model_says_testable(text, model):
+        return "batch"
+    return "skip"
+
+
+def _model_says_testable(text, model):
+    from core.generator import generate  # pandas and requests only load when a model is asked
+    try:
+        result = generate(CLASSIFY_PROMPT.format(text=text[:4000]), model=model,
+                          options={"num_predict": 3, "temperature": 0})
+    except Exception:
+        return True  # When in doubt, let the main model look at it
+    return result.text.strip().lower().startswith("yes")
+
+
+def new_prefilter_stats():
+    return {"chunks": 0, "kept": 0, "skipped": 0, "batched": 0, "batches": 0}
+
+
+def calls_avoided(stats):
+    """LLM calls saved: skipped chunks plus batched chunks beyond one call per batch."""
+    return stats["skipped"] + stats["batched"] - stats["batches"]
+
+
+def filter_chunks(chunks, stats=None, max_tokens=None, classify=classify_chunk, tagged=False):
+    """
+    Drop chunks with nothing testable and merge low-value ones before they reach the LLM.
+
+    Kept chunks pass through unchanged. Batched chunks are collected and
+    yielded together, joined into one chunk of at most `max_tokens`, when the
+    batch is full, a kept chunk follows or the input ends, so chunks come out
+    in document order (skipped chunks in between do not end a batch).
+
+    Args:
+        chunks (iterable): Text chunks (may be a lazy iterator)
+        stats (dict): Optional counters from new_prefilter_stats(), updated in place
+        max_tokens (int): Budget for a batched chunk (default: chunk_token_budget())
+        classify (callable): Chunk -> "keep" | "batch" | "skip"
+        tagged (bool): Chunks come as (tag, chunk) pairs and go out as
+            (tags, chunk), with the tags of every input chunk in the output one
+
+    Yields:
+        str: Chunks to send to the LLM, or (tags, chunk) pairs when `tagged`
+    """
+    stats = stats if stats is not None else new_prefilter_stats()
+    max_tokens = max_tokens or chunk_token_budget()
+    batch = []
+    batch_tags = []
+    batch_tokens = 0
+
+    def flush():
+        stats["batches"] += 1
+        joined = join_texts(batch)
+        return (batch_tags, joined) if tagged else joined
+
+    for item in chunks:
+        tag, chunk = item if tagged else (None, item)
+        stats["chunks"] += 1
+        decision = classify(chunk)
+        if decision == "skip":
+            stats["skipped"] += 1
+            continue
+        if decision == "keep":
+            stats["kept"] += 1
+            if batch:
+                yield flush()
+                batch, batch_tags, batch_tokens = [], [], 0
+            yield ([tag], chunk) if tagged else chunk
+            continue
+
+        stats["batched"] += 1
+        tokens = estimate_tokens(chunk) + 1
+        if batch and batch_tokens + tokens > max_tokens:
+            yield flush()
+            batch, batch_tags, batch_tokens = [], [], 0
+        batch.append(chunk)
+        batch_tags.append(tag)
+        batch_tokens += tokens
+
+    if batch:
+        yield flush()
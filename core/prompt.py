@@ -1,8 +1,14 @@
-from config.settings import CSV_SEPARATOR
+import hashlib
+import json
 
-def get_prompt(requirements_text):
-    return f"""
-You are an AI assistant that extracts software test cases from the provided requirements.
+from config.settings import CSV_SEPARATOR, PROMPT_LAYOUT
+
+# Bump whenever the template below changes so cached LLM results are invalidated
+PROMPT_VERSION = "1"
+
+# Fixed instructions shared by every chunk. Kept byte-identical so Ollama can
+# reuse the evaluated prefix (its KV cache) instead of re-reading it per chunk.
+INSTRUCTIONS = f"""You are an AI assistant that extracts software test cases from the provided requirements.
 
 Output ONLY a valid CSV table with exactly two columns separated by a pipe "{CSV_SEPARATOR}":
 
@@ -48,9 +54,100 @@ Editor Cannot Automate Incomplete or Unreviewed Articles|The system prevents the
 Example when no test cases found (output exactly this, nothing more):
 
 Title{CSV_SEPARATOR}Description
--{CSV_SEPARATOR}-
+-{CSV_SEPARATOR}-"""
 
-Now extract test cases from the following requirements and output ONLY the CSV in the above format:
+REQUEST_TEMPLATE = """Now extract test cases from the following requirements and output ONLY the CSV in the above format:
 
 {requirements_text}
 """
+
+# Several chunks in one request: numbered sections in, JSON test cases tagged with their section out
+SECTION_MARKER = "### SECTION {number}"
+
+BATCH_INSTRUCTIONS = """You are an AI assistant that extracts software test cases from the provided requirements.
+
+The requirements are split into numbered sections, each starting with a line like "### SECTION 1".
+Extract the test cases of every section separately and answer with JSON only, in this form:
+
+{"test_cases": [{"section": 1, "title": "...", "description": "..."}]}
+
+RULES:
+- "section" is the number of the section the test case comes from
+- Each test case has one meaningful title and a full description; no placeholders like "-" or "N/A"
+- Do NOT include IDs or numbering in titles
+- A section without testable requirements simply has no test cases
+- Output nothing but the JSON object
+
+Example:
+
+{"test_cases": [
+  {"section": 1, "title": "Editor Can Automate Article Review Process", "description": "The system allows the editor to automate the article review process by providing tools for efficient organization, tracking, and approval of articles."},
+  {"section": 3, "title": "Editor Cannot Automate Unreviewed Articles", "description": "The system prevents the editor from automating the publishing process until all necessary reviews are complete."}
+]}"""
+
+BATCH_REQUEST_TEMPLATE = """Now extract test cases from each of the following {count} sections and output ONLY the JSON:
+
+{sections}
+"""
+
+# JSON schema for Ollama's structured output (`format`)
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "section": {"type": "integer"},
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                },
+                "required": ["section", "title", "description"],
+            },
+        },
+    },
+    "required": ["test_cases"],
+}
+
+PROMPT_FINGERPRINT = hashlib.sha256((INSTRUCTIONS + REQUEST_TEMPLATE).encode("utf-8")).hexdigest()[:8]
+BATCH_FINGERPRINT = hashlib.sha256((BATCH_INSTRUCTIONS + BATCH_REQUEST_TEMPLATE + SECTION_MARKER
+                                    + json.dumps(BATCH_SCHEMA, sort_keys=True)).encode("utf-8")).hexdigest()[:8]
+
+
+def prompt_version(layout=PROMPT_LAYOUT, batch=False):
+    """Version of the prompt as sent: the template version, its layout and a hash of its text."""
+    if batch:
+        return f"{PROMPT_VERSION}-batch-{layout}-{BATCH_FINGERPRINT}"
+    return f"{PROMPT_VERSION}-{layout}-{PROMPT_FINGERPRINT}"
+
+
+def get_prompt(requirements_text):
+    """The whole prompt as one text (instructions first)."""
+    return f"\n{INSTRUCTIONS}\n\n" + REQUEST_TEMPLATE.format(requirements_text=requirements_text)
+
+
+def build_prompt(requirements_text, layout=PROMPT_LAYOUT):
+    """
+    Return (system, prompt) for a chunk.
+
+    With the "system" layout the fixed instructions are sent as the system
+    prompt and only the request and requirements as the prompt; with
+    "inline" everything is one prompt and system is None.
+    """
+    if layout == "system":
+        return INSTRUCTIONS, REQUEST_TEMPLATE.format(requirements_text=requirements_text)
+    if layout == "inline":
+        return None, get_prompt(requirements_text)
+    raise ValueError(f"Unknown prompt layout: {layout}")
+
+
+def build_batch_prompt(chunks, layout=PROMPT_LAYOUT):
+    """Return (system, prompt) asking for the test cases of several chunks, numbered from 1, as JSON."""
+    sections = "\n\n".join(f"{SECTION_MARKER.format(number=n)}\n{chunk}" for n, chunk in enumerate(chunks, 1))
+    request = BATCH_REQUEST_TEMPLATE.format(count=len(chunks), sections=sections)
+    if layout == "system":
+        return BATCH_INSTRUCTIONS, request
+    if layout == "inline":
+        return None, f"\n{BATCH_INSTRUCTIONS}\n\n{request}"
+    raise ValueError(f"Unknown prompt layout: {layout}")
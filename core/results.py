@@ -0,0 +1,159 @@
+import threading
+
+import pandas as pd
+
+from core.trace import find_req_ids
+
+ID_PREFIX = "TC-"
+
+
+class ResultStore:
+    """
+    Column buffers for the test cases of one run.
+
+    Chunks may be added in any order (workers finish out of order); they are
+    held back until every earlier chunk has arrived, then appended, so test
+    case IDs are assigned on insert and always follow document order. Rows
+    with an empty title are dropped on the way in, and with a Deduplicator
+    (see core.dedup) rows repeating an earlier test case are merged into it.
+    A single DataFrame or Arrow table is built from the buffers only when
+    asked for.
+
+    With a `sink` (see core.export), every appended (ID, Title, Description)
+    row is also written to it in document order; `keep_rows=False` then
+    leaves the buffers empty, so memory does not grow with the result.
+
+    With a TraceIndex (see core.trace), every test case is linked to the
+    requirement IDs and source span of the chunk it came from.
+    """
+
+    def __init__(self, id_prefix=ID_PREFIX, dedup=None, sink=None, keep_rows=True, trace=None):
+        self.id_prefix = id_prefix
+        self.dedup = dedup
+        self.sink = sink
+        self.trace = trace
+        self.keep_rows = keep_rows or sink is None
+        self.count = 0
+        self.ids = []
+        self.titles = []
+        self.descriptions = []
+        self.chunks = []
+        self.page_starts = []
+        self.page_ends = []
+        self.duplicates = []
+        self.dropped = 0
+        self.merged = 0
+        self._pending = {}
+        self._next_chunk = 0
+        self._lock = threading.Lock()
+
+    def add_chunk(self, index, rows, pages=None, source=None):
+        """
+        Add the (title, description) rows of chunk `index`.
+
+        Args:
+            index (int): Position of the chunk in the document
+            rows (iterable): (title, description) pairs
+            pages (tuple): Optional (first_page, last_page) the chunk came from
+            source (str): Optional chunk text; a located one (SourceText) also
+                gives the pages, and the trace index reads REQ-IDs from it
+
+        Returns:
+            int: Number of rows appended by this call, including held-back
+                chunks it released
+        """
+        with self._lock:
+            self._pending[index] = (list(rows), pages, source)
+            appended = 0
+            while self._next_chunk in self._pending:
+                chunk_rows, chunk_pages, chunk_source = self._pending.pop(self._next_chunk)
+                appended += self._append(self._next_chunk, chunk_rows, chunk_pages, chunk_source)
+                self._next_chunk += 1
+            return appended
+
+    def _append(self, index, rows, pages, source=None):
+        span = getattr(source, "span", None)
+        if pages is None and span:
+            pages = (span["page_start"], span["page_end"])
+        first_page, last_page = pages if pages else (None, None)
+        chunk_req_ids = find_req_ids(source) if self.trace is not None and source else []
+        kept = [(title, description) for title, description in rows if str(title).strip()]
+        self.dropped += len(rows) - len(kept)
+        if self.dedup is not None and kept:
+            matches = self.dedup.add_batch([f"{title} {description}" for title, description in kept])
+        else:
+            matches = [None] * len(kept)
+
+        appended = []
+        for (title, description), match in zip(kept, matches):
+            if match is not None:
+                if self.keep_rows:
+                    self.duplicates[match] += 1
+                if self.trace is not None:
+                    # Kept test cases are numbered in the order the deduplicator kept them
+                    self.trace.add_test_case(f"{self.id_prefix}{match + 1:03d}", title, description, chunk_req_ids)
+                self.merged += 1
+                continue
+            self.count += 1
+            test_id = f"{self.id_prefix}{self.count:03d}"
+            appended.append((test_id, title, description))
+            if self.trace is not None:
+                self.trace.add_test_case(test_id, title, description, chunk_req_ids, span)
+            if not self.keep_rows:
+                continue
+            self.ids.append(test_id)
+            self.titles.append(title)
+            self.descriptions.append(description)
+            self.chunks.append(index)
+            self.page_starts.append(first_page)
+            self.page_ends.append(last_page)
+            self.duplicates.append(0)
+        if self.sink is not None and appended:
+            self.sink.write_rows(appended)
+        return len(appended)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def chunks_added(self):
+        """Chunks appended so far (chunks still held back are not counted)."""
+        return self._next_chunk
+
+    @property
+    def pending_chunks(self):
+        """Chunks waiting for an earlier chunk before they can be appended."""
+        return len(self._pending)
+
+    def _columns(self, sources):
+        columns = {"ID": self.ids, "Title": self.titles, "Description": self.descriptions}
+        if sources:
+            columns["Chunk"] = [i + 1 for i in self.chunks]
+            columns["Page Start"] = self.page_starts
+            columns["Page End"] = self.page_ends
+            if self.dedup is not None:
+                columns["Duplicates Merged"] = self.duplicates
+            if self.trace is not None:
+                sources = [self.trace.source(test_id) for test_id in self.ids]
+                columns["Source Start"] = [source["start"] for source in sources]
+                columns["Source End"] = [source["end"] for source in sources]
+                columns["Requirements"] = [", ".join(source["requirements"]) for source in sources]
+        return columns
+
+    def to_dataframe(self, sources=False):
+        """
+        ID/Title/Description DataFrame. With `sources`, also Chunk, Page Start/End,
+        (when de-duplicating) how many duplicates each row absorbed and (with a
+        trace index) character offsets and requirement IDs.
+        """
+        with self._lock:
+            return pd.DataFrame(self._columns(sources))
+
+    def to_arrow(self, sources=False):
+        """Same columns as to_dataframe as a pyarrow Table (needs pyarrow installed)."""
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required for Arrow output: pip install pyarrow")
+        with self._lock:
+            return pa.table(self._columns(sources))
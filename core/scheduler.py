@@ -0,0 +1,146 @@
+import contextlib
+import random
+import threading
+import time
+
+from config.settings import (
+    MAX_CONCURRENT_CHUNKS, CHUNK_TIMEOUT_SECONDS, CHUNK_TIMEOUT_PER_1K_TOKENS, CHUNK_TIMEOUT_MAX_SECONDS,
+    LLM_RETRIES, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, ADAPTIVE_MAX_CONCURRENCY, ADAPTIVE_LATENCY_TOLERANCE,
+)
+from core.chunker import estimate_tokens
+
+DECREASE_FACTOR = 0.5  # Limit cut on an error
+SLOW_DECREASE_FACTOR = 0.9  # Gentler cut when requests only get slow
+LATENCY_MIN_TOKENS = 500  # Shorter prompts count as this long, so fixed per-request overhead is not "slow"
+BASELINE_DRIFT = 0.05  # How fast the best latency follows a server that got slower for good
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for LLM requests that adapts to the server (AIMD).
+
+    Used like a semaphore (acquire/release), plus `record()` after each
+    request. Every request that succeeds at normal speed raises the limit by
+    1/limit, so about one more slot per round of requests; an error (timeout,
+    overload) halves it and a request that was much slower per prompt token
+    than the best recently seen cuts it by 10%. Only one cut is made per round
+    trip, since the requests already in flight when the server got busy will
+    all report the same trouble.
+    """
+
+    def __init__(self, initial=MAX_CONCURRENT_CHUNKS, minimum=1, maximum=ADAPTIVE_MAX_CONCURRENCY,
+                 latency_tolerance=ADAPTIVE_LATENCY_TOLERANCE):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._baseline = None  # Best seconds per prompt token seen
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def current(self):
+        """Requests allowed in flight right now."""
+        return int(self.limit)
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, seconds, tokens=1, ok=True):
+        """Adjust the limit after a request that took `seconds` for a prompt of `tokens` tokens."""
+        now = time.monotonic()
+        with self._condition:
+            per_token = seconds / max(tokens, LATENCY_MIN_TOKENS)
+            slow = False
+            if ok:
+                if self._baseline is None or per_token < self._baseline:
+                    self._baseline = per_token
+                slow = per_token > self._baseline * self.latency_tolerance
+                self._baseline += (per_token - self._baseline) * BASELINE_DRIFT
+
+            if ok and not slow:
+                if self.limit < self.maximum:
+                    self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                    self.increases += 1
+            elif now - self._last_decrease >= seconds:
+                factor = SLOW_DECREASE_FACTOR if ok else DECREASE_FACTOR
+                self.limit = max(float(self.minimum), self.limit * factor)
+                self._last_decrease = now
+                self.decreases += 1
+            self._condition.notify_all()
+
+
+@contextlib.contextmanager
+def limiter_slot(limiter, tokens=1):
+    """
+    Hold a slot of `limiter` (a semaphore or AdaptiveLimiter, or None) for one
+    LLM request. An AdaptiveLimiter is told how long it took; only retryable
+    errors (timeouts, overload) count against the server.
+    """
+    if limiter is None:
+        yield
+        return
+    limiter.acquire()
+    start = time.monotonic()
+    ok = True
+    try:
+        yield
+    except Exception as e:
+        ok = not is_retryable(e)
+        raise
+    finally:
+        if hasattr(limiter, "record"):
+            limiter.record(time.monotonic() - start, tokens, ok)
+        limiter.release()
+
+
+def chunk_deadline(chunk, base=CHUNK_TIMEOUT_SECONDS, per_1k_tokens=CHUNK_TIMEOUT_PER_1K_TOKENS,
+                   maximum=CHUNK_TIMEOUT_MAX_SECONDS):
+    """Seconds a chunk may take: `base` plus `per_1k_tokens` for every 1000 tokens of text, capped."""
+    return min(maximum, base + per_1k_tokens * estimate_tokens(chunk) / 1000)
+
+
+def is_retryable(error):
+    """True if `error`, or an exception it was raised from, is marked retryable (see LLMRequestError)."""
+    while error is not None:
+        if getattr(error, "retryable", False):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, maximum=RETRY_MAX_SECONDS, rng=random):
+    """Full-jitter exponential backoff: uniform between 0 and base * 2^attempt (capped)."""
+    return rng.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def call_with_retries(func, retries=LLM_RETRIES, base=RETRY_BASE_SECONDS, maximum=RETRY_MAX_SECONDS,
+                      on_retry=None, should_retry=is_retryable, sleep=time.sleep):
+    """
+    Call `func(attempt)` until it succeeds, retrying retryable errors up to `retries` times.
+
+    `on_retry(attempt, error, delay)` is called before each backoff.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(attempt)
+        except Exception as e:
+            if attempt >= retries or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, base, maximum)
+            if on_retry:
+                on_retry(attempt, e, delay)
+            sleep(delay)
+            attempt += 1
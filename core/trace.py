@@ -0,0 +1,152 @@
+import re
+from collections import deque
+
+from core.chunker import REQ_ID_RE, SourceText
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_req_id(req_id):
+    """One spelling per requirement ID: "req_001" and "REQ 001" are "REQ-001"."""
+    return WHITESPACE_RE.sub("-", req_id.strip().upper()).replace("_", "-")
+
+
+def find_req_ids(text):
+    """Requirement IDs mentioned in `text`, normalized, in order of first mention."""
+    return list(dict.fromkeys(normalize_req_id(m.group(0)) for m in REQ_ID_RE.finditer(text)))
+
+
+class SourceMap:
+    """
+    Locates blocks that went through parser.clean_blocks in the extracted text.
+
+    record() wraps the block stream from the parser and notes where each block
+    starts; locate() wraps the cleaned stream and turns each block into a
+    SourceText (see core.chunker) with its page and character offsets.
+    Cleaned blocks are the recorded blocks in order, the first one possibly
+    cut to start at a requirement keyword, so only blocks not located yet are
+    held. With an `index`, requirement IDs are added to it as they are found.
+    """
+
+    def __init__(self, pages=True, index=None):
+        self.pages = pages
+        self.index = index
+        self._blocks = deque()
+        self._count = 0
+        self._offset = 0
+
+    def record(self, blocks):
+        for block in blocks:
+            self._count += 1
+            self._blocks.append((block, self._count, self._offset))
+            self._offset += len(block) + 1  # parse_file joins blocks with newlines
+            yield block
+
+    def locate(self, blocks):
+        for block in blocks:
+            while self._blocks:
+                original, number, start = self._blocks.popleft()
+                if original.endswith(block):
+                    break
+            else:
+                yield block  # Not a recorded block; leave it unlocated
+                continue
+            start += len(original) - len(block)
+            page = number if self.pages else None
+            located = SourceText(block, {"page_start": page, "page_end": page, "start": start,
+                                         "end": start + len(block)})
+            if self.index is not None:
+                self.index.add_requirements(located)
+            yield located
+
+
+class TraceIndex:
+    """
+    Links between requirement IDs, test cases and where in the document they came from.
+
+    Requirements are the REQ-IDs found in the cleaned document text, with the
+    page and offset where each is first mentioned. A test case keeps the span
+    of the chunk it was generated from and is linked to the chunk's REQ-IDs
+    that its title or description names, or to all of them when it names none
+    (the model's answer cannot be pinned closer than its chunk). A merged
+    duplicate adds its links to the test case it was merged into.
+
+    Both directions are dicts, so lookups stay constant-time however many
+    rows there are; coverage() lists the requirements without a test case.
+    """
+
+    def __init__(self):
+        self.requirements = {}  # req id -> {"page", "start"} of its first mention
+        self.test_cases = {}  # test id -> source span plus "requirements"
+        self.by_requirement = {}  # req id -> [test ids]
+
+    def add_requirements(self, text):
+        """Note the REQ-IDs mentioned in a located text (SourceText) and where."""
+        span = getattr(text, "span", None)
+        for match in REQ_ID_RE.finditer(text):
+            req_id = normalize_req_id(match.group(0))
+            if req_id not in self.requirements:
+                self.requirements[req_id] = {"page": span["page_start"] if span else None,
+                                             "start": span["start"] + match.start() if span else None}
+
+    def add_test_case(self, test_id, title, description, chunk_req_ids, span=None):
+        """
+        Link a test case to the REQ-IDs of its chunk. Called again for the same
+        `test_id` (a merged duplicate), it only adds links.
+        """
+        named = [r for r in find_req_ids(f"{title} {description}") if r in chunk_req_ids]
+        linked = named or list(chunk_req_ids)
+        entry = self.test_cases.get(test_id)
+        if entry is None:
+            span = span or {}
+            entry = self.test_cases[test_id] = {
+                "page_start": span.get("page_start"), "page_end": span.get("page_end"),
+                "start": span.get("start"), "end": span.get("end"), "requirements": [],
+            }
+        for req_id in linked:
+            if req_id not in entry["requirements"]:
+                entry["requirements"].append(req_id)
+                self.by_requirement.setdefault(req_id, []).append(test_id)
+
+    def tests_for(self, req_id):
+        """IDs of the test cases covering a requirement."""
+        return list(self.by_requirement.get(normalize_req_id(req_id), []))
+
+    def source(self, test_id):
+        """Page range, character offsets and requirement IDs a test case came from, or None."""
+        return self.test_cases.get(test_id)
+
+    def coverage(self):
+        """
+        Returns:
+            dict: Counts of requirements, covered requirements and test cases
+                without a requirement, the covered share, and `gaps`: the
+                requirements with no test case, in document order
+        """
+        gaps = [r for r in self.requirements if not self.by_requirement.get(r)]
+        total = len(self.requirements)
+        return {
+            "requirements": total,
+            "covered": total - len(gaps),
+            "coverage": round((total - len(gaps)) / total, 4) if total else None,
+            "untraced_test_cases": sum(1 for entry in self.test_cases.values() if not entry["requirements"]),
+            "gaps": gaps,
+        }
+
+    def requirement_rows(self):
+        """One (requirement, first page, offset, test case IDs) row per requirement, in document order."""
+        return [(req_id, place["page"], place["start"], self.by_requirement.get(req_id, []))
+                for req_id, place in self.requirements.items()]
+
+    def to_dict(self):
+        return {"requirements": self.requirements, "test_cases": self.test_cases, "coverage": self.coverage()}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        index.requirements = dict(data.get("requirements", {}))
+        for test_id, entry in data.get("test_cases", {}).items():
+            index.test_cases[test_id] = entry
+            for req_id in entry["requirements"]:
+                index.by_requirement.setdefault(req_id, []).append(test_id)
+        return index
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from config.settings import VERSION_STORE_DIR, VERSION_STORE_KEEP
+from core.chunker import REQ_ID_PATTERN, split_sections, iter_lines, estimate_tokens
+from core.trace import normalize_req_id
+
+ANCHOR_RE = re.compile(rf"^\s*({REQ_ID_PATTERN})")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def section_anchor(section):
+    """Stable name for a section: its requirement ID, or else its first line."""
+    first_line = section.split("\n", 1)[0].strip()
+    match = ANCHOR_RE.match(first_line)
+    if match:
+        return normalize_req_id(match.group(1))
+    return first_line[:80]
+
+
+def section_fingerprint(section):
+    """Hash of the section text with whitespace normalized, so re-flowed text is not a change."""
+    normalized = WHITESPACE_RE.sub(" ", section).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def iter_sections(blocks):
+    """Lazily split cleaned text blocks into sections, yielding {"text", "anchor", "fingerprint"} dicts."""
+    for s in split_sections(iter_lines(blocks)):
+        yield {"text": s, "anchor": section_anchor(s), "fingerprint": section_fingerprint(s)}
+
+
+def fingerprint_sections(blocks):
+    """Split cleaned text blocks into sections and return [{"text", "anchor", "fingerprint"}, ...]."""
+    return list(iter_sections(blocks))
+
+
+def group_sections(sections, max_tokens):
+    """
+    Greedily pack consecutive sections into groups that fit one prompt.
+
+    Uses the same budget rule as chunker.pack_sections, so a group normally
+    becomes exactly one chunk (an oversized section is split into several).
+    """
+    return list(iter_groups(sections, max_tokens))
+
+
+def iter_groups(sections, max_tokens):
+    """Lazy group_sections: yields each group as soon as the next section does not fit in it."""
+    current = []
+    current_tokens = 0
+    for section in sections:
+        section_tokens = estimate_tokens(section["text"]) + 1
+        if current and current_tokens + section_tokens > max_tokens:
+            yield current
+            current, current_tokens = [], 0
+        current.append(section)
+        current_tokens += section_tokens
+    if current:
+        yield current
+
+
+def diff_sections(old_sections, new_sections):
+    """
+    Compare two section lists by fingerprint and anchor.
+
+    Returns:
+        dict: "unchanged", "changed", "added" and "removed" lists of anchors
+    """
+    old_fingerprints = {s["fingerprint"] for s in old_sections}
+    new_fingerprints = {s["fingerprint"] for s in new_sections}
+    old_anchors = {s["anchor"] for s in old_sections if s["fingerprint"] not in new_fingerprints}
+    new_anchors = {s["anchor"] for s in new_sections if s["fingerprint"] not in old_fingerprints}
+
+    diff = {"unchanged": [], "changed": [], "added": [], "removed": []}
+    for s in new_sections:
+        if s["fingerprint"] in old_fingerprints:
+            diff["unchanged"].append(s["anchor"])
+        elif s["anchor"] in old_anchors:
+            diff["changed"].append(s["anchor"])
+        else:
+            diff["added"].append(s["anchor"])
+    diff["removed"] = [s["anchor"] for s in old_sections
+                       if s["fingerprint"] not in new_fingerprints and s["anchor"] not in new_anchors]
+    return diff
+
+
+class DocumentStore:
+    """
+    Versions of each document with its sections and the test cases generated per section group.
+
+    One JSON file per document id holds the last `keep` versions. A group is
+    the set of consecutive sections that were sent to the LLM together, since
+    the model's test cases cannot be pinned to a single section inside it.
+    """
+
+    def __init__(self, directory=VERSION_STORE_DIR, keep=VERSION_STORE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, doc_id):
+        return os.path.join(self.directory, hashlib.sha256(doc_id.encode("utf-8")).hexdigest()[:32] + ".json")
+
+    def _read(self, doc_id):
+        try:
+            with open(self._path(doc_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"doc_id": doc_id, "versions": []}
+
+    def versions(self, doc_id):
+        return self._read(doc_id)["versions"]
+
+    def latest(self, doc_id):
+        """Most recent version dict of the document, or None."""
+        versions = self.versions(doc_id)
+        return versions[-1] if versions else None
+
+    def save(self, doc_id, version):
+        """Append a version and return its number."""
+        with self._lock:
+            data = self._read(doc_id)
+            version["version"] = (data["versions"][-1]["version"] + 1) if data["versions"] else 1
+            version["created"] = time.time()
+            data["versions"] = (data["versions"] + [version])[-self.keep:]
+            path = self._path(doc_id)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            return version["version"]
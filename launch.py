@@ -2,23 +2,70 @@
 """
 Launch script for Spec2Test Lite
 Checks dependencies and starts the Streamlit app
+
+The dependency check is cached in LAUNCH_CHECK_CACHE and skipped on later
+launches until the Python environment or requirements.txt changes; pass
+--recheck to force it.
 """
 
 import sys
+import os
+import argparse
+import hashlib
+import json
 import subprocess
+import sysconfig
 import importlib.util
+import urllib.request
+
+from config.settings import DEFAULT_MODEL, LLM_BACKEND, OLLAMA_HOST, OLLAMA_POOL, LAUNCH_CHECK_CACHE
+
+DEPENDENCIES = [
+    ("streamlit", "streamlit"),
+    ("pandas", "pandas"),
+    ("PyMuPDF", "fitz"),
+    ("python-docx", "docx"),
+    ("requests", "requests"),
+]
 
 def check_dependency(package_name, import_name=None):
-    """Check if a package is installed"""
+    """Check if a package is installed, without importing it"""
     if import_name is None:
         import_name = package_name
     
     try:
-        importlib.import_module(import_name)
-        return True
-    except ImportError:
+        return importlib.util.find_spec(import_name) is not None
+    except (ImportError, ValueError):
         return False
 
+def environment_key():
+    """Fingerprint of the interpreter, its installed packages and requirements.txt"""
+    digest = hashlib.sha1()
+    digest.update(f"{sys.executable}|{sys.version}".encode("utf-8"))
+    for path in {sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]}:
+        # Installing or removing a package changes the site-packages directory
+        digest.update(f"|{path}:{os.stat(path).st_mtime_ns if os.path.isdir(path) else 0}".encode("utf-8"))
+    requirements = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements.txt")
+    if os.path.exists(requirements):
+        with open(requirements, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def dependencies_cached(path=LAUNCH_CHECK_CACHE):
+    """True if an earlier launch found every dependency in this same environment"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("environment") == environment_key()
+    except (OSError, ValueError):
+        return False
+
+def cache_dependencies(path=LAUNCH_CHECK_CACHE):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment_key()}, f)
+    except OSError:
+        pass  # Checked again next time
+
 def install_dependency(package_name):
     """Install a missing dependency"""
     print(f"Installing {package_name}...")
@@ -28,32 +75,50 @@ def install_dependency(package_name):
     except subprocess.CalledProcessError:
         return False
 
-def check_ollama():
-    """Check if Ollama is installed and running"""
+def ollama_models(host, timeout=3):
+    """Models pulled on an Ollama server (GET /api/tags), or None if it cannot be reached"""
     try:
-        result = subprocess.run(["ollama", "list"], capture_output=True, text=True, timeout=10)
-        return result.returncode == 0
-    except (subprocess.TimeoutExpired, FileNotFoundError):
-        return False
+        with urllib.request.urlopen(f"{host.rstrip('/')}/api/tags", timeout=timeout) as response:
+            return [m["name"] for m in json.load(response).get("models", [])]
+    except (OSError, ValueError):
+        return None
+
+def check_ollama():
+    """Check if Ollama is installed and running, and warn when the model has not been pulled"""
+    if LLM_BACKEND == "subprocess":
+        try:
+            result = subprocess.run(["ollama", "list"], capture_output=True, text=True, timeout=10)
+            return result.returncode == 0
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            return False
+    
+    # The REST API answers in milliseconds, where `ollama list` starts a CLI process
+    hosts = [server["host"] for server in OLLAMA_POOL] if LLM_BACKEND == "pool" and OLLAMA_POOL else [OLLAMA_HOST]
+    reachable = [models for models in map(ollama_models, hosts) if models is not None]
+    model = DEFAULT_MODEL if ":" in DEFAULT_MODEL else f"{DEFAULT_MODEL}:latest"
+    if reachable and not any(model in models for models in reachable):
+        print(f"⚠️  Model {DEFAULT_MODEL} not found, run: ollama pull {DEFAULT_MODEL}")
+    return bool(reachable)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check dependencies and start Spec2Test Lite")
+    parser.add_argument("--recheck", action="store_true", help="Check Python dependencies even if cached")
+    args = parser.parse_args(argv)
+    
     print("🚀 Spec2Test Lite - Launch Check")
     print("=" * 40)
     
-    # Check Python dependencies
-    dependencies = [
-        ("streamlit", "streamlit"),
-        ("pandas", "pandas"),
-        ("PyMuPDF", "fitz"),
-        ("python-docx", "docx")
-    ]
-    
+    # Check Python dependencies, unless this environment already passed
+    cached = not args.recheck and dependencies_cached()
     missing_deps = []
-    for package, import_name in dependencies:
-        if not check_dependency(package, import_name):
-            missing_deps.append(package)
+    if not cached:
+        for package, import_name in DEPENDENCIES:
+            if not check_dependency(package, import_name):
+                missing_deps.append(package)
     
-    if missing_deps:
+    if cached:
+        print("✅ Python dependencies unchanged since the last check")
+    elif missing_deps:
         print(f"❌ Missing dependencies: {', '.join(missing_deps)}")
         print("Installing missing dependencies...")
         
@@ -64,14 +129,17 @@ def main():
                 return False
         
         print("✅ Dependencies installed successfully!")
+        importlib.invalidate_caches()
+        cache_dependencies()
     else:
         print("✅ All Python dependencies are installed")
+        cache_dependencies()
     
     # Check Ollama
     if not check_ollama():
         print("❌ Ollama not found or not running")
         print("Please install Ollama from https://ollama.ai")
-        print("Then run: ollama pull llama3")
+        print(f"Then run: ollama pull {DEFAULT_MODEL}")
         return False
     else:
         print("✅ Ollama is running")
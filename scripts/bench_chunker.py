@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Compare chunking strategies: how many LLM calls and prompt tokens a document costs
+
+Usage:
+    python scripts/bench_chunker.py [document.pdf|document.docx] [--requirements N]
+"""
+
+import sys
+import os
+import argparse
+import re
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunker import chunk_text, chunk_requirements, estimate_tokens
+from core.prompt import get_prompt
+from config.settings import CHUNK_SIZE
+from core.prefilter import filter_chunks, new_prefilter_stats, calls_avoided
+from bench_corpus import synthetic_requirements, boilerplate
+
+def requirement_blocks(text):
+    """A REQ-ID line plus its detail lines, up to the next REQ-ID or heading"""
+    return re.findall(r"REQ-\d+.*?(?=\nREQ-|\n\d+(?:\.\d+)*\.? |\Z)", text, re.S)
+
+
+def split_requirements(chunks, blocks):
+    """Count requirements that are not contained whole in any chunk"""
+    return sum(1 for b in blocks if not any(b in c for c in chunks))
+
+
+def measure(name, chunker, text, blocks):
+    start = time.perf_counter()
+    chunks = chunker(text)
+    elapsed = time.perf_counter() - start
+    prompt_tokens = sum(estimate_tokens(get_prompt(c)) for c in chunks)
+    text_tokens = sum(estimate_tokens(c) for c in chunks)
+    print(f"{name:<10} calls={len(chunks):<5} prompt_tokens={prompt_tokens:<8} "
+          f"overhead={1 - text_tokens / max(prompt_tokens, 1):5.1%} "
+          f"split_requirements={split_requirements(chunks, blocks):<4} time={elapsed * 1000:.1f}ms")
+    return len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("document", nargs="?", help="PDF or DOCX to chunk (default: synthetic text)")
+    parser.add_argument("--requirements", type=int, default=300, help="Requirements in the synthetic document")
+    parser.add_argument("--boilerplate", type=int, default=0,
+                        help="Table of contents / revision history / glossary lines appended to the synthetic document")
+    args = parser.parse_args()
+
+    if args.document:
+        from core.parser import parse_file, clean_text
+        text = clean_text(parse_file(args.document))
+    else:
+        text = synthetic_requirements(args.requirements)
+        if args.boilerplate:
+            text += "\n" + "\n".join(boilerplate(args.boilerplate))
+
+    blocks = requirement_blocks(text)
+    print(f"📄 {len(text)} chars, ~{estimate_tokens(text)} tokens, {len(blocks)} REQ-ID requirements\n")
+
+    char_calls = measure("chars", lambda t: chunk_text(t, max_chars=CHUNK_SIZE), text, blocks)
+    token_calls = measure("tokens", chunk_requirements, text, blocks)
+    print(f"\n📉 LLM calls reduced by {1 - token_calls / max(char_calls, 1):.0%}")
+
+    for name, chunker in [("chars", lambda t: chunk_text(t, max_chars=CHUNK_SIZE)), ("tokens", chunk_requirements)]:
+        stats = new_prefilter_stats()
+        calls = len(list(filter_chunks(chunker(text), stats)))
+        print(f"🔎 Pre-filter ({name}): {stats['skipped']} skipped, {stats['batched']} batched -> "
+              f"{calls} calls ({calls_avoided(stats)} avoided)")
+
+
+if __name__ == "__main__":
+    main()
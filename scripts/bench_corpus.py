@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Synthetic requirements corpora for benchmarks
+
+Usage:
+    python scripts/bench_corpus.py out_dir --documents 5 --requirements 500 --formats pdf docx
+"""
+
+import sys
+import os
+import argparse
+import random
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACTORS = ["user", "administrator", "editor", "system", "auditor"]
+ACTIONS = ["log in with valid credentials", "reset a forgotten password", "export reports as CSV",
+           "approve pending articles", "lock an account after five failed attempts",
+           "receive an email notification", "search records by date range"]
+FRONT_MATTER = ["Software Requirements Specification", "Table of Contents", "1. Introduction",
+                "This document describes the functional requirements.", "Revision History",
+                "Version 1.0 - Initial draft"]
+
+
+def synthetic_requirements(count, seed=0):
+    """Build a requirements-like document with headings, REQ-IDs and list items"""
+    rng = random.Random(seed)
+    lines = list(FRONT_MATTER) + ["2. Functional Requirements"]
+    for i in range(1, count + 1):
+        if i % 10 == 1:
+            lines.append(f"2.{i // 10 + 1} Module {i // 10 + 1}")
+        actor, action = rng.choice(ACTORS), rng.choice(ACTIONS)
+        lines.append(f"REQ-{i:03d}: The {actor} shall be able to {action}.")
+        for _ in range(rng.randint(1, 3)):
+            lines.append(f"- The {rng.choice(ACTORS)} must {rng.choice(ACTIONS)} within {rng.randint(1, 10)} seconds.")
+    return "\n".join(lines)
+
+
+def boilerplate(lines, seed=0):
+    """Table of contents, revision history and glossary lines with nothing to test"""
+    rng = random.Random(seed)
+    out = ["Table of Contents"]
+    out += [f"{n}. Section {n} {'.' * 12} {n * 3}" for n in range(1, lines // 3 + 1)]
+    out.append("Revision History")
+    out += [f"Version 1.{n} 2024-{n % 12 + 1:02d}-{n % 28 + 1:02d} Editorial changes" for n in range(lines // 3)]
+    out.append("Glossary")
+    out += [f"Term{n}: {rng.choice(ACTORS).title()} related definition number {n}" for n in range(lines // 3)]
+    return out
+
+
+def write_pdf(path, text, lines_per_page=45):
+    import fitz
+
+    lines = text.split("\n")
+    doc = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((40, 40), "\n".join(lines[start:start + lines_per_page]), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def write_docx(path, text):
+    import docx
+
+    document = docx.Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def build_corpus(directory, documents=3, requirements=300, formats=("pdf", "docx"), seed=0):
+    """Write `documents` files per format into `directory` and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(documents):
+        text = synthetic_requirements(requirements, seed=seed + n)
+        for fmt in formats:
+            path = os.path.join(directory, f"spec_{n + 1:03d}.{fmt}")
+            if fmt == "pdf":
+                write_pdf(path, text)
+            elif fmt == "docx":
+                write_docx(path, text)
+            else:
+                raise ValueError(f"Unsupported format: {fmt}")
+            paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--requirements", type=int, default=300, help="Requirements per document")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx"], choices=["pdf", "docx"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = build_corpus(args.directory, args.documents, args.requirements, args.formats, args.seed)
+    print(f"📄 Wrote {len(paths)} documents to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the single-pass output parser with the previous regex + pandas.read_csv parser
+
+Usage:
+    python scripts/bench_output_parser.py [--rows N] [--outputs N] [--repeat N]
+"""
+
+import sys
+import os
+import argparse
+import io
+import random
+import re
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from config.settings import CSV_SEPARATOR
+from core.generator import parse_llm_csv_output, parse_rows
+
+
+def legacy_parse_llm_csv_output(output_text):
+    """The parser used before the single-pass one, kept here as the baseline"""
+    output_text = output_text.strip()
+    csv_match = re.search(r"(Title\s*\|\s*Description\s*\n(?:.*\|.*\n?)*)", output_text, re.IGNORECASE)
+    if not csv_match:
+        return pd.DataFrame(columns=["Title", "Description"])
+
+    lines = csv_match.group(1).strip().splitlines()
+    filtered_lines = [lines[0]]
+    for line in lines[1:]:
+        if re.search(r'ID:\s*Title:\s*Title\s*Description:\s*Description', line, re.IGNORECASE):
+            continue
+        if line.count(CSV_SEPARATOR) == 1:
+            filtered_lines.append(line)
+        else:
+            break
+
+    try:
+        df = pd.read_csv(io.StringIO("\n".join(filtered_lines)), sep=CSV_SEPARATOR)
+        if {"Title", "Description"}.issubset(df.columns):
+            df = df[["Title", "Description"]]
+            df = df[~((df["Title"].str.strip().isin(["-", "N/A", ""])) |
+                      (df["Description"].str.strip().isin(["-", "N/A", ""])))]
+            df = df.reset_index(drop=True)
+            if df.empty:
+                return pd.DataFrame(columns=["Title", "Description"])
+            return df
+        return pd.DataFrame(columns=["Title", "Description"])
+    except Exception:
+        return pd.DataFrame(columns=["Title", "Description"])
+
+
+def noisy_output(rows, rng):
+    """An LLM answer with chatter before the table, placeholder rows and notes after it"""
+    lines = ["Sure! Here are the test cases extracted from the requirements:", "",
+             "ID: Title: Title Description: Description", "Title|Description"]
+    for n in range(rows):
+        if rng.random() < 0.05:
+            lines.append("-|-")
+        elif rng.random() < 0.05:
+            lines.append("N/A|Not applicable")
+        else:
+            lines.append(f"Verify requirement {n} behaviour|The system shall handle case {n} "
+                         f"within {rng.randint(1, 10)} seconds and log the outcome.")
+    lines += ["", "Note: these test cases cover the functional requirements only.",
+              "Let me know if you need | more detail."]
+    return "\n".join(lines)
+
+
+def time_parser(parser, outputs, repeat):
+    start = time.perf_counter()
+    rows = 0
+    for _ in range(repeat):
+        for output in outputs:
+            rows += len(parser(output))
+    return time.perf_counter() - start, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="Table rows per output")
+    parser.add_argument("--outputs", type=int, default=200, help="Outputs to parse per pass")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    outputs = [noisy_output(args.rows, rng) for _ in range(args.outputs)]
+
+    # read_csv turns "N/A" cells into NaN, which slipped past the legacy placeholder filter
+    mismatches = sum(1 for o in outputs
+                     if legacy_parse_llm_csv_output(o).dropna().values.tolist() != [list(r) for r in parse_rows(o)])
+    print(f"Parsing {args.outputs} outputs of {args.rows} rows, {args.repeat} passes "
+          f"(results differ on {mismatches} outputs, ignoring legacy NaN rows)")
+
+    baseline = None
+    for name, func in [("legacy", legacy_parse_llm_csv_output), ("dataframe", parse_llm_csv_output),
+                       ("rows", parse_rows)]:
+        elapsed, rows = time_parser(func, outputs, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:<10} {elapsed:8.3f}s  {rows / elapsed:>12,.0f} rows/s  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
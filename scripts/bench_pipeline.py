@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Reproducible pipeline benchmark against the mock Ollama server
+
+Builds a synthetic corpus, then times the parse, chunk, generate and
+parse-output stages and records their peak Python memory. Results are written
+as JSON so runs can be compared across commits; no GPU or model is needed.
+
+Usage:
+    python scripts/bench_pipeline.py --documents 3 --requirements 500 --latency 0.2
+    python scripts/bench_pipeline.py --compare bench_results/<earlier run>.json
+    python scripts/bench_pipeline.py --batch   # also time batched requests against one request per chunk
+"""
+
+import sys
+import os
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_corpus import build_corpus
+from mock_ollama import start_mock_server, canned_csv
+from config.settings import MAX_CONCURRENT_CHUNKS
+from core.parser import iter_blocks, clean_blocks
+from core.chunker import iter_chunks
+from core.prompt import get_prompt
+from core.generator import parse_llm_csv_output
+from core.llm_backend import OllamaHTTPBackend, set_backend
+from core.pipeline import process_chunks
+
+RESULTS_DIR = "bench_results"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def measure(func, track_memory=True):
+    """Run func once for time, and once more under tracemalloc for peak memory"""
+    start = time.perf_counter()
+    result, items = func()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if track_memory:
+        tracemalloc.start()
+        func()
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        tracemalloc.stop()
+    stats = {"seconds": round(seconds, 4), "items": items,
+             "items_per_second": round(items / seconds, 2) if seconds else None, "peak_mb": peak_mb}
+    return result, stats
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        paths = build_corpus(directory, args.documents, args.requirements, args.formats)
+        corpus_bytes = sum(os.path.getsize(p) for p in paths)
+
+        def parse_stage():
+            blocks = {p: list(iter_blocks(p)) for p in paths}
+            return blocks, sum(len(b) for b in blocks.values())
+
+        blocks, parse_stats = measure(parse_stage, args.memory)
+        parse_stats["mb_per_second"] = round(corpus_bytes / 1024 / 1024 / parse_stats["seconds"], 2)
+
+    def chunk_stage():
+        chunks = [c for p in paths for c in iter_chunks(clean_blocks(blocks[p]))]
+        return chunks, len(chunks)
+
+    chunks, chunk_stats = measure(chunk_stage, args.memory)
+
+    server = start_mock_server(latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second)
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        def generate_stage(batch):
+            def run_stage():
+                on_row = (lambda i, row: None) if args.streaming else None
+                dfs = process_chunks(chunks, max_workers=args.concurrency, on_row=on_row, batch=batch)
+                return dfs, len(chunks)
+            return run_stage
+
+        generate_stats = {}
+        for name, batch in [("generate", False)] + ([("generate_batched", True)] if args.batch else []):
+            requests = server.requests
+            dfs, stats = measure(generate_stage(batch), args.memory)
+            # Requests of the timed pass only; the tracemalloc pass makes as many again
+            calls = (server.requests - requests) // (2 if args.memory else 1)
+            stats["test_cases"] = sum(len(df) for df in dfs)
+            stats["test_cases_per_second"] = round(stats["test_cases"] / stats["seconds"], 2)
+            stats["llm_calls"] = calls
+            stats["calls_per_second"] = round(calls / stats["seconds"], 2)
+            stats["max_in_flight"] = server.max_in_flight
+            generate_stats[name] = stats
+    finally:
+        server.shutdown()
+
+    outputs = [canned_csv(get_prompt(c), args.cases_per_requirement) for c in chunks]
+
+    def parse_output_stage():
+        rows = sum(len(parse_llm_csv_output(o)) for _ in range(args.repeat) for o in outputs)
+        return None, rows
+
+    _, parse_output_stats = measure(parse_output_stage, args.memory)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "corpus": {"documents": len(paths), "bytes": corpus_bytes, "chunks": len(chunks)},
+        "stages": {
+            "parse": parse_stats,
+            "chunk": chunk_stats,
+            **generate_stats,
+            "parse_output": parse_output_stats,
+        },
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+
+
+def compare(current, previous):
+    print(f"\n📊 Compared with {previous.get('commit')} ({previous.get('timestamp')})")
+    for name, stats in current["stages"].items():
+        old = previous["stages"].get(name)
+        if not old or not old.get("seconds"):
+            continue
+        speedup = old["seconds"] / stats["seconds"] if stats["seconds"] else float("inf")
+        memory = ""
+        if stats.get("peak_mb") is not None and old.get("peak_mb"):
+            memory = f", peak memory {stats['peak_mb'] / old['peak_mb']:.2f}x"
+        print(f"  {name:<16} {old['seconds']:.3f}s -> {stats['seconds']:.3f}s ({speedup:.2f}x faster{memory})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2, help="Documents per format")
+    parser.add_argument("--requirements", type=int, default=300, help="Requirements per document")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx"], choices=["pdf", "docx"])
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Random +/- seconds added to the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Pace streamed tokens (0 = no pacing)")
+    parser.add_argument("--cases-per-requirement", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_CHUNKS)
+    parser.add_argument("--streaming", action="store_true", help="Benchmark the streaming generation path")
+    parser.add_argument("--batch", action="store_true",
+                        help="Also run the generate stage with small chunks batched into JSON requests")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the outputs in the parse_output stage")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", help=f"Result file (default: {RESULTS_DIR}/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    for name, stats in result["stages"].items():
+        peak = f"{stats['peak_mb']} MB" if stats["peak_mb"] is not None else "n/a"
+        print(f"{name:<16} {stats['seconds']:>8.3f}s  {stats['items']:>7} items  "
+              f"{stats['items_per_second'] or 0:>10.1f}/s  peak {peak}")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['commit'] or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark: launcher checks, time to first render and time to first test case
+
+Each launcher and app stage runs in a fresh interpreter, timed from process
+start to exit, so interpreter start-up and module imports are paid every time;
+the median of --repeat runs is kept. The first render is
+the app script run once through Streamlit's AppTest. Time to first test case
+runs a small document against the mock Ollama server, which waits
+--load-seconds on the first request as if loading the model: once cold, and
+once with the background warm-up started at start-up, --upload-delay seconds
+before the document arrives.
+
+Usage:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --load-seconds 5 --compare bench_results/<earlier run>.json
+"""
+
+import sys
+import os
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_corpus import synthetic_requirements, write_docx
+from bench_pipeline import RESULTS_DIR, git_commit, compare
+from mock_ollama import start_mock_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "python_startup": "pass",
+    "probe_by_import": "import streamlit, pandas, fitz, docx, requests",
+    "probe_by_find_spec": "import launch; assert all(launch.check_dependency(p, i) for p, i in launch.DEPENDENCIES)",
+    "probe_cached": "import launch; assert launch.dependencies_cached({cache!r})",
+    "app_imports": "import streamlit, config.settings, core.jobs, core.prefilter, core.export",
+    "first_render": ("from streamlit.testing.v1 import AppTest; "
+                     "app = AppTest.from_file({app!r}, default_timeout=120).run(); assert not app.exception"),
+}
+
+
+def run_snippet(code, cwd):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    # stderr goes to a file: worker processes started by the app outlive it and would hold a pipe open
+    with tempfile.TemporaryFile("w+") as err:
+        start = time.perf_counter()
+        returncode = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=err,
+                                    cwd=cwd, env=env).returncode
+        seconds = time.perf_counter() - start
+        if returncode != 0:
+            err.seek(0)
+            lines = err.read().strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else "failed")
+    return seconds
+
+
+def time_to_first_test_case(path, args, warm_up):
+    """
+    Seconds from the upload until the first test case, and until the whole
+    document is done. The document arrives --upload-delay seconds after
+    start-up, when the warm-up (if any) was started.
+    """
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    from core.jobs import start_warm_up
+    from core.pipeline import process_document
+
+    server = start_mock_server(latency=args.latency, load_seconds=args.load_seconds)
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    first = []
+    try:
+        if warm_up:
+            start_warm_up(backend="http")
+        time.sleep(args.upload_delay)
+        start = time.perf_counter()
+
+        def on_result(index, df, completed, total):
+            if not first and df is not None and len(df):
+                first.append(time.perf_counter() - start)
+        process_document(path, on_result=on_result, dedup=False, prefilter=False)
+        total = time.perf_counter() - start
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    return first[0] if first else None, total
+
+
+def run(args):
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        cache = os.path.join(directory, "launch.json")
+        subprocess.run([sys.executable, "-c", f"import launch; launch.cache_dependencies({cache!r})"],
+                       cwd=ROOT, check=True)
+        for name, code in SNIPPETS.items():
+            if name == "first_render" and not args.render:
+                continue
+            code = code.format(cache=cache, app=os.path.join(ROOT, "app.py"))
+            # The app starts its job queue and workers in the current directory
+            samples = [run_snippet(code, directory if name == "first_render" else ROOT)
+                       for _ in range(1 if name == "first_render" else args.repeat)]
+            stages[name] = {"seconds": round(statistics.median(samples), 4), "items": len(samples)}
+
+        path = os.path.join(directory, "spec.docx")
+        write_docx(path, synthetic_requirements(args.requirements))
+        for name, warm_up in (("first_test_case_cold", False), ("first_test_case_warm", True)):
+            first, total = time_to_first_test_case(path, args, warm_up)
+            stages[name] = {"seconds": round(first, 4) if first is not None else None, "items": 1,
+                            "document_seconds": round(total, 4)}
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per launcher/import stage")
+    parser.add_argument("--requirements", type=int, default=40, help="Requirements in the test document")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock LLM seconds per request")
+    parser.add_argument("--load-seconds", type=float, default=2.0, help="Mock model load time on its first request")
+    parser.add_argument("--upload-delay", type=float, default=1.0,
+                        help="Seconds between start-up and the upload in the time to first test case stages")
+    parser.add_argument("--no-render", dest="render", action="store_false", help="Skip the first render stage")
+    parser.add_argument("--output", help=f"Result file (default: {RESULTS_DIR}/<timestamp>-<commit>-startup.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    for name, stats in result["stages"].items():
+        seconds = f"{stats['seconds']:.3f}s" if stats["seconds"] is not None else "n/a"
+        extra = f"  (document done in {stats['document_seconds']:.3f}s)" if "document_seconds" in stats else ""
+        print(f"{name:<22} {seconds:>9}{extra}")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['commit'] or 'nogit'}-startup.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
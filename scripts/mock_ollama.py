@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Ollama REST API, for benchmarks and tests without a GPU or model
+
+Answers /api/generate and /api/chat (streaming and non-streaming) with a canned
+Title|Description table built from the REQ-IDs in the prompt (or, when a JSON
+`format` is requested, the batched JSON answer tagged by section), after a
+configurable latency and jitter. Also serves /api/tags and /api/embeddings. Can simulate an
+overloaded server (HTTP 503 past --max-parallel requests), failing requests, and the
+time a model takes to load on its first request (--load-seconds); a request without a
+prompt only loads the model, like Ollama's warm-up request.
+Like Ollama, it only counts the prompt text after the part shared with the
+previous request as evaluated (prompt_eval_count), as if that prefix was cached.
+
+Usage:
+    python scripts/mock_ollama.py --port 11435 --latency 0.5 --jitter 0.2
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REQ_ID_RE = re.compile(r"\b(?:REQ|FR|NFR)[-_ ]?\d+\b")
+PROMPT_MARKER = "Now extract test cases"
+SECTION_RE = re.compile(r"^### SECTION (\d+)\s*$", re.MULTILINE)
+
+
+def canned_csv(prompt, cases_per_requirement=1):
+    """Build a plausible CSV answer: one row per REQ-ID found in the requirements part of the prompt"""
+    requirements = prompt.split(PROMPT_MARKER, 1)[-1]
+    req_ids = list(dict.fromkeys(REQ_ID_RE.findall(requirements)))
+    lines = ["Title|Description"]
+    for req_id in req_ids:
+        for n in range(1, cases_per_requirement + 1):
+            lines.append(f"Verify {req_id} scenario {n}|The system behaves as specified in {req_id} for scenario {n}.")
+    if not req_ids:
+        lines.append("-|-")
+    return "\n".join(lines)
+
+
+def canned_batch_json(prompt, cases_per_requirement=1):
+    """Build the JSON answer to a batched prompt: test cases per REQ-ID, tagged with their section number"""
+    parts = SECTION_RE.split(prompt.split(PROMPT_MARKER, 1)[-1])
+    cases = []
+    for number, text in zip(parts[1::2], parts[2::2]):
+        for req_id in dict.fromkeys(REQ_ID_RE.findall(text)):
+            for n in range(1, cases_per_requirement + 1):
+                cases.append({"section": int(number), "title": f"Verify {req_id} scenario {n}",
+                              "description": f"The system behaves as specified in {req_id} for scenario {n}."})
+    return json.dumps({"test_cases": cases})
+
+
+def fake_embedding(text, dimensions=64):
+    """Deterministic bag-of-words vector so similar texts get similar embeddings"""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        bucket = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+        vector[bucket % dimensions] += 1.0 if bucket & 1 else -1.0
+    return vector
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": f"{self.server.model}:latest"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        if self.path in ("/api/generate", "/api/chat") and not (request.get("prompt") or request.get("messages")):
+            load_seconds = server.load(request.get("model"))
+            with server.lock:
+                server.warm_ups += 1
+            self._send_json({"model": request.get("model"), "response": "", "done": True, "done_reason": "load",
+                             "load_duration": int(load_seconds * 1e9)})
+            return
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path == "/api/embeddings":
+                self._send_json({"embedding": fake_embedding(request.get("prompt", ""))})
+            elif self.path == "/api/embed":
+                texts = request.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                self._send_json({"embeddings": [fake_embedding(t) for t in texts]})
+            elif self.path in ("/api/generate", "/api/chat"):
+                self._generate(request, chat=self.path == "/api/chat")
+            else:
+                self._send_json({"error": "not found"}, status=404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client stopped reading (e.g. streaming stopped early)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _generate(self, request, chat):
+        server = self.server
+        load_seconds = server.load(request.get("model"))
+        if chat:
+            prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        else:
+            prompt = "\n".join(p for p in (request.get("system"), request.get("prompt", "")) if p)
+
+        with server.lock:
+            overloaded = server.max_parallel and server.in_flight > server.max_parallel
+            server.rejected += 1 if overloaded else 0
+        if overloaded:
+            self._send_json({"error": "server busy"}, status=503)
+            return
+        if (server.fail_rate and server.random.random() < server.fail_rate) or (
+                server.fail_marker and server.fail_marker in prompt):
+            self._send_json({"error": "simulated failure"}, status=500)
+            return
+
+        with server.lock:
+            cached = len(os.path.commonprefix([prompt, server.last_prompt]))
+            server.last_prompt = prompt
+        evaluated = max(1, (len(prompt) - cached) // 4)
+
+        if request.get("format"):
+            text = canned_batch_json(prompt, server.cases_per_requirement)
+            if server.malformed_marker and server.malformed_marker in prompt:
+                text = text[:len(text) // 2]  # Cut off mid-object, like a model that ran out of tokens
+        else:
+            text = canned_csv(prompt, server.cases_per_requirement)
+        tokens = re.findall(r"\S+\s*|\s+", text)
+        delay = max(0.0, server.latency + server.random.uniform(-server.jitter, server.jitter))
+        stats = {
+            "total_duration": int((delay + load_seconds) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(max(evaluated * 1e-4, 1e-6) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(max(delay * 0.8, 1e-3) * 1e9),
+        }
+
+        def message(content, done):
+            data = {"model": request.get("model"), "done": done}
+            if chat:
+                data["message"] = {"role": "assistant", "content": content}
+            else:
+                data["response"] = content
+            return data
+
+        if not request.get("stream", True):
+            time.sleep(delay)
+            self._send_json({**message(text, True), **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Spend the latency before the first token, then pace tokens if requested
+        time.sleep(delay)
+        for token in tokens:
+            self._send_chunk(message(token, False))
+            if server.tokens_per_second:
+                time.sleep(1.0 / server.tokens_per_second)
+        self._send_chunk({**message("", True), **stats})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, tokens_per_second=0, cases_per_requirement=1,
+                 fail_rate=0.0, model="llama3", seed=0, max_parallel=0, fail_marker=None, malformed_marker=None,
+                 load_seconds=0.0):
+        super().__init__(("127.0.0.1", port), MockOllamaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.cases_per_requirement = cases_per_requirement
+        self.fail_rate = fail_rate
+        self.max_parallel = max_parallel
+        self.fail_marker = fail_marker
+        self.malformed_marker = malformed_marker
+        self.model = model
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+        self.last_prompt = ""
+        self.load_seconds = load_seconds
+        self.loaded = set()
+        self.warm_ups = 0
+        self._load_lock = threading.Lock()
+
+    def load(self, model):
+        """Seconds spent loading `model`: load_seconds the first time, 0 once it is resident."""
+        with self._load_lock:
+            if model in self.loaded:
+                return 0.0
+            time.sleep(self.load_seconds)
+            self.loaded.add(model)
+            return self.load_seconds
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def start_mock_server(**kwargs):
+    """Start a MockOllamaServer on a background thread (port 0 picks a free port) and return it"""
+    server = MockOllamaServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- seconds added to the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Pace streamed tokens (0 = no pacing)")
+    parser.add_argument("--cases-per-requirement", type=int, default=1)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--max-parallel", type=int, default=0,
+                        help="Answer requests beyond this many in flight with HTTP 503 (0 = no limit)")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="Time the first request per model waits for it to load")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                              tokens_per_second=args.tokens_per_second,
+                              cases_per_requirement=args.cases_per_requirement, fail_rate=args.fail_rate,
+                              max_parallel=args.max_parallel, load_seconds=args.load_seconds)
+    print(f"🦙 Mock Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock Ollama stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,26 @@ def test_chunker():
     
     return len(chunks) > 0
 
+def test_token_chunker():
+    """Test token-budgeted chunking along requirement boundaries"""
+    print("\nTesting token chunker...")
+    
+    from core.chunker import chunk_requirements, estimate_tokens
+    
+    requirements = [f"REQ-{i:03d}: The user shall be able to perform action {i}.\n- Detail for action {i}."
+                    for i in range(1, 21)]
+    text = "\n".join(requirements)
+    chunks = chunk_requirements(text, max_tokens=60)
+    overlapped = chunk_requirements(text, max_tokens=60, overlap_tokens=20)
+    
+    print(f"Number of chunks: {len(chunks)} (with overlap: {len(overlapped)})")
+    
+    whole = all(any(r in c for c in chunks) for r in requirements)
+    within_budget = all(estimate_tokens(c) <= 60 for c in chunks + overlapped)
+    repeated = overlapped[1].split("\n")[0] in overlapped[0]
+    
+    return len(chunks) > 1 and whole and within_budget and repeated
+
 def test_parser():
     """Test the text cleaning functionality"""
     print("\nTesting parser...")
@@ -40,6 +60,195 @@ def test_parser():
     
     return "Requirement" in cleaned
 
+def test_streaming_parse():
+    """Test lazy page/paragraph extraction against full-text parsing"""
+    print("\nTesting streaming parse...")
+    
+    import tempfile
+    import docx
+    import fitz
+    from core.parser import iter_blocks, clean_blocks, parse_file, clean_text
+    from core.chunker import iter_chunks, chunk_document
+    
+    pages = ["Table of Contents\nIntroduction", "REQ-001: User login\nREQ-002: User logout", "REQ-003: Password reset"]
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "spec.pdf")
+        pdf = fitz.open()
+        for text in pages:
+            pdf.new_page().insert_text((72, 72), text)
+        pdf.save(pdf_path)
+        pdf.close()
+        
+        docx_path = os.path.join(directory, "spec.docx")
+        document = docx.Document()
+        for text in "\n".join(pages).split("\n"):
+            document.add_paragraph(text)
+        document.save(docx_path)
+        
+        matches = []
+        for path in (pdf_path, docx_path):
+            blocks = iter_blocks(path)
+            streamed = list(iter_chunks(clean_blocks(blocks)))
+            expected = chunk_document(clean_text(parse_file(path)))
+            print(f"{os.path.basename(path)}: {len(streamed)} chunks, first: {streamed[0][:20]!r}")
+            matches.append(not isinstance(blocks, list) and streamed == expected)
+        
+        # Force the process-pool path on the small PDF and compare with serial extraction
+        from core.parser import iter_pdf_pages
+        parallel = list(iter_pdf_pages(pdf_path, workers=2, min_pages=1))
+        serial = list(iter_pdf_pages(pdf_path, workers=1))
+        print(f"Parallel extraction matches serial: {parallel == serial}")
+        matches.append(parallel == serial)
+    
+    return all(matches)
+
+def test_in_memory_parse():
+    """Test parsing uploads from bytes, memoryviews and file objects without a file on disk"""
+    print("\nTesting in-memory parse...")
+    
+    import glob
+    import io
+    import tempfile
+    import docx
+    import fitz
+    from config.settings import TEMP_FILE_PREFIX
+    from core.parser import parse_file, iter_pdf_pages
+    from core.jobs import save_upload
+    
+    pdf = fitz.open()
+    for text in ("REQ-001: User login", "REQ-002: User logout"):
+        pdf.new_page().insert_text((72, 72), text)
+    pdf_bytes = pdf.tobytes()
+    pdf.close()
+    document = docx.Document()
+    document.add_paragraph("REQ-003: Password reset")
+    docx_buffer = io.BytesIO()
+    document.save(docx_buffer)
+    docx_bytes = docx_buffer.getvalue()
+    
+    class Upload(io.BytesIO):
+        name = "spec.docx"
+    
+    with tempfile.TemporaryDirectory() as directory:
+        pdf_path = os.path.join(directory, "spec.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        expected = parse_file(pdf_path)
+        sources = [pdf_bytes, memoryview(pdf_bytes), io.BytesIO(pdf_bytes)]
+        pdf_ok = [parse_file(source) == expected for source in sources]
+        docx_ok = [parse_file(source).strip() == "REQ-003: Password reset"
+                   for source in (docx_bytes, Upload(docx_bytes), io.BufferedReader(io.BytesIO(docx_bytes)))]
+        
+        # The process pool needs a path: an in-memory PDF is spilled to a temporary file that is removed after
+        spill_pattern = os.path.join(tempfile.gettempdir(), TEMP_FILE_PREFIX + "*.pdf")
+        before = set(glob.glob(spill_pattern))
+        parallel = list(iter_pdf_pages(pdf_bytes, workers=2, min_pages=1))
+        spilled = set(glob.glob(spill_pattern)) - before
+        
+        saved = save_upload(Upload(docx_bytes), "spec.docx", directory)
+        with open(saved, "rb") as f:
+            saved_ok = f.read() == docx_bytes
+    
+    print(f"PDF sources: {pdf_ok}, DOCX sources: {docx_ok}, parallel from bytes: {len(parallel)} pages, "
+          f"temp files left: {len(spilled)}, upload saved: {saved_ok}")
+    return (all(pdf_ok) and all(docx_ok) and "\n".join(parallel) == expected and not spilled and saved_ok)
+
+def test_pdf_extraction():
+    """Test table rows, image-only page handling and the page cache of PDF extraction"""
+    print("\nTesting PDF extraction...")
+    
+    import tempfile
+    import fitz
+    from concurrent.futures.process import BrokenProcessPool
+    import core.parser as parser
+    from core.cache import ResultCache
+    
+    pdf = fitz.open()
+    pdf.new_page().insert_text((72, 72), "REQ-001: User can log in")
+    page = pdf.new_page()
+    page.insert_text((72, 60), "Table 1: Account requirements")
+    rows = [("ID", "Requirement", "Priority"), ("REQ-002", "User can log out", "High"),
+            ("REQ-003", "User can reset the password", "Medium")]
+    columns = [72, 172, 420, 520]
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            page.insert_text((columns[c] + 4, 116 + 24 * r), cell)
+    for r in range(len(rows) + 1):
+        page.draw_line((72, 100 + 24 * r), (520, 100 + 24 * r))
+    for x in columns:
+        page.draw_line((x, 100), (x, 100 + 24 * len(rows)))
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40))
+    pixmap.clear_with(200)
+    pdf.new_page().insert_image(fitz.Rect(72, 72, 272, 272), pixmap=pixmap)  # A "scanned" page
+    pdf_bytes = pdf.tobytes()
+    pdf.close()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory)
+        first_stats, second_stats = {}, {}
+        first = list(parser.iter_pdf_pages(pdf_bytes, workers=1, cache=cache, stats=first_stats))
+        second = list(parser.iter_pdf_pages(pdf_bytes, workers=1, cache=cache, stats=second_stats))
+        parallel = list(parser.iter_pdf_pages(pdf_bytes, workers=2, min_pages=1))
+        cache_files = len(os.listdir(directory))
+    plain = list(parser.iter_pdf_pages(pdf_bytes, workers=1, tables=False))
+    
+    # With Tesseract reported present but unable to run, the scanned page is still reported as unread
+    original = parser.ocr_available
+    parser.ocr_available = lambda: True
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            needs = [parser.needs_ocr(page) for page in doc]
+        os.environ.setdefault("TESSDATA_PREFIX", "/nonexistent")
+        failed_ocr_stats = {}
+        list(parser.iter_pdf_pages(pdf_bytes, workers=1, stats=failed_ocr_stats))
+        
+        # A pool that breaks when the scanned page is handed to it: the page is read here instead
+        class BrokenPool:
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *exc):
+                return False
+            
+            def submit(self, *args, **kwargs):
+                raise BrokenProcessPool("workers could not start")
+        
+        original_pool = parser._process_pool
+        original_get_text = fitz.Page.get_text
+        text_reads = []
+        
+        def counted_get_text(page, *args, **kwargs):
+            text_reads.append(page.number)
+            return original_get_text(page, *args, **kwargs)
+        
+        parser._process_pool = lambda workers: BrokenPool()
+        fitz.Page.get_text = counted_get_text
+        try:
+            broken_pool_stats = {}
+            broken_pool = list(parser.iter_pdf_pages(pdf_bytes, workers=2, tables=False, stats=broken_pool_stats))
+        finally:
+            parser._process_pool = original_pool
+            fitz.Page.get_text = original_get_text
+    finally:
+        parser.ocr_available = original
+        if os.environ.get("TESSDATA_PREFIX") == "/nonexistent":
+            del os.environ["TESSDATA_PREFIX"]
+    
+    print(first[1])
+    print(f"Stats: {first_stats} then {second_stats}, needs OCR: {needs}, failed OCR: {failed_ocr_stats}")
+    print(f"Broken pool: {broken_pool_stats}, text layer reads per page: {text_reads}")
+    table_lines = first[1].splitlines()
+    expected_image = "ocr" if parser.ocr_available() else "image"
+    return (table_lines == ["Table 1: Account requirements", "ID | Requirement | Priority",
+                            "REQ-002 | User can log out | High", "REQ-003 | User can reset the password | Medium"]
+            and first[0] == plain[0] and "REQ-002 | " not in plain[1]
+            and first_stats == {"text": 1, "table": 1, expected_image: 1}
+            and second == first and second_stats.get("cached") == (2 if expected_image == "ocr" else 1)
+            and cache_files == (2 if expected_image == "ocr" else 1)
+            and parallel == first and needs == [False, False, True]
+            and failed_ocr_stats.get("image") == 1
+            and broken_pool == plain and broken_pool_stats.get("image") == 1 and text_reads == [0, 1, 2])
+
 def test_csv_parser():
     """Test the CSV output parsing"""
     print("\nTesting CSV parser...")
@@ -59,14 +268,946 @@ User Logout|User can logout successfully"""
     
     return not df.empty and "Title" in df.columns
 
+def test_output_rows():
+    """Test the single-pass output parser on noisy output"""
+    print("\nTesting output rows...")
+    
+    from core.generator import parse_rows
+    
+    output = """Here you go:
+Title|Description
+ID: Title: Title Description: Description
+"Login | logout"|User can log in and out
+-|-
+N/A|Not applicable
+Reset password| "Email contains a link"
+
+Note: generated automatically | review before use"""
+    
+    rows = parse_rows(output)
+    print(f"Rows: {rows}")
+    
+    return rows == [("Login | logout", "User can log in and out"), ("Reset password", "Email contains a link")]
+
+def test_llm_backend():
+    """Test backend selection and Ollama request payloads"""
+    print("\nTesting LLM backend...")
+    
+    from core.llm_backend import get_backend, OllamaHTTPBackend
+    
+    generate_payload = OllamaHTTPBackend(api="generate")._payload("Hello", "llama3", {"temperature": 0})
+    chat_payload = OllamaHTTPBackend(api="chat")._payload("Hello", "llama3", None)
+    print(f"Generate payload keys: {sorted(generate_payload)}")
+    print(f"Chat payload keys: {sorted(chat_payload)}")
+    
+    return (generate_payload["prompt"] == "Hello"
+            and generate_payload["options"]["temperature"] == 0
+            and chat_payload["messages"][0]["content"] == "Hello"
+            and get_backend("http") is get_backend("http"))
+
+def test_mock_server():
+    """Test the HTTP backend and pipeline against the local mock Ollama server"""
+    print("\nTesting mock Ollama server...")
+    
+    from mock_ollama import start_mock_server
+    from core.llm_backend import OllamaHTTPBackend
+    
+    server = start_mock_server(cases_per_requirement=2)
+    try:
+        backend = OllamaHTTPBackend(host=server.url)
+        prompt = "Now extract test cases\nREQ-001: Login\nREQ-002: Logout"
+        result = backend.generate(prompt, "llama3", None, 10)
+        stats = {}
+        streamed = "".join(backend.stream(prompt, "llama3", None, 10, stats=stats))
+        backend.close()
+    finally:
+        server.shutdown()
+    
+    print(f"Rows: {len(result.text.splitlines()) - 1}, requests: {server.requests}, stats: {sorted(stats)}")
+    
+    return result.text == streamed and len(result.text.splitlines()) == 5 and stats.get("eval_count", 0) > 0
+
+def test_pipeline_order():
+    """Test that concurrent chunk processing keeps document order"""
+    print("\nTesting concurrent pipeline...")
+    
+    import time
+    import core.pipeline as pipeline
+    from core.llm_backend import LLMResult
+    
+    def fake_generate(prompt, model=None, timeout=None, system=None):
+        # Later chunks finish first so results complete out of order
+        number = int(prompt.strip().rsplit(" ", 1)[-1])
+        time.sleep(0.05 * (4 - number))
+        return LLMResult(f"Title|Description\nCase {number}|Chunk {number} works")
+    
+    original = pipeline.generate
+    pipeline.generate = fake_generate
+    try:
+        completion_order = []
+        results = pipeline.process_chunks(
+            [f"Requirement {n}" for n in range(4)], max_workers=4,
+            on_result=lambda i, df, completed, total: completion_order.append(i))
+    finally:
+        pipeline.generate = original
+    
+    titles = [df["Title"][0] for df in results]
+    print(f"Completion order: {completion_order}")
+    print(f"Result order: {titles}")
+    
+    return titles == [f"Case {n}" for n in range(4)] and completion_order != sorted(completion_order)
+
+def test_result_store():
+    """Test in-order ID assignment and materialization of the result store"""
+    print("\nTesting result store...")
+    
+    from core.results import ResultStore
+    
+    store = ResultStore()
+    store.add_chunk(2, [("Export", "Reports export as CSV")], pages=(3, 4))
+    store.add_chunk(0, [("Login", "User can log in"), ("", "No title")], pages=(1, 1))
+    held_back = store.pending_chunks
+    store.add_chunk(1, [("Logout", "User can log out")], pages=(1, 2))
+    
+    df = store.to_dataframe(sources=True)
+    print(df.to_string(index=False))
+    
+    return (held_back == 1 and store.pending_chunks == 0 and store.dropped == 1
+            and list(df["ID"]) == ["TC-001", "TC-002", "TC-003"]
+            and list(df["Title"]) == ["Login", "Logout", "Export"]
+            and list(df["Page End"]) == [1, 2, 4]
+            and list(store.to_dataframe().columns) == ["ID", "Title", "Description"])
+
+def test_traceability():
+    """Test source spans of chunks, requirement coverage gaps and trace links of merged duplicates"""
+    print("\nTesting traceability...")
+    
+    import fitz
+    import core.pipeline as pipeline
+    from core.chunker import iter_chunks, iter_lines
+    from core.dedup import Deduplicator
+    from core.llm_backend import LLMResult
+    from core.parser import parse_file, iter_blocks, clean_blocks
+    from core.results import ResultStore
+    from core.chunker import SourceText
+    from core.trace import SourceMap, TraceIndex, find_req_ids
+    
+    pdf = fitz.open()
+    pages = [["Project overview", "REQ-001: User can log in with a password"],
+             ["REQ-002: User can log out", "REQ-003: Session expires after 30 minutes"],
+             ["REQ-004: Admin can export audit logs"]]
+    for lines in pages:
+        page = pdf.new_page()
+        for n, line in enumerate(lines):
+            page.insert_text((72, 72 + 20 * n), line)
+    pdf_bytes = pdf.tobytes()
+    pdf.close()
+    text = parse_file(pdf_bytes)
+    
+    def located(index=None):
+        source_map = SourceMap(pages=True, index=index)
+        return source_map.locate(clean_blocks(source_map.record(iter_blocks(pdf_bytes))))
+    
+    # Tracing must not change the chunks, and every line must point back at itself in the extracted text
+    same_chunks = all(list(iter_chunks(located(), mode)) == list(iter_chunks(clean_blocks(iter_blocks(pdf_bytes)), mode))
+                      for mode in ("tokens", "chars"))
+    lines_ok = all(text[line.span["start"]:line.span["end"]] == line for line in iter_lines(located()))
+    requirements = TraceIndex()
+    chunks = list(iter_chunks(located(requirements)))
+    first_pages = {req_id: place["page"] for req_id, place in requirements.requirements.items()}
+    offsets_ok = all(text[place["start"]:].startswith(req_id) for req_id, place in requirements.requirements.items())
+    
+    def fake_generate(prompt, **kwargs):
+        # A test case per requirement, except REQ-004
+        rows = [f"Verify {req_id}|{req_id} works" for req_id in find_req_ids(prompt) if req_id != "REQ-004"]
+        return LLMResult("Title|Description\n" + "\n".join(rows))
+    
+    original = pipeline.generate
+    pipeline.generate = fake_generate
+    try:
+        trace = TraceIndex()
+        result_df, _ = pipeline.process_document(pdf_bytes, prefilter=False, trace=trace)
+    finally:
+        pipeline.generate = original
+    coverage = trace.coverage()
+    source = trace.source("TC-001")
+    
+    # A duplicate merged from another chunk links its requirement to the test case it was merged into
+    store = ResultStore(dedup=Deduplicator(method="exact"), trace=TraceIndex())
+    span = {"page_start": 1, "page_end": 1, "start": 0, "end": 20}
+    store.add_chunk(0, [("Login works", "User can log in")], source=SourceText("REQ-010: Login", span))
+    store.add_chunk(1, [("Login works", "User can log in")], source=SourceText("REQ-011: Login again", span))
+    restored = TraceIndex.from_dict(store.trace.to_dict())
+    df = store.to_dataframe(sources=True)
+    
+    print(f"Chunks: {len(chunks)} (unchanged by tracing: {same_chunks}), lines map back: {lines_ok}, "
+          f"requirement pages: {first_pages}")
+    print(f"Coverage: {coverage['covered']}/{coverage['requirements']}, gaps: {coverage['gaps']}, "
+          f"TC-001 source: {source}")
+    print(f"Merged duplicate links: {restored.tests_for('REQ-011')}, columns: {list(df.columns)}")
+    
+    # Only uppercase prefixes are IDs; "contact us 24 hours" is prose, not requirement US-24
+    prose_ids = find_req_ids("Contact us 24 hours a day. Call us 1 800 555. The fr 2 draft. sr 3")
+    spelled_ids = find_req_ids("REQ-001, FR 12 and NFR_3")
+    print(f"IDs in prose: {prose_ids}, spelled variants: {spelled_ids}")
+    return (same_chunks and lines_ok and offsets_ok and chunks[0].span["page_start"] == 1
+            and first_pages == {"REQ-001": 1, "REQ-002": 2, "REQ-003": 2, "REQ-004": 3}
+            and len(result_df) == 3 and coverage["gaps"] == ["REQ-004"] and coverage["covered"] == 3
+            and trace.tests_for("req 002") == ["TC-002"] and source["requirements"] == ["REQ-001"]
+            and source["page_start"] == 1 and restored.tests_for("REQ-011") == ["TC-001"]
+            and list(df["Requirements"]) == ["REQ-010, REQ-011"]
+            and prose_ids == [] and spelled_ids == ["REQ-001", "FR-12", "NFR-3"])
+
+def test_dedup():
+    """Test exact, MinHash and embedding de-duplication in the result store"""
+    print("\nTesting de-duplication...")
+    
+    from mock_ollama import start_mock_server
+    from core.dedup import Deduplicator
+    from core.llm_backend import OllamaHTTPBackend
+    from core.results import ResultStore
+    
+    rows = [("Login works", "User can log in with valid credentials"),
+            ("Export report", "Report is downloaded as CSV")]
+    repeats = [("login works.", "User can log in with valid credentials"),
+               ("Login works", "The user can log in with valid credentials"),
+               ("Delete account", "Account and data are removed")]
+    
+    store = ResultStore(dedup=Deduplicator(method="minhash"))
+    store.add_chunk(0, rows)
+    store.add_chunk(1, repeats)
+    df = store.to_dataframe(sources=True)
+    print(df[["ID", "Title", "Duplicates Merged"]].to_string(index=False))
+    
+    server = start_mock_server()
+    try:
+        embedded = Deduplicator(method="embeddings", backend=OllamaHTTPBackend(host=server.url))
+        embedded_matches = embedded.add_batch([f"{t} {d}" for t, d in rows + repeats])
+    finally:
+        server.shutdown()
+    fallback = Deduplicator(method="embeddings", backend=OllamaHTTPBackend(host="http://127.0.0.1:9"))
+    fallback_matches = fallback.add_batch([f"{t} {d}" for t, d in rows + repeats])
+    boundaries = Deduplicator(method="minhash").add_batch(["Password with 8 characters is accepted",
+                                                           "Password with 64 characters is accepted"])
+    tuned = Deduplicator(method="embeddings", threshold=0.5, backend=OllamaHTTPBackend(host="http://127.0.0.1:9"))
+    tuned.add_batch(["Login works"])
+    print(f"Embedding matches: {embedded_matches}, fallback matches: {fallback_matches} ({fallback.method}), "
+          f"tuned fallback threshold: {tuned._index.threshold}")
+    
+    return (boundaries == [None, None]
+            and list(df["Title"]) == ["Login works", "Export report", "Delete account"]
+            and list(df["Duplicates Merged"]) == [2, 0, 0] and store.merged == 2
+            and embedded_matches == [None, None, 0, 0, None]
+            and fallback.method == "minhash" and fallback_matches == [None, None, 0, 0, None]
+            and tuned.method == "minhash" and tuned._index.threshold == 0.5)
+
+def test_document_versions():
+    """Test that a revised document only sends changed sections to the LLM"""
+    print("\nTesting document versions...")
+    
+    import tempfile
+    from mock_ollama import start_mock_server
+    from bench_corpus import synthetic_requirements, write_docx
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    import core.pipeline as pipeline
+    from core.pipeline import process_document_delta
+    from core.versions import DocumentStore
+    from core.results import ResultStore
+    
+    lines = synthetic_requirements(300).split("\n")
+    server = start_mock_server()
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    original_iter_blocks = pipeline.iter_blocks
+    blocks_read = []
+    read_at_first_result = []
+    
+    class RowSink:
+        def __init__(self):
+            self.rows = []
+        
+        def write_rows(self, rows):
+            self.rows.extend(rows)
+    
+    def counted_blocks(*args, **kwargs):
+        for block in original_iter_blocks(*args, **kwargs):
+            blocks_read.append(block)
+            yield block
+    
+    def on_result(index, df, completed, total):
+        if not read_at_first_result:
+            read_at_first_result.append(len(blocks_read))
+    
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "spec.docx")
+            store = DocumentStore(os.path.join(directory, "versions"))
+            write_docx(path, "\n".join(lines))
+            # The first version is streamed: results arrive before the whole document is read
+            pipeline.iter_blocks = counted_blocks
+            try:
+                first_df, first = process_document_delta(path, store, max_workers=1, on_result=on_result)
+            finally:
+                pipeline.iter_blocks = original_iter_blocks
+            
+            removed = next(i for i, line in enumerate(lines) if line.startswith("REQ-200"))
+            revised = [line for i, line in enumerate(lines) if i != removed]
+            revised.append("REQ-999: The auditor shall export audit logs.")
+            write_docx(path, "\n".join(revised))
+            # Rows of a new version stream to the store's sink as groups complete, not after the run
+            sink = RowSink()
+            sunk_at_first_result = []
+            second_df, second = process_document_delta(
+                path, store, store=ResultStore(sink=sink),
+                on_result=lambda *args: sunk_at_first_result.append(len(sink.rows)))
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    print(f"Version {second['version']}: diff {({k: v for k, v in second['diff'].items() if k != 'unchanged'})}, "
+          f"{second['llm_chunks']}/{first['llm_chunks']} chunks sent, {second['reused_test_cases']} reused, "
+          f"{len(second['removed_test_cases'])} flagged")
+    print(f"First version: {read_at_first_result[0]}/{len(blocks_read)} blocks read at the first result")
+    print(f"Second version: {sunk_at_first_result[0]}/{len(sink.rows)} rows streamed at the first LLM result")
+    
+    return (first["version"] == 1 and read_at_first_result[0] < len(blocks_read)
+            and second["version"] == 2 and "REQ-999" in second["diff"]["added"]
+            and second["diff"]["removed"] == ["REQ-200"]
+            and 0 < second["llm_chunks"] < first["llm_chunks"] and second["reused_test_cases"] > 0
+            and [row[0] for row in second["removed_test_cases"]] == ["Verify REQ-200 scenario 1"]
+            and len(second_df) == len(first_df)
+            and 0 < sunk_at_first_result[0] < len(sink.rows) == len(second_df))
+
+def test_prefilter():
+    """Test that chunks without testable content are skipped or batched"""
+    print("\nTesting pre-filter...")
+    
+    from core.prefilter import filter_chunks, new_prefilter_stats, calls_avoided, classify_chunk
+    
+    chunks = [
+        "Table of Contents\n1. Introduction ........ 3\n2. Requirements ........ 5",
+        "REQ-001: The user shall be able to log in with email and password.",
+        "Revision History\nVersion 1.0 2024-01-10 Initial draft\nVersion 1.1 2024-02-02 Review comments",
+        "Reports are generated nightly.\nThe dashboard will show the latest report for each team.\n"
+        "Totals and charts are included.\nEach team has its own page.\nHistory goes back one year.",
+        "Glossary\nSSO: Single sign-on\nMFA: Multi-factor authentication",
+        "Exports are produced in the background.\nEach export can be downloaded once it is finished.\n"
+        "Older exports are listed under the history tab.\nThe list shows their size.\nIt is sorted by date.",
+    ]
+    stats = new_prefilter_stats()
+    sent = list(filter_chunks(chunks, stats))
+    print(f"Stats: {stats}, {len(sent)} calls ({calls_avoided(stats)} avoided)")
+    
+    # A batch is sent before the kept chunk that follows it, so the document order (and TC numbering) holds
+    ordered = list(filter_chunks([chunks[3], chunks[1], chunks[5]]))
+    # Tagged chunks come out with the tags of every chunk they hold
+    tags = [tags for tags, _ in filter_chunks(enumerate(chunks), tagged=True)]
+        # "us 24" in prose is not a requirement ID, so it does not make a chunk worth keeping
+    prose = classify_chunk("Please contact us 24 hours before", model=None)
+    print(f"Order: {[chunks.index(c) if c in chunks else c for c in ordered]}, prose: {prose}")
+    
+    return (stats["skipped"] == 3 and stats["kept"] == 1 and stats["batched"] == 2 and stats["batches"] == 1
+            and sent[0] == chunks[1] and chunks[3] in sent[1] and chunks[5] in sent[1]
+            and calls_avoided(stats) == 4 and ordered == [chunks[3], chunks[1], chunks[5]] and prose == "skip"
+            and tags == [[1], [3, 5]])
+
+def test_job_queue():
+    """Test that queued jobs are claimed fairly, run, cancelled and recovered from dead workers"""
+    print("\nTesting job queue...")
+    
+    import subprocess
+    import tempfile
+    from mock_ollama import start_mock_server
+    from bench_corpus import synthetic_requirements, write_docx
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    from core.jobs import JobQueue, run_job, run_next, save_upload, export_job, job_export_path
+    from core.export import read_export
+    
+    server = start_mock_server()
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            job_queue = JobQueue(os.path.join(directory, "jobs.db"))
+            path = os.path.join(directory, "spec.docx")
+            write_docx(path, synthetic_requirements(40))
+            with open(path, "rb") as f:
+                data = f.read()
+            upload_dir = os.path.join(directory, "uploads")
+            export_dir = os.path.join(directory, "exports")
+            first, second, other, cancelled = [
+                job_queue.submit(save_upload(data, "spec.docx", upload_dir), "spec.docx", owner)
+                for owner in ("alice", "alice", "bob", "bob")]
+            
+            # alice already has a job running, so bob's job is claimed before her second one
+            claimed = [job_queue.claim()["id"]]
+            job_queue.cancel(cancelled)
+            other_job = job_queue.claim()
+            claimed.append(other_job["id"])
+            run_job(job_queue, other_job, export_dir=export_dir)
+            
+            # The worker that claimed `first` died; the job goes back to the queue
+            dead = subprocess.Popen([sys.executable, "-c", "pass"])
+            dead.wait()
+            with job_queue._connect() as conn:
+                conn.execute("UPDATE jobs SET worker_pid = ? WHERE id = ?", (dead.pid, first))
+            requeued = job_queue.requeue_orphans()
+            
+            while run_next(job_queue, export_dir=export_dir) is not None:
+                pass
+            job = job_queue.get(first)
+            rows = job_queue.rows(first, final=True)
+            live_rows = job_queue.rows(first)
+            statuses = [job_queue.get(job_id)["status"] for job_id in (first, second, other, cancelled)]
+            print(f"Claimed: {['first', 'other'] if claimed == [first, other] else claimed}, requeued: {requeued}, "
+                  f"statuses: {statuses}, {len(rows)} rows, attempts: {job['attempts']}")
+            leftover = os.listdir(upload_dir)
+            
+            # The download file was written while the job ran; export_job hands it out as is
+            exports = sorted(os.listdir(export_dir))
+            written = os.path.getmtime(job_export_path(first, directory=export_dir))
+            export_path = export_job(job_queue, first, directory=export_dir)
+            exported = [tuple(row) for row in read_export(export_path)[1]]
+            reused_export = os.path.getmtime(export_path) == written
+            print(f"Exports: {len(exports)} files, {len(exported)} rows in the first job's")
+            
+            # Version history is kept per owner: bob's "spec.docx" is not diffed against alice's
+            from core.versions import DocumentStore
+            doc_store = DocumentStore(os.path.join(directory, "versions"))
+            other_path = os.path.join(directory, "other.docx")
+            write_docx(other_path, synthetic_requirements(10))
+            with open(other_path, "rb") as f:
+                other_data = f.read()
+            deltas = []
+            delta_sections = []
+            for owner, upload in (("alice", data), ("bob", other_data), ("alice", data)):
+                job_id = job_queue.submit(save_upload(upload, "spec.docx", upload_dir), "spec.docx", owner)
+                run_job(job_queue, job_queue.claim(), doc_store=doc_store, export_dir=export_dir)
+                deltas.append(job_queue.get(job_id)["summary"]["delta"])
+                delta_sections.append(job_queue.get(job_id)["summary"]["sections"])
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    print(f"Versions per upload: {[d['version'] for d in deltas]}, reused: {[d['reused_test_cases'] for d in deltas]}")
+    # Both paths count requirement sections, not chunks
+    print(f"Sections: {job['summary']['sections']} (full run), {delta_sections} (delta runs)")
+    return ([d["version"] for d in deltas] == [1, 1, 2] and deltas[1]["diff"] is None
+            and deltas[1]["reused_test_cases"] == 0 and not deltas[2]["diff"]["removed"]
+            and deltas[2]["reused_test_cases"] > 0
+            and claimed == [first, other] and requeued == 1 and statuses == ["done", "done", "done", "cancelled"]
+            and job["attempts"] == 2 and len(rows) == 40 and rows[0][0] == "TC-001"
+            and job["summary"]["sections"] == delta_sections[0] == delta_sections[2] > 0
+            and live_rows == [] and leftover == []
+            and len(exports) == 3 and cancelled not in "".join(exports) and exported == rows and reused_export)
+
+def test_scheduler():
+    """Test adaptive concurrency, retries and that one failing chunk does not sink the run"""
+    print("\nTesting scheduler...")
+    
+    from mock_ollama import start_mock_server
+    from core.llm_backend import LLMRequestError, OllamaHTTPBackend, get_backend, set_backend
+    from core.scheduler import AdaptiveLimiter, call_with_retries, chunk_deadline
+    from core.pipeline import process_chunks
+    
+    limiter = AdaptiveLimiter(initial=2, maximum=4)
+    for _ in range(6):
+        limiter.record(1.0, 1000)
+    grown = limiter.current
+    limiter.record(1.0, 1000, ok=False)
+    limiter.record(1.0, 1000, ok=False)  # Same round trip: no second cut
+    shrunk = limiter.current
+    
+    calls = []
+    def flaky(attempt):
+        calls.append(attempt)
+        if attempt < 2:
+            raise LLMRequestError("server busy", retryable=True)
+        return "ok"
+    retried = call_with_retries(flaky, retries=2, sleep=lambda delay: None)
+    try:
+        call_with_retries(lambda attempt: calls.append("fatal") or 1 / 0, sleep=lambda delay: None)
+    except ZeroDivisionError:
+        pass
+    
+    server = start_mock_server(max_parallel=3, latency=0.05, fail_marker="REQ-007")
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        chunks = [f"REQ-{i:03d}: The user shall be able to export report {i}." for i in range(1, 11)]
+        failures = {}
+        dfs = process_chunks(chunks, max_workers=6, failures=failures)
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    # Rows a chunk streams after it was abandoned at its deadline do not reach on_row
+    import time
+    import core.pipeline as pipeline
+    
+    def slow_stream(prompt, **kwargs):
+        yield "Title|Description\n"
+        time.sleep(0.8 if "REQ-SLOW" in prompt else 1.2)
+        yield "Late row|Streamed after the deadline\n" if "REQ-SLOW" in prompt else "On time|Within the deadline\n"
+    
+    original_stream, original_deadline = pipeline.stream_llm, pipeline.chunk_deadline
+    pipeline.stream_llm = slow_stream
+    pipeline.chunk_deadline = lambda chunk, timeout: 0.3 if "REQ-SLOW" in chunk else 5
+    streamed = []
+    abandoned_failures = {}
+    try:
+        pipeline.process_chunks(["REQ-SLOW: Export works", "REQ-002: Import works"], max_workers=2, batch=False,
+                                on_row=lambda index, row: streamed.append((index, row[0])),
+                                failures=abandoned_failures)
+    finally:
+        pipeline.stream_llm, pipeline.chunk_deadline = original_stream, original_deadline
+    
+    print(f"Limit 2 -> {grown} -> {shrunk}, attempts {calls}, {server.rejected} requests rejected as busy, "
+          f"failures {failures}, rows per chunk {[len(df) for df in dfs]}")
+    print(f"Rows streamed with an abandoned chunk: {streamed}, failures: {abandoned_failures}")
+    
+    return (list(abandoned_failures) == [0] and streamed == [(1, "On time")]
+            and grown == 4 and shrunk == 2 and retried == "ok" and calls == [0, 1, 2, "fatal"]
+            and list(failures) == [6] and all(len(df) == 1 for i, df in enumerate(dfs) if i != 6)
+            and dfs[6].empty and chunk_deadline("x" * 40000) > chunk_deadline("x" * 400))
+
+def test_cold_start():
+    """Test lazy imports, the cached launcher check and the model warm-up request"""
+    print("\nTesting cold start...")
+    
+    import subprocess
+    import tempfile
+    import launch
+    from mock_ollama import start_mock_server
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    from core.jobs import start_warm_up
+    
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, core.jobs, core.prefilter, core.parser, core.export; "
+                               "print(','.join(m for m in ('pandas', 'fitz', 'docx', 'requests') if m in sys.modules))"],
+        capture_output=True, text=True, cwd=root).stdout.strip()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, "launch.json")
+        before = launch.dependencies_cached(cache_path)
+        launch.cache_dependencies(cache_path)
+        after = launch.dependencies_cached(cache_path)
+    
+    # The warm-up loads the model from a background thread; the first chunk then finds it resident
+    server = start_mock_server(load_seconds=0.3)
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        start_warm_up("llama3", backend="http").join(10)
+        result = get_backend("http").generate("REQ-001: Login", model="llama3")
+        load_after_warm_up = result.stats.get("load_duration")
+        requests_counted = server.requests
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    print(f"Heavy modules loaded by app imports: {loaded or 'none'}, launch cache: {before} -> {after}, "
+          f"warm-ups: {server.warm_ups}, load after warm-up: {load_after_warm_up}")
+    return (loaded == "" and not before and after and server.warm_ups == 1
+            and load_after_warm_up == 0 and requests_counted == 1)
+
+def test_backend_pool():
+    """Test routing across several servers, failover from a dead one and model-aware selection"""
+    print("\nTesting backend pool...")
+    
+    import socket
+    import core.generator
+    from mock_ollama import start_mock_server
+    from core.llm_backend import BackendPool, get_backend, set_backend
+    from core.pipeline import process_chunks
+    
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead_url = f"http://127.0.0.1:{s.getsockname()[1]}"  # Closed again before use
+    
+    first = start_mock_server(latency=0.05)
+    second = start_mock_server(latency=0.05)
+    other_model = start_mock_server(model="mistral")
+    pool = BackendPool([
+        {"host": dead_url},
+        {"host": first.url, "max_parallel": 2},
+        {"host": second.url, "max_parallel": 2},
+        {"host": other_model.url, "max_parallel": 4},
+    ])
+    original = get_backend("pool")
+    set_backend("pool", pool)
+    core.generator.LLM_BACKEND = "pool"
+    try:
+        chunks = [f"REQ-{i:03d}: The user shall be able to export report {i}." for i in range(1, 13)]
+        failures = {}
+        dfs = process_chunks(chunks, max_workers=4, failures=failures)
+        # The next request goes to the less used server; make it fail so the request moves on
+        used = {e["host"]: e["requests"] for e in pool.status()}
+        broken, working = sorted((first, second), key=lambda server: used[server.url])
+        broken.fail_rate = 1.0
+        result = pool.generate("REQ-100: The system shall log out idle users.")
+    finally:
+        core.generator.LLM_BACKEND = "http"
+        set_backend("pool", original)
+        for server in (first, second, other_model):
+            server.shutdown()
+    
+    status = {e["host"]: e for e in pool.status()}
+    print(f"Requests per server: {[(e['host'], e['requests'], e['healthy']) for e in status.values()]}, "
+          f"failures {failures}")
+    
+    return (not failures and all(len(df) == 1 for df in dfs)
+            and not status[dead_url]["healthy"] and status[other_model.url]["requests"] == 0
+            and first.requests > 0 and second.requests > 0
+            and result.stats["host"] == working.url and status[broken.url]["failures"] == 1
+            and status[broken.url]["healthy"])
+
+def test_prompt_prefix():
+    """Test the system prompt layout, prompt versions and the prompt cache savings in the run metrics"""
+    print("\nTesting prompt prefix reuse...")
+    
+    from mock_ollama import start_mock_server
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    from core.prompt import INSTRUCTIONS, build_prompt, get_prompt, prompt_version
+    from core.cache import make_cache_key
+    from core.metrics import RunMetrics
+    from core.pipeline import process_chunks
+    
+    system, prompt = build_prompt("REQ-001: Login")
+    inline_system, inline_prompt = build_prompt("REQ-001: Login", layout="inline")
+    layouts_ok = (system == INSTRUCTIONS and INSTRUCTIONS not in prompt and inline_system is None
+                  and inline_prompt == get_prompt("REQ-001: Login") and INSTRUCTIONS in inline_prompt)
+    versions_ok = (prompt_version("system") != prompt_version("inline")
+                   and make_cache_key("x", "llama3", prompt_version=prompt_version("system"))
+                   != make_cache_key("x", "llama3", prompt_version=prompt_version("inline")))
+    
+    server = start_mock_server()
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        metrics = RunMetrics("prefix")
+        chunks = [f"REQ-{i:03d}: The user shall be able to export report {i}." for i in range(1, 7)]
+        dfs = process_chunks(chunks, max_workers=1, metrics=metrics)
+        streamed = RunMetrics("prefix-stream")
+        process_chunks(chunks[:3], max_workers=1, metrics=streamed, on_row=lambda i, row: None)
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    totals = metrics.totals()
+    records = sorted(metrics.chunks, key=lambda c: c["index"])
+    print(f"Cached prompt tokens per chunk: {[c.get('prompt_cached_tokens') for c in records]}, "
+          f"saved {totals['prompt_eval_saved_seconds']}s ({totals['prompt_eval_saved_per_chunk']}s per chunk)")
+    
+    return (layouts_ok and versions_ok and all(len(df) == 1 for df in dfs)
+            and server.last_prompt.startswith(INSTRUCTIONS)
+            and records[0]["prompt_cached_tokens"] < 5  # Nothing cached yet, up to token estimate rounding
+            and all(c["prompt_cached_tokens"] >= c["prefix_tokens"] * 0.9 for c in records[1:])
+            and totals["prompt_eval_saved_seconds"] > 0
+            and streamed.totals()["prompt_cached_tokens"] > 0)
+
+def test_chunk_batching():
+    """Test packing small chunks into one JSON request, splitting the answer per chunk and the fallback"""
+    print("\nTesting chunk batching...")
+    
+    from mock_ollama import start_mock_server
+    from core.llm_backend import OllamaHTTPBackend, get_backend, set_backend
+    from core.batching import BatchFormatError, pack_batches, parse_batch_output
+    from core.metrics import RunMetrics
+    from core.pipeline import process_chunks
+    
+    sizes = [len(b) for b in pack_batches(enumerate(["short"] * 5 + ["x" * 4000, "short"]), max_chunks=3,
+                                          max_tokens=600)]
+    sections = parse_batch_output('{"test_cases": [{"section": 2, "title": "A", "description": "B"},'
+                                  ' {"section": 1, "title": "-", "description": "-"}]}', 2)
+    rejected = 0
+    for bad in ['{"test_cases": [{"section": 3, "title": "A", "description": "B"}]}', '{"test_cases": [', '[]']:
+        try:
+            parse_batch_output(bad, 2)
+        except BatchFormatError:
+            rejected += 1
+    
+    server = start_mock_server(latency=0.05, malformed_marker="REQ-009")
+    original = get_backend("http")
+    set_backend("http", OllamaHTTPBackend(host=server.url))
+    try:
+        chunks = [f"REQ-{i:03d}: The user shall be able to export report {i}." for i in range(1, 11)]
+        batched = RunMetrics("batched")
+        streamed = []
+        dfs = process_chunks(chunks, max_workers=2, metrics=batched, batch=True,
+                             on_row=lambda i, row: streamed.append(i))
+        batched.finish()
+        requests = server.requests
+        unbatched = RunMetrics("unbatched")
+        process_chunks(chunks, max_workers=2, metrics=unbatched, batch=False)
+        unbatched.finish()
+    finally:
+        set_backend("http", original)
+        server.shutdown()
+    
+    totals = batched.to_dict()["totals"]
+    baseline = unbatched.to_dict()["totals"]
+    print(f"Batch sizes {sizes}, requests {requests}, LLM calls {totals['llm_calls']} vs {baseline['llm_calls']}, "
+          f"test cases/s {totals['test_cases_per_second']} vs {baseline['test_cases_per_second']}, "
+          f"counters {batched.counters}")
+    
+    return (sizes == [3, 2, 1, 1] and sections == [[], [("A", "B")]] and rejected == 3
+            and [len(df) for df in dfs] == [1] * 10
+            and all(f"REQ-{i + 1:03d}" in df["Title"].iloc[0] for i, df in enumerate(dfs))
+            and sorted(streamed) == list(range(10))
+            and requests == 4 and totals["llm_calls"] == 4 and baseline["llm_calls"] == 10
+            and totals["batched_chunks"] == 8 and batched.counters.get("batch_fallbacks") == 1
+            and totals["test_cases"] == baseline["test_cases"] == 10)
+
+def test_export():
+    """Test streaming CSV/Parquet/XLSX export, compression, round trips and flat memory"""
+    print("\nTesting export...")
+    
+    import importlib.util
+    import tempfile
+    import tracemalloc
+    from core.export import open_export, read_export, export_extension, export_rows
+    from core.results import ResultStore
+    from core.jobs import JobQueue, export_job
+    from utils.file_utils import save_to_csv
+    
+    rows = [(f"TC-{i:03d}", f"Title {i} | with separator", f"Line one\nline \"two\" of {i}") for i in range(1, 2501)]
+    formats = [("csv", None), ("csv", "gzip"), ("csv", "xz"), ("parquet", "zstd")]
+    if importlib.util.find_spec("openpyxl"):
+        formats.append(("xlsx", None))
+    
+    with tempfile.TemporaryDirectory() as directory:
+        round_trips = {}
+        for export_format, compression in formats:
+            path = os.path.join(directory, "out" + export_extension(export_format, compression))
+            with open_export(path, export_format, compression) as writer:
+                for start in range(0, len(rows), 1000):
+                    writer.write_rows(rows[start:start + 1000])
+            columns, read_rows = read_export(path)
+            round_trips[path[len(directory) + 1:]] = list(columns) == ["ID", "Title", "Description"] and [
+                tuple(r) for r in read_rows] == rows
+        
+        aborted_path = os.path.join(directory, "aborted.csv")
+        try:
+            with open_export(aborted_path) as writer:
+                writer.write_rows(rows[:10])
+                raise RuntimeError("stop")
+        except RuntimeError:
+            pass
+        aborted_clean = not os.listdir(directory) or not any(n.startswith("aborted") for n in os.listdir(directory))
+        
+        # Two exports of one path at once (e.g. a rerun while a job still writes) keep separate temporary files
+        shared_path = os.path.join(directory, "shared.csv")
+        first_writer, second_writer = open_export(shared_path), open_export(shared_path)
+        first_writer.write_rows(rows[:3])
+        second_writer.write_rows(rows[:5])
+        first_writer.close()
+        first_count = len(list(read_export(shared_path)[1]))
+        second_writer.close()
+        shared_counts = [first_count, len(list(read_export(shared_path)[1]))]
+        shared_files = [n for n in os.listdir(directory) if n.startswith("shared")]
+        
+        # Chunks arrive out of order; the file still gets them in document order with IDs
+        sink_path = os.path.join(directory, "sink.csv")
+        with open_export(sink_path) as writer:
+            store = ResultStore(sink=writer, keep_rows=False)
+            store.add_chunk(1, [("B", "second")])
+            store.add_chunk(0, [("A", "first"), ("", "dropped")])
+        sink_rows = list(read_export(sink_path)[1])
+        
+        def stream(count):
+            with open_export(os.path.join(directory, "big.csv.gz")) as writer:
+                writer.write_rows((f"TC-{i}", f"Title {i}", "Description " * 10) for i in range(count))
+        tracemalloc.start()
+        stream(20000)
+        small_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        stream(200000)
+        large_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        queue = JobQueue(os.path.join(directory, "jobs.db"))
+        job_id = queue.submit(sink_path, "spec.pdf", "alice")
+        queue.add_rows(job_id, rows, final=True)
+        job_export = export_job(queue, job_id, "csv", "bz2", directory=os.path.join(directory, "exports"))
+        job_rows = [tuple(r) for r in read_export(job_export)[1]]
+        
+        # save_to_csv keeps its DataFrame / dict-of-lists behavior; streaming goes through export_rows
+        frame_path = os.path.join(directory, "frame.csv")
+        save_to_csv(pd.DataFrame({"Title": ["Login"], "Description": ["User can log in"]}), frame_path)
+        with open(frame_path, "r", encoding="utf-8") as f:
+            frame_lines = f.read().splitlines()
+        streamed_path = os.path.join(directory, "streamed.csv.gz")
+        streamed_count = export_rows(({"ID": r[0], "Title": r[1], "Description": r[2]} for r in rows), streamed_path)
+        streamed_rows = [tuple(r) for r in read_export(streamed_path)[1]]
+    
+    print(f"Round trips: {round_trips}, sink rows {sink_rows}, "
+          f"peak memory {small_peak // 1024} KB for 20k rows, {large_peak // 1024} KB for 200k rows")
+    
+    return (all(round_trips.values()) and aborted_clean and shared_counts == [3, 5] and shared_files == ["shared.csv"]
+            and sink_rows == [("TC-001", "A", "first"), ("TC-002", "B", "second")]
+            and len(store) == 2 and not store.ids
+            and large_peak < small_peak * 2 and job_rows == rows
+            and frame_lines == ["Title,Description", "Login,User can log in"]
+            and streamed_count == len(rows) and streamed_rows == rows)
+
+def test_result_cache():
+    """Test cache hits, misses, expiry and eviction"""
+    print("\nTesting result cache...")
+    
+    import tempfile
+    import time
+    from core.cache import ResultCache, make_cache_key
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory, max_bytes=10 ** 6, max_age=3600)
+        key = make_cache_key("Requirement 1: User login", "llama3")
+        missed = cache.get(key) is None
+        cache.put(key, [("User Login", "User can login")])
+        rows = cache.get(key)
+        print(f"Cached rows: {rows}, stats: {cache.stats()}")
+        
+        changed_key = make_cache_key("Requirement 1: User login", "llama3", {"temperature": 0.5})
+        
+        # A tiny size limit should evict everything but the newest entry
+        small_cache = ResultCache(directory, max_bytes=100, max_age=3600)
+        small_cache.put(make_cache_key("Requirement 2", "llama3"), [("Other", "Other case")])
+        evicted = small_cache.get(key) is None
+        
+        expired_cache = ResultCache(directory, max_bytes=10 ** 6, max_age=-1)
+        expired = expired_cache.get(make_cache_key("Requirement 2", "llama3")) is None
+        
+        # Reads refresh the LRU order but not the age: an entry read every time still expires
+        aging_cache = ResultCache(directory, max_bytes=10 ** 6, max_age=0.5)
+        aging_cache.put(key, [("User Login", "User can login")])
+        reads = []
+        for _ in range(4):
+            time.sleep(0.2)
+            reads.append(aging_cache.get(key) is not None)
+        
+        # Overwriting an entry does not count its size twice
+        sized_cache = ResultCache(directory, max_bytes=10 ** 6, max_age=3600)
+        sized_cache.evict()
+        before = sized_cache._size
+        for _ in range(3):
+            sized_cache.put(key, [("User Login", "User can login")])
+        size_ok = sized_cache._size - before == os.path.getsize(sized_cache._path(key))
+    
+    print(f"Reads of an aging entry: {reads}, size after overwrites correct: {size_ok}")
+    return (missed and rows == [["User Login", "User can login"]] and cache.stats() == {"hits": 1, "misses": 1}
+            and changed_key != key and evicted and expired and reads[:2] == [True, True] and not reads[-1]
+            and size_ok)
+
+def test_stream_parser():
+    """Test incremental row parsing of streamed LLM output"""
+    print("\nTesting stream parser...")
+    
+    from core.generator import RowStreamParser
+    
+    output = "Sure!\nTitle|Description\nUser Login|User can login\n-|-\nUser Logout|User can logout\nNote: done\nIgnored|Row\n"
+    parser = RowStreamParser()
+    emitted = []
+    consumed = 0
+    for char in output:
+        consumed += 1
+        rows = parser.feed(char)
+        if rows:
+            # Rows must be emitted exactly when their newline arrives
+            emitted.append((rows, output[consumed - 1] == "\n"))
+        if parser.done:
+            break
+    emitted_rows = [row for rows, _ in emitted for row in rows]
+    print(f"Rows: {emitted_rows}, stopped after {consumed}/{len(output)} chars")
+    
+    return (emitted_rows == [("User Login", "User can login"), ("User Logout", "User can logout")]
+            and all(on_newline for _, on_newline in emitted)
+            and consumed == output.index("Ignored"))
+
+def test_run_metrics():
+    """Test exclusive stage timing and the JSON run report"""
+    print("\nTesting run metrics...")
+    
+    import json
+    import time
+    from core.metrics import RunMetrics
+    
+    metrics = RunMetrics("spec.pdf")
+    
+    def slow_pages():
+        for _ in range(3):
+            time.sleep(0.02)
+            yield "page"
+    
+    chunks = list(metrics.timed_iter("chunking", metrics.timed_iter("parse", slow_pages())))
+    metrics.record_chunk({"index": 0, "rows": 2, "eval_count": 100, "eval_duration": 2 * 10 ** 9})
+    metrics.record_chunk({"index": 1, "rows": 0, "parse_failed": True})
+    metrics.finish()
+    report = json.loads(metrics.to_json())
+    
+    print(f"Stages: {report['stages']}")
+    print(f"Totals: {report['totals']}")
+    
+    return (len(chunks) == 3
+            and report["stages"]["parse"]["seconds"] >= 0.06
+            and report["stages"]["chunking"]["seconds"] < 0.02
+            and report["totals"]["tokens_per_second"] == 50
+            and report["totals"]["parse_failures"] == 1)
+
+def test_batch_inputs():
+    """Test document discovery and output naming for the batch CLI"""
+    print("\nTesting batch CLI inputs...")
+    
+    import tempfile
+    from spec2test import find_documents, output_name
+    
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "a"))
+        os.makedirs(os.path.join(directory, "b"))
+        for name in ["a/spec.pdf", "b/spec.pdf", "b/notes.txt", "top.docx"]:
+            open(os.path.join(directory, name), "w").close()
+        
+        from_dir = find_documents([directory])
+        from_glob = find_documents([os.path.join(directory, "**", "*.pdf")])
+        used = set()
+        names = [output_name(p, used) for p in from_dir]
+    
+    print(f"Found {len(from_dir)} documents, output names: {names}")
+    
+    return len(from_dir) == 3 and len(from_glob) == 2 and len(set(names)) == 3
+
 def main():
     """Run all tests"""
     print("🧪 Running Spec2Test Lite Tests\n")
     
     tests = [
         ("Chunker", test_chunker),
+        ("Token Chunker", test_token_chunker),
         ("Parser", test_parser),
-        ("CSV Parser", test_csv_parser)
+        ("Streaming Parse", test_streaming_parse),
+        ("In-memory Parse", test_in_memory_parse),
+        ("PDF Extraction", test_pdf_extraction),
+        ("CSV Parser", test_csv_parser),
+        ("Output Rows", test_output_rows),
+        ("LLM Backend", test_llm_backend),
+        ("Mock Server", test_mock_server),
+        ("Pipeline Order", test_pipeline_order),
+        ("Result Store", test_result_store),
+        ("Traceability", test_traceability),
+        ("Dedup", test_dedup),
+        ("Document Versions", test_document_versions),
+        ("Pre-filter", test_prefilter),
+        ("Job Queue", test_job_queue),
+        ("Scheduler", test_scheduler),
+        ("Backend Pool", test_backend_pool),
+        ("Cold Start", test_cold_start),
+        ("Prompt Prefix", test_prompt_prefix),
+        ("Chunk Batching", test_chunk_batching),
+        ("Export", test_export),
+        ("Result Cache", test_result_cache),
+        ("Stream Parser", test_stream_parser),
+        ("Batch Inputs", test_batch_inputs),
+        ("Run Metrics", test_run_metrics)
     ]
     
     results = []
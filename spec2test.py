@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Spec2Test batch command line
+Generates test cases for whole directories of PDF/DOCX specs without Streamlit
+
+Examples:
+    python spec2test.py specs/ -o out/
+    python spec2test.py "specs/**/*.pdf" -o out/ --combined all_test_cases.csv
+    python spec2test.py specs/ -o out/ --format parquet --combined all_test_cases.parquet
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from config.settings import (
+    DEFAULT_MODEL, MAX_CONCURRENT_CHUNKS, SUPPORTED_FORMATS, CSV_SEPARATOR,
+    CACHE_ENABLED, BATCH_FILE_WORKERS, BATCH_MANIFEST, DEDUP_ENABLED, VERSION_STORE_ENABLED, ADAPTIVE_CONCURRENCY,
+    EXPORT_FORMAT, EXPORT_COMPRESSION, WARM_UP_MODEL, TRACE_ENABLED,
+)
+from core.cache import ResultCache
+from core.export import EXPORT_FORMATS, open_export, read_export, detect_format, export_extension
+from core.results import ResultStore
+from core.metrics import RunMetrics, profile_to
+from core.pipeline import process_document, process_document_delta
+from core.dedup import Deduplicator
+from core.versions import DocumentStore
+from core.scheduler import AdaptiveLimiter
+from core.jobs import start_warm_up
+from core.trace import TraceIndex
+
+
+def find_documents(inputs):
+    """Expand files, directories (recursively) and glob patterns into a sorted list of documents"""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                found.extend(os.path.join(root, name) for name in files)
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            found.extend(glob.glob(item, recursive=True))
+
+    documents = sorted({os.path.abspath(p) for p in found if os.path.splitext(p)[1].lower() in SUPPORTED_FORMATS})
+    return documents
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_name(file_path, used, extension=".csv"):
+    """Output file name for a document, made unique when two inputs share a file name"""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    name = f"{stem}{extension}"
+    suffix = 2
+    while name in used:
+        name = f"{stem}_{suffix}{extension}"
+        suffix += 1
+    used.add(name)
+    return name
+
+
+class Manifest:
+    """Completed documents in the output directory, rewritten after each file so runs can resume"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def is_done(self, file_path, digest, output_dir):
+        entry = self.entries.get(file_path)
+        return (entry is not None and entry["sha256"] == digest and not entry.get("failed_chunks")
+                and os.path.exists(os.path.join(output_dir, entry["output"])))
+
+    def mark_done(self, file_path, entry):
+        with self.lock:
+            self.entries[file_path] = entry
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def run_document(file_path, output_path, model, cache, limiter, report_dir=None, dedup=DEDUP_ENABLED, doc_store=None,
+                 export_format=EXPORT_FORMAT, compression=EXPORT_COMPRESSION):
+    start = time.perf_counter()
+    metrics = RunMetrics(os.path.basename(file_path), model=model)
+    failures = {}
+    base_path = output_path[:-len(export_extension(export_format, compression))]
+    # Test cases are written to the output file as chunks complete instead of being collected first
+    writer = open_export(output_path, export_format, compression)
+    trace = TraceIndex() if TRACE_ENABLED else None
+    store = ResultStore(dedup=Deduplicator() if dedup else None, sink=writer, keep_rows=False, trace=trace)
+    try:
+        chunk_count = _generate(file_path, base_path, model, cache, limiter, metrics, doc_store, store, failures)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    for index in sorted(failures):
+        print(f"⚠️  {file_path}: chunk {index + 1} failed: {failures[index]}")
+    if trace is not None:
+        # Requirement -> test case links next to the output, e.g. out/spec.trace.json
+        with open(base_path + ".trace.json", "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(), f, indent=2)
+        gaps = trace.coverage()["gaps"]
+        if gaps:
+            print(f"📍 {file_path}: {len(gaps)} requirements without a test case: {', '.join(gaps[:10])}"
+                  f"{' ...' if len(gaps) > 10 else ''}")
+    if report_dir:
+        report_name = os.path.basename(base_path) + ".report.json"
+        metrics.to_json(os.path.join(report_dir, report_name))
+    return len(store), chunk_count, metrics.counters, time.perf_counter() - start
+
+
+def _generate(file_path, base_path, model, cache, limiter, metrics, doc_store, store, failures):
+    if doc_store is not None:
+        # Delta run against the previous version of this path
+        _, delta = process_document_delta(file_path, doc_store, file_path, model=model, cache=cache,
+                                          limiter=limiter, metrics=metrics, failures=failures, store=store)
+        chunk_count = delta["llm_chunks"]
+        if delta["diff"] is not None:
+            diff = delta["diff"]
+            print(f"🔁 {file_path}: version {delta['version']}, {len(diff['changed'])} changed / "
+                  f"{len(diff['added'])} added / {len(diff['removed'])} removed sections, "
+                  f"{delta['reused_test_cases']} test cases reused")
+        if delta["removed_test_cases"]:
+            removed_path = base_path + ".removed.csv"
+            pd.DataFrame(delta["removed_test_cases"], columns=["Title", "Description"]).to_csv(
+                removed_path, index=False, sep=CSV_SEPARATOR)
+            print(f"⚠️  {file_path}: {len(delta['removed_test_cases'])} test cases of removed sections -> {removed_path}")
+        return delta["llm_chunks"]
+    _, chunk_count = process_document(file_path, model=model, cache=cache, limiter=limiter,
+                                      metrics=metrics, failures=failures, store=store)
+    return chunk_count
+
+
+def write_combined(documents, manifest, output_dir, combined_path):
+    """Stream every document's test cases into one file, with a Source column; the format follows the extension"""
+    try:
+        export_format, compression = detect_format(combined_path)
+    except ValueError:
+        export_format, compression = "csv", None
+    with open_export(combined_path, export_format, compression,
+                     columns=["Source", "ID", "Title", "Description"]) as writer:
+        for file_path in documents:
+            entry = manifest.entries.get(file_path)
+            if entry is None:
+                continue
+            _, rows = read_export(os.path.join(output_dir, entry["output"]))
+            source = os.path.basename(file_path)
+            writer.write_rows((source, *row) for row in rows)
+    return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Documents, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="spec2test_output", help="Directory for the per-document output files")
+    parser.add_argument("--format", default=EXPORT_FORMAT, choices=EXPORT_FORMATS,
+                        help=f"Format of the per-document files (default: {EXPORT_FORMAT})")
+    parser.add_argument("--compression", default=EXPORT_COMPRESSION,
+                        help="CSV: gzip, bz2 or xz; Parquet: snappy, gzip, zstd, brotli or lz4 (default: none)")
+    parser.add_argument("--combined", help="Also write every test case into this file (CSV, Parquet or XLSX by "
+                                           "extension), with a Source column")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Ollama model (default: {DEFAULT_MODEL})")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_CONCURRENT_CHUNKS,
+                        help="LLM requests in flight across all documents")
+    parser.add_argument("--file-workers", type=int, default=BATCH_FILE_WORKERS, help="Documents processed at the same time")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess documents already completed in the output directory")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the result cache")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep duplicate and near-duplicate test cases")
+    parser.add_argument("--no-versions", action="store_true",
+                        help="Process changed documents in full instead of only their changed sections")
+    parser.add_argument("--report-dir", help="Write a JSON run report (stage timings, per-chunk stats) per document here")
+    parser.add_argument("--profile", help="Dump a cProfile of the whole run to this file")
+    args = parser.parse_args(argv)
+    try:
+        extension = export_extension(args.format, args.compression)
+    except ValueError as e:
+        parser.error(str(e))
+
+    documents = find_documents(args.inputs)
+    if not documents:
+        print("❌ No PDF or DOCX documents found")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(args.output_dir, BATCH_MANIFEST))
+    cache = ResultCache() if CACHE_ENABLED and not args.no_cache else None
+    doc_store = DocumentStore() if VERSION_STORE_ENABLED and not args.no_versions else None
+    # Shared by every document so the LLM server never sees more than max_in_flight requests;
+    # the adaptive limiter backs off below that while the server is slow or failing
+    if ADAPTIVE_CONCURRENCY:
+        limiter = AdaptiveLimiter(initial=args.max_in_flight, maximum=args.max_in_flight)
+    else:
+        limiter = threading.BoundedSemaphore(max(1, args.max_in_flight))
+
+    used_names = {entry["output"] for entry in manifest.entries.values()}
+    jobs = []
+    for file_path in documents:
+        digest = file_digest(file_path)
+        if not args.no_resume and manifest.is_done(file_path, digest, args.output_dir):
+            print(f"⏭️  {file_path} (already done)")
+            continue
+        entry = manifest.entries.get(file_path)
+        if entry and entry["output"].endswith(extension):
+            name = entry["output"]
+        else:
+            name = output_name(file_path, used_names, extension)
+        jobs.append((file_path, digest, name))
+
+    if args.report_dir:
+        os.makedirs(args.report_dir, exist_ok=True)
+
+    if jobs and WARM_UP_MODEL:
+        # The model loads while the first documents are parsed and chunked
+        start_warm_up(args.model)
+    print(f"🚀 {len(jobs)} of {len(documents)} documents to process")
+    failures = 0
+    incomplete = 0
+    with profile_to(args.profile), ThreadPoolExecutor(max_workers=max(1, args.file_workers)) as executor:
+        futures = {
+            executor.submit(run_document, file_path, os.path.join(args.output_dir, name), args.model, cache, limiter,
+                            args.report_dir, DEDUP_ENABLED and not args.no_dedup, doc_store, args.format,
+                            args.compression):
+                (file_path, digest, name)
+            for file_path, digest, name in jobs
+        }
+        for future in as_completed(futures):
+            file_path, digest, name = futures[future]
+            try:
+                rows, chunk_count, counters, elapsed = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ {file_path}: {str(e)}")
+                continue
+            merged = counters.get("duplicates_merged", 0)
+            avoided = counters.get("llm_calls_avoided", 0)
+            failed_chunks = counters.get("failed_chunks", 0)
+            incomplete += 1 if failed_chunks else 0
+            manifest.mark_done(file_path, {"sha256": digest, "output": name, "test_cases": rows,
+                                           "duplicates_merged": merged, "llm_calls_avoided": avoided,
+                                           "failed_chunks": failed_chunks, "chunks": chunk_count,
+                                           "completed": time.time()})
+            ocr_pages = counters.get("pdf_pages_ocr", 0)
+            unread_pages = counters.get("pdf_pages_image", 0)
+            extra = "".join([f", {merged} duplicates merged" if merged else "",
+                             f", {avoided} LLM calls avoided" if avoided else "",
+                             f", {ocr_pages} pages read with OCR" if ocr_pages else "",
+                             f", {unread_pages} image-only pages unread (OCR off or Tesseract missing)"
+                             if unread_pages else ""])
+            icon = "⚠️ " if failed_chunks else "✅"
+            failed_text = f" ({failed_chunks} chunks failed)" if failed_chunks else ""
+            print(f"{icon} {file_path}: {rows} test cases from {chunk_count} chunks{failed_text}{extra} "
+                  f"in {elapsed:.1f}s -> {name}")
+
+    if args.combined:
+        total = write_combined(documents, manifest, args.output_dir, args.combined)
+        print(f"📄 Wrote {total} test cases to {args.combined}")
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"♻️  Cache: {stats['hits']} chunks reused, {stats['misses']} sent to the LLM")
+
+    if failures or incomplete:
+        print(f"⚠️  {failures} documents failed and {incomplete} are missing chunks; "
+              f"rerun the same command to retry them")
+        return 1
+    print("🎉 Done")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())